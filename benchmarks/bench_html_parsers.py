@@ -0,0 +1,104 @@
+from __future__ import annotations
+
+import argparse
+import json
+import re
+import resource
+import subprocess
+import sys
+import time
+import tracemalloc
+from pathlib import Path
+
+from ai_updates.collectors.html_parsers import BACKENDS, DEFAULT_BACKEND, ParsedPage, available_backends, parse_page, stream_page
+
+"""HTML パーサーのバックエンド比較ベンチマーク。
+
+保存済みフィクスチャ（tests/fixtures/*.html）を各バックエンドで解析し、
+1回あたりの解析時間・Python ヒープのピーク・RSS 増分と、標準パーサーとの出力一致を表示する。
+lxml / selectolax は C 側で確保するメモリが tracemalloc に現れないため、
+バックエンドごとに子プロセスで実行して RSS の増分も測る。
+「stream」は HTML_STREAM=true の逐次解析（64KiB ずつ流し、max_sections 件そろったら止める）。
+
+    python benchmarks/bench_html_parsers.py --repeat 20 --inflate 50
+"""
+
+_FIXTURES = Path(__file__).resolve().parent.parent / "tests" / "fixtures"
+_STREAM = "stream"
+_CHUNK = 64 * 1024
+
+
+def _parse(backend: str, html: str) -> ParsedPage:
+    if backend == _STREAM:
+        title, sections = stream_page(html[i : i + _CHUNK] for i in range(0, len(html), _CHUNK))
+        return ParsedPage(title=title, sections=sections)
+    return parse_page(html, backend)
+
+
+def _inflate(html: str, factor: int) -> str:
+    # 実際のヘルプセンターに近づけるため、巨大なインライン JS とナビゲーションを足す。
+    if factor <= 1:
+        return html
+    bundle = "<script>" + ("window.__chunk=" + json.dumps(["x" * 64] * 32) + ";") * factor + "</script>"
+    nav = "<nav>" + "".join(f'<a href="/a/{i}"><span>Article {i}</span></a>' for i in range(40 * factor)) + "</nav>"
+    # ナビゲーションは body 開始タグの閉じ「>」の後ろへ入れ、属性の中に混ざらないようにする。
+    html = re.sub(r"(<body\b[^>]*>)", lambda m: m.group(1) + nav, html, count=1, flags=re.IGNORECASE)
+    return html.replace("</body>", bundle + "</body>", 1)
+
+
+def _measure(backend: str, pages: dict[str, str], repeat: int) -> dict[str, object]:
+    results: dict[str, object] = {}
+    rss_before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    for name, html in pages.items():
+        _parse(backend, html)  # ウォームアップ
+        started = time.perf_counter()
+        for _ in range(repeat):
+            _parse(backend, html)
+        elapsed_ms = (time.perf_counter() - started) * 1000 / repeat
+        tracemalloc.start()
+        _parse(backend, html)
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        results[name] = {"ms": round(elapsed_ms, 3), "py_peak_kib": peak // 1024}
+    # Linux の ru_maxrss は KiB 単位。
+    results["rss_delta_kib"] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss - rss_before
+    return results
+
+
+def _load_pages(inflate: int) -> dict[str, str]:
+    return {p.name: _inflate(p.read_text(encoding="utf-8"), inflate) for p in sorted(_FIXTURES.glob("*.html"))}
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--inflate", type=int, default=1, help="ページを水増しする倍率")
+    parser.add_argument("--child", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    pages = _load_pages(args.inflate)
+    if args.child:
+        print(json.dumps(_measure(args.child, pages, args.repeat)))
+        return
+
+    expected = {name: parse_page(html, DEFAULT_BACKEND) for name, html in pages.items()}
+    sizes = ", ".join(f"{name}={len(html) // 1024}KiB" for name, html in pages.items())
+    print(f"fixtures: {sizes} (repeat={args.repeat})")
+    for backend in (*BACKENDS, _STREAM):
+        if backend != _STREAM and backend not in available_backends():
+            print(f"{backend:12s} not installed")
+            continue
+        parity = all(_parse(backend, html) == expected[name] for name, html in pages.items())
+        out = subprocess.run(
+            [sys.executable, __file__, "--child", backend, "--repeat", str(args.repeat), "--inflate", str(args.inflate)],
+            check=True,
+            capture_output=True,
+            text=True,
+        )
+        result = json.loads(out.stdout)
+        timings = " ".join(f"{name}={r['ms']}ms/{r['py_peak_kib']}KiB" for name, r in result.items() if isinstance(r, dict))
+        print(f"{backend:12s} parity={'ok' if parity else 'MISMATCH'} rss+={result['rss_delta_kib']}KiB {timings}")
+
+
+if __name__ == "__main__":
+    main()
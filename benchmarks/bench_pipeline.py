@@ -0,0 +1,374 @@
+from __future__ import annotations
+
+import argparse
+import asyncio
+import dataclasses
+import itertools
+import json
+import random
+import re
+import resource
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+from ai_updates import http_clients
+from ai_updates.collectors import new_async_client
+from ai_updates.config import Config
+from ai_updates.pipeline import Pipeline
+from ai_updates.sources import ExtractionPlan, Source
+from ai_updates.store import Store
+
+"""パイプライン全体（収集 -> 重複判定 -> 要約 -> 通知）のオフライン負荷ベンチマーク。
+
+ローカルのスタブサーバーが、保存済み HTML フィクスチャ（tests/fixtures）を元にしたページと
+GitHub Releases 形式の JSON、遅延を指定できる LLM（OpenAI Responses 互換）、
+Discord 相当のレート制限を返す Webhook を提供する。1回目の実行で既存セクションを既読にしてから、
+各ページの先頭に新しいセクションを足した2回目の実行を測る。
+
+シナリオ（ソース数 x 新着件数）ごとに子プロセスで実行し、スループット・ステージ別の p50/p95・
+スタブへの HTTP リクエスト数・ピーク RSS を表示する。Config.from_env() の値（DISPATCH_MIN_INTERVAL など）は
+そのまま使い、接続先と API キーだけをスタブ向けに差し替える。
+
+    python benchmarks/bench_pipeline.py --sources 5 50 500 --new-items 0 100 1000 --llm-latency 0.2
+"""
+
+_FIXTURES = Path(__file__).resolve().parent.parent / "tests" / "fixtures"
+_PAGES = ("developer_changelog.html", "help_center_release_notes.html")
+_SERVICES = ("openai", "gemini", "claude")
+# GitHub Releases コレクターは前回の最新リリースを探して最大3ページ（30件）まで読む。
+_GITHUB_CAPACITY = 30
+_WORDS = (
+    "model api release support improved faster latency context window tool streaming voice image agent "
+    "memory project sharing workspace admin billing quota region policy safety eval fine-tune batch cache "
+    "token limit plugin search file upload export audit key rotation webhook retry timeout error fix"
+).split()
+_STAGES = ("collect", "fetch", "parse", "dedup", "summarize", "llm_request", "dispatch")
+
+
+def _body(rng: random.Random) -> str:
+    # ソースをまたいで近似重複と判定されないよう、語（一部は番号付き）をランダムに並べた本文にする。
+    words = (f"{rng.choice(_WORDS)}{rng.randrange(100) if rng.random() < 0.5 else ''}" for _ in range(rng.randint(30, 60)))
+    return " ".join(words) + "."
+
+
+class _Stubs:
+    # スタブサーバーが返すページと、受けたリクエストの集計。
+    def __init__(self, llm_latency: float, discord_limit: int, discord_window: float) -> None:
+        self.pages: dict[str, tuple[str, bytes]] = {}
+        self.llm_latency = llm_latency
+        self.discord_limit = discord_limit
+        self.discord_window = discord_window
+        self.requests: Counter[str] = Counter()
+        self.embeds = 0
+        self._buckets: dict[str, tuple[float, int]] = {}
+        self._lock = threading.Lock()
+
+    def count(self, key: str, embeds: int = 0) -> None:
+        with self._lock:
+            self.requests[key] += 1
+            self.embeds += embeds
+
+    def discord_slot(self, webhook: str) -> float:
+        # Discord と同じく固定窓で回数を数える。枠がなければ待つべき秒数、あれば 0 を返す。
+        with self._lock:
+            now = time.monotonic()
+            started, used = self._buckets.get(webhook, (now, 0))
+            if now - started >= self.discord_window:
+                started, used = now, 0
+            if used >= self.discord_limit:
+                return started + self.discord_window - now
+            self._buckets[webhook] = (started, used + 1)
+            return 0.0
+
+    def bucket_headers(self, webhook: str) -> dict[str, str]:
+        with self._lock:
+            started, used = self._buckets[webhook]
+        reset_after = max(0.0, started + self.discord_window - time.monotonic())
+        return {
+            "X-RateLimit-Limit": str(self.discord_limit),
+            "X-RateLimit-Remaining": str(max(0, self.discord_limit - used)),
+            "X-RateLimit-Reset-After": f"{reset_after:.3f}",
+            "X-RateLimit-Bucket": webhook,
+        }
+
+
+class _Server(ThreadingHTTPServer):
+    # 既定の listen キュー（5）では同時接続が溢れて SYN の再送待ち（約1秒）が測定に混ざる。
+    request_queue_size = 256
+    daemon_threads = True
+
+
+def _handler(stubs: _Stubs) -> type[BaseHTTPRequestHandler]:
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def log_message(self, format: str, *args: object) -> None:
+            pass
+
+        def _reply(self, status: int, body: bytes = b"", headers: dict[str, str] | None = None) -> None:
+            self.send_response(status)
+            for key, value in (headers or {}).items():
+                self.send_header(key, value)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def do_GET(self) -> None:
+            path, _, query = self.path.partition("?")
+            kind = path.split("/")[1]
+            page = stubs.pages.get(path)
+            if page is None:
+                stubs.count(f"{kind} 404")
+                self._reply(404)
+                return
+            etag, body = page
+            if kind == "github" and query:
+                # REST API と同じく per_page / page で切り出す。
+                params = dict(part.partition("=")[::2] for part in query.split("&"))
+                per_page, number = int(params.get("per_page", "30")), int(params.get("page", "1"))
+                body = json.dumps(json.loads(body)[(number - 1) * per_page : number * per_page]).encode()
+                etag = f'{etag[:-1]}-{number}"'
+            if self.headers.get("If-None-Match") == etag:
+                stubs.count(f"{kind} 304")
+                self._reply(304, headers={"ETag": etag})
+                return
+            stubs.count(f"{kind} 200")
+            content_type = "application/json" if kind == "github" else "text/html; charset=utf-8"
+            self._reply(200, body, {"ETag": etag, "Content-Type": content_type})
+
+        def do_POST(self) -> None:
+            payload = json.loads(self.rfile.read(int(self.headers.get("Content-Length", "0"))) or b"{}")
+            if self.path.startswith("/openai/"):
+                self._llm(payload)
+            elif self.path.startswith("/webhook/"):
+                self._webhook(payload)
+            else:
+                self._reply(404)
+
+        def _llm(self, payload: dict) -> None:
+            time.sleep(stubs.llm_latency)
+            stubs.count("llm 200")
+            prompt = payload["input"][0]["content"]
+            entry = {"headline": "bench", "bullets": ["a", "b", "c"], "importance": "low", "topic": "bench"}
+            ids = re.findall(r"^### id: (\S+)$", prompt, flags=re.MULTILINE)
+            text = json.dumps({"summaries": [{"id": i, **entry} for i in ids]} if ids else entry)
+            body = json.dumps({"output": [{"content": [{"text": text}]}]}).encode()
+            self._reply(200, body, {"Content-Type": "application/json"})
+
+        def _webhook(self, payload: dict) -> None:
+            webhook = self.path
+            wait = stubs.discord_slot(webhook)
+            if wait > 0:
+                stubs.count("discord 429")
+                body = json.dumps({"retry_after": round(wait, 3), "global": False}).encode()
+                self._reply(429, body, {"Content-Type": "application/json"})
+                return
+            stubs.count("discord 204", embeds=len(payload.get("embeds", [])) or 1)
+            self._reply(204, headers=stubs.bucket_headers(webhook))
+
+    return Handler
+
+
+def _html_page(template: str, source_id: str, count: int, rng: random.Random) -> str:
+    # フィクスチャの最初の見出しの前に新しいセクションを足す（新しい順のページを想定）。
+    sections = "".join(
+        f"<h2>2026-03-{1 + n % 28:02d} Bench update {source_id} #{n}</h2><p>{_body(rng)}</p>"
+        for n in range(count, 0, -1)
+    )
+    index = template.index("<h2")
+    return template[:index] + sections + template[index:]
+
+
+def _github_page(source_id: str, count: int) -> str:
+    # 既存リリースの本文が変わらないよう、乱数はリリースごとに固定する。
+    releases = [
+        {
+            "id": n,
+            "name": f"v{n}.0.0 {source_id}",
+            "tag_name": f"v{n}.0.0",
+            "html_url": f"https://example.invalid/{source_id}/releases/v{n}.0.0",
+            "published_at": f"2026-03-{1 + n % 28:02d}T00:00:00Z",
+            "body": _body(random.Random(f"{source_id}:{n}")),
+        }
+        for n in range(count + 3, 0, -1)
+    ]
+    return json.dumps(releases)
+
+
+def _allocate(sources: list[Source], new_items: int) -> dict[str, int]:
+    # 新着件数をソースへ均等に割り振る。GitHub は上限を超えた分を HTML ソースへ回す。
+    counts = dict.fromkeys((s.id for s in sources), 0)
+    remaining = new_items
+    while remaining > 0:
+        open_ids = [s.id for s in sources if s.kind != "github_releases" or counts[s.id] < _GITHUB_CAPACITY]
+        if not open_ids:
+            break
+        for source_id in open_ids[:remaining]:
+            counts[source_id] += 1
+        remaining -= min(remaining, len(open_ids))
+    return counts
+
+
+def _publish(stubs: _Stubs, sources: list[Source], counts: dict[str, int], base: str) -> None:
+    templates = [(_FIXTURES / name).read_text(encoding="utf-8") for name in _PAGES]
+    for i, source in enumerate(sources):
+        rng = random.Random(f"{source.id}:{counts[source.id]}")
+        if source.kind == "github_releases":
+            text = _github_page(source.id, counts[source.id])
+        else:
+            text = _html_page(templates[i % len(templates)], source.id, counts[source.id], rng)
+        path = source.url.removeprefix(base)
+        stubs.pages[path] = (f'"{source.id}-{counts[source.id]}"', text.encode("utf-8"))
+
+
+def _sources(base: str, count: int, new_items: int) -> list[Source]:
+    # 5件に1件は GitHub Releases。最大セクション数は新着分が収まるように広げる。
+    plan = ExtractionPlan(max_sections=new_items + 20)
+    sources: list[Source] = []
+    for i in range(count):
+        service = _SERVICES[i % len(_SERVICES)]
+        if i % 5 == 4:
+            sources.append(Source(f"bench_gh_{i}", service, f"Bench GitHub {i}", "github_releases", f"{base}/github/{i}"))
+        else:
+            sources.append(Source(f"bench_html_{i}", service, f"Bench HTML {i}", "html", f"{base}/html/{i}", plan=plan))
+    return sources
+
+
+def _percentile(values: list[float], pct: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, max(0, round(pct / 100 * len(ordered) + 0.5) - 1))]
+
+
+async def _run(cfg: Config, store: Store, sources: list[Source]) -> Pipeline:
+    pipeline = Pipeline(cfg, store)
+    async with new_async_client(cfg.collect_concurrency) as client:
+        await pipeline.run(sources, client)
+    return pipeline
+
+
+def run_scenario(source_count: int, new_items: int, args: argparse.Namespace) -> dict[str, object]:
+    stubs = _Stubs(args.llm_latency, args.discord_limit, args.discord_window)
+    server = _Server(("127.0.0.1", 0), _handler(stubs))
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    base = f"http://127.0.0.1:{server.server_port}"
+    sources = _sources(base, source_count, new_items)
+    http_clients.configure(http2=False)
+    try:
+        with tempfile.TemporaryDirectory() as tmp:
+            env_cfg = Config.from_env()
+            concurrency = env_cfg.collect_concurrency
+            store = Store(Path(tmp) / "bench.db")
+            # 1回目: API キーと Webhook なしで既存セクションを既読にする（フォールバック要約・通知なし）。
+            seed_cfg = dataclasses.replace(
+                env_cfg,
+                db_path=Path(tmp) / "bench.db",
+                collect_per_host=max(env_cfg.collect_per_host, concurrency),
+                html_parser=args.parser or env_cfg.html_parser,
+                openai_api_key=None,
+                gemini_api_key=None,
+                webhook_openai=None,
+                webhook_gemini=None,
+                webhook_claude=None,
+            )
+            _publish(stubs, sources, dict.fromkeys((s.id for s in sources), 0), base)
+            asyncio.run(_run(seed_cfg, store, sources))
+
+            # 2回目: 新着を足したページを、スタブの LLM と Webhook 付きで処理する。
+            counts = _allocate(sources, new_items)
+            _publish(stubs, sources, counts, base)
+            cfg = dataclasses.replace(
+                seed_cfg,
+                summary_provider="openai",
+                openai_api_key="bench",
+                openai_base_url=f"{base}/openai/v1",
+                webhook_openai=f"{base}/webhook/openai",
+                webhook_gemini=f"{base}/webhook/gemini",
+                webhook_claude=f"{base}/webhook/claude",
+            )
+            stubs.requests.clear()
+            stubs.embeds = 0
+            started = time.perf_counter()
+            pipeline = asyncio.run(_run(cfg, store, sources))
+            elapsed = time.perf_counter() - started
+            store.close()
+    finally:
+        server.shutdown()
+        http_clients.close_clients()
+
+    stages = {
+        stage: {
+            "n": len(pipeline.metrics.timings.get(stage, [])),
+            "p50_ms": round(_percentile(pipeline.metrics.timings.get(stage, []), 50) * 1000, 2),
+            "p95_ms": round(_percentile(pipeline.metrics.timings.get(stage, []), 95) * 1000, 2),
+        }
+        for stage in _STAGES
+    }
+    return {
+        "sources": source_count,
+        "new_items": sum(pipeline.new_counts.values()),
+        "dispatched": stubs.embeds,
+        "seconds": round(elapsed, 3),
+        "items_per_sec": round(stubs.embeds / elapsed, 2) if elapsed > 0 else 0.0,
+        "stages": stages,
+        "requests": dict(sorted(stubs.requests.items())),
+        "counters": dict(sorted(pipeline.metrics.counters.items())),
+        # Linux の ru_maxrss は KiB 単位。
+        "peak_rss_mib": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+    }
+
+
+def _print(result: dict[str, object]) -> None:
+    print(
+        f"sources={result['sources']} new={result['new_items']} dispatched={result['dispatched']} "
+        f"time={result['seconds']}s throughput={result['items_per_sec']} items/s rss={result['peak_rss_mib']}MiB"
+    )
+    for stage, row in result["stages"].items():
+        print(f"  {stage:11s} n={row['n']:5d} p50={row['p50_ms']:9.2f}ms p95={row['p95_ms']:9.2f}ms")
+    print("  requests: " + ", ".join(f"{k}={v}" for k, v in result["requests"].items()))
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sources", type=int, nargs="+", default=[5], help="ソース数（複数指定で全組み合わせ）")
+    parser.add_argument("--new-items", type=int, nargs="+", default=[50], help="2回目の実行で増やす新着件数")
+    parser.add_argument("--llm-latency", type=float, default=0.2, help="スタブ LLM の応答遅延（秒）")
+    parser.add_argument("--discord-limit", type=int, default=5, help="Webhook ごとの窓あたり送信回数")
+    parser.add_argument("--discord-window", type=float, default=2.0, help="Webhook のレート制限の窓（秒）")
+    parser.add_argument("--parser", default=None, help="HTML パーサー（未指定なら HTML_PARSER）")
+    parser.add_argument("--json", type=Path, default=None, help="結果を JSON で書き出すパス")
+    parser.add_argument("--child", nargs=2, type=int, metavar=("SOURCES", "NEW_ITEMS"), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        print(json.dumps(run_scenario(*args.child, args)))
+        return
+
+    # ピーク RSS をシナリオごとに測るため、1シナリオ1プロセスで実行する。
+    options = [
+        "--llm-latency", str(args.llm_latency),
+        "--discord-limit", str(args.discord_limit),
+        "--discord-window", str(args.discord_window),
+    ]
+    if args.parser:
+        options += ["--parser", args.parser]
+    results: list[dict[str, object]] = []
+    for source_count, new_items in itertools.product(args.sources, args.new_items):
+        cmd = [sys.executable, __file__, *options, "--child", str(source_count), str(new_items)]
+        out = subprocess.run(cmd, check=True, capture_output=True, text=True)
+        result = json.loads(out.stdout.strip().splitlines()[-1])
+        results.append(result)
+        _print(result)
+    if args.json:
+        args.json.write_text(json.dumps(results, indent=2) + "\n", encoding="utf-8")
+
+
+if __name__ == "__main__":
+    main()
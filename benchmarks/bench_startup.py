@@ -0,0 +1,102 @@
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+"""各エントリーポイントの起動コスト（import 時間とプロセス起動込みの時間）を測るベンチマーク。
+
+cron 実行では起動のたびにこのコストを払うため、基準値（startup_baseline.json）より
+許容幅を超えて遅くなった場合や、入口で読み込むべきでない重いモジュールが読み込まれた場合は
+終了コード 1 で失敗する。基準値はマシン依存なので、測定環境を変えたら --update-baseline で取り直す。
+
+    python benchmarks/bench_startup.py --runs 7
+"""
+
+_BASELINE = Path(__file__).resolve().parent / "startup_baseline.json"
+
+# エントリーポイント -> (モジュール, 読み込まれてはいけないモジュール)。
+_ENTRY_POINTS: dict[str, tuple[str, tuple[str, ...]]] = {
+    "run_once_cli": ("ai_updates.main", ("bs4", "httpx", "ai_updates.pipeline")),
+    "run_maintenance_cli": ("ai_updates.main", ("bs4", "httpx", "ai_updates.pipeline")),
+    "run_preview_cli": ("ai_updates.preview", ("bs4", "httpx", "ai_updates.summarizer")),
+}
+_HEAVY = ("bs4", "httpx", "lxml", "selectolax", "asyncio", "ai_updates.pipeline", "ai_updates.summarizer")
+
+_PROBE = """
+import json, sys, time
+started = time.perf_counter()
+from {module} import {entry}
+elapsed = (time.perf_counter() - started) * 1000
+print(json.dumps({{"import_ms": elapsed, "loaded": [m for m in {heavy!r} if m in sys.modules]}}))
+"""
+
+
+def _measure(entry: str, runs: int) -> dict[str, object]:
+    module, _ = _ENTRY_POINTS[entry]
+    code = _PROBE.format(module=module, entry=entry, heavy=_HEAVY)
+    imports: list[float] = []
+    colds: list[float] = []
+    loaded: list[str] = []
+    for _ in range(runs):
+        # 毎回新しいインタープリターで測る（バイトコードはキャッシュ済みの状態）。
+        started = time.perf_counter()
+        out = subprocess.run([sys.executable, "-c", code], check=True, capture_output=True, text=True, env=os.environ)
+        colds.append((time.perf_counter() - started) * 1000)
+        result = json.loads(out.stdout)
+        imports.append(result["import_ms"])
+        loaded = result["loaded"]
+    return {
+        "import_ms": round(statistics.median(imports), 1),
+        "cold_ms": round(statistics.median(colds), 1),
+        "loaded": loaded,
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=7)
+    parser.add_argument("--tolerance", type=float, default=0.5, help="基準値に対して許容する増加率")
+    parser.add_argument("--slack-ms", type=float, default=15.0, help="測定誤差として常に許容する増加量（ms）")
+    parser.add_argument("--update-baseline", action="store_true")
+    args = parser.parse_args()
+
+    # 初回の .pyc 生成を測定に含めないよう、先に1回読み込んでおく。
+    for module, _ in set(_ENTRY_POINTS.values()):
+        subprocess.run([sys.executable, "-c", f"import {module}"], check=True)
+
+    results = {entry: _measure(entry, max(1, args.runs)) for entry in _ENTRY_POINTS}
+    baseline = json.loads(_BASELINE.read_text(encoding="utf-8")) if _BASELINE.exists() else {}
+    failures: list[str] = []
+    for entry, result in results.items():
+        _, forbidden = _ENTRY_POINTS[entry]
+        unexpected = sorted(set(result["loaded"]) & set(forbidden))
+        print(
+            f"{entry:20s} import={result['import_ms']:7.1f}ms cold={result['cold_ms']:7.1f}ms "
+            f"loaded={','.join(result['loaded']) or '-'}"
+        )
+        if unexpected:
+            failures.append(f"{entry} imports {', '.join(unexpected)} at startup")
+        base = baseline.get(entry)
+        if base and not args.update_baseline:
+            for key in ("import_ms", "cold_ms"):
+                limit = base[key] * (1 + args.tolerance) + args.slack_ms
+                if result[key] > limit:
+                    failures.append(f"{entry} {key} regressed: {result[key]}ms > {limit:.1f}ms (baseline {base[key]}ms)")
+
+    if args.update_baseline:
+        data = {entry: {k: r[k] for k in ("import_ms", "cold_ms")} for entry, r in results.items()}
+        _BASELINE.write_text(json.dumps(data, indent=2) + "\n", encoding="utf-8")
+        print(f"baseline written: {_BASELINE}")
+    for failure in failures:
+        print(f"FAIL: {failure}")
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
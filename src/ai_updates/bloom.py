@@ -0,0 +1,63 @@
+from __future__ import annotations
+
+import hashlib
+import math
+from collections.abc import Iterable
+
+"""既読 fingerprint 集合の Bloom フィルタ。
+
+「含まれない」という判定は確実なので、新着の fingerprint は SQLite を引かずに未読と分かる。
+「含まれるかもしれない」という判定には偽陽性があるため、呼び出し側は必ず DB で確かめる
+（偽陽性をそのまま既読扱いにすると、新着を黙って捨ててしまう）。
+"""
+
+
+def optimal_size(capacity: int, error_rate: float) -> tuple[int, int]:
+    # 想定件数と偽陽性率から、ビット数とハッシュ関数の数を決める。
+    capacity = max(1, capacity)
+    error_rate = min(max(error_rate, 1e-9), 0.5)
+    num_bits = max(8, math.ceil(-capacity * math.log(error_rate) / math.log(2) ** 2))
+    num_hashes = max(1, round(num_bits / capacity * math.log(2)))
+    return num_bits, num_hashes
+
+
+class BloomFilter:
+    def __init__(self, num_bits: int, num_hashes: int, bits: bytes | None = None, count: int = 0) -> None:
+        self.num_bits = num_bits
+        self.num_hashes = num_hashes
+        self.bits = bytearray(bits) if bits is not None else bytearray((num_bits + 7) // 8)
+        # 追加した件数（重複を含みうる概数）。偽陽性率の見積もりに使う。
+        self.count = count
+
+    @classmethod
+    def for_capacity(cls, capacity: int, error_rate: float) -> "BloomFilter":
+        return cls(*optimal_size(capacity, error_rate))
+
+    def _positions(self, key: str) -> Iterable[int]:
+        # 128bit のハッシュを2つに分けたダブルハッシュで k 個の位置を作る。
+        digest = hashlib.blake2b(key.encode("utf-8"), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], "little")
+        h2 = int.from_bytes(digest[8:], "little") | 1
+        return ((h1 + i * h2) % self.num_bits for i in range(self.num_hashes))
+
+    def add(self, key: str) -> None:
+        bits = self.bits
+        for pos in self._positions(key):
+            bits[pos >> 3] |= 1 << (pos & 7)
+        self.count += 1
+
+    def update(self, keys: Iterable[str]) -> None:
+        for key in keys:
+            self.add(key)
+
+    def __contains__(self, key: str) -> bool:
+        bits = self.bits
+        return all(bits[pos >> 3] & (1 << (pos & 7)) for pos in self._positions(key))
+
+    @property
+    def memory_bytes(self) -> int:
+        return len(self.bits)
+
+    def false_positive_rate(self) -> float:
+        # 現在の件数での偽陽性率の見積もり (1 - e^(-kn/m))^k。
+        return (1 - math.exp(-self.num_hashes * self.count / self.num_bits)) ** self.num_hashes
@@ -1,16 +1,194 @@
 from __future__ import annotations
 
-from ..models import RawItem
+import asyncio
+import importlib
+import time
+from collections.abc import AsyncIterator, Awaitable, Callable
+from dataclasses import dataclass
+from types import ModuleType
+from typing import TYPE_CHECKING
+from urllib.parse import urlsplit
+
+from ..models import CollectResult, RawItem
 from ..sources import Source
-from . import github_releases_collector, html_collector
+from ..store import Store
+
+if TYPE_CHECKING:
+    import httpx
 
 """ソース種別に応じて適切なコレクターへ委譲する入口。"""
 
+# Source.kind -> コレクターモジュール。bs4 / httpx / feedparser を読み込むため、初めて使うときに import する。
+_COLLECTORS: dict[str, str] = {
+    "html": ".html_collector",
+    "github_releases": ".github_releases_collector",
+    "feed": ".feed_collector",
+}
+
+
+@dataclass(frozen=True, slots=True)
+class HtmlOptions:
+    # HTML 収集の挙動を切り替える設定（Config から組み立てる）。
+    # parser は html_parsers.BACKENDS のいずれか。未インストールなら収集時に html.parser へ戻す。
+    parser: str = "html.parser"
+    # stream が True なら本文を少しずつ受信して逐次解析し、max_sections 件そろった時点で受信をやめる。
+    # max_bytes は stream 時に1ページから読む上限バイト数（0 なら無制限）。
+    stream: bool = False
+    max_bytes: int = 0
+
+
+@dataclass(frozen=True, slots=True)
+class GithubOptions:
+    # GitHub Releases 収集の設定（Config から組み立てる）。
+    # token があれば認証付きで呼び、同じエンドポイントのリポジトリを batch_size 件ずつ GraphQL の1クエリにまとめる。
+    # max_pages は watermark を探して読み進める最大ページ数（1ページ10件）。
+    token: str | None = None
+    batch_size: int = 20
+    max_pages: int = 3
+
+
+@dataclass(frozen=True, slots=True)
+class _Batch:
+    # 1回のリクエストでまとめて収集するソース群。コレクターの collect_batch_async で取得する。
+    kind: str
+    sources: tuple[Source, ...]
+
+
+def _collector(kind: str) -> ModuleType | None:
+    name = _COLLECTORS.get(kind)
+    return importlib.import_module(name, __name__) if name else None
+
 
 def collect_source(source: Source, user_agent: str) -> list[RawItem]:
     # kind フィールドで処理先を切り替える。
+    collector = _collector(source.kind)
+    return collector.collect(source, user_agent) if collector else []
+
+
+async def collect_source_async(
+    client: httpx.AsyncClient,
+    source: Source,
+    user_agent: str,
+    store: Store | None = None,
+    html_options: HtmlOptions | None = None,
+    github_options: GithubOptions | None = None,
+) -> CollectResult:
+    # collect_source の非同期版。共有クライアントと検証子の保存先を各コレクターへ渡す。
+    collector = _collector(source.kind)
+    if collector is None:
+        return CollectResult(items=[])
     if source.kind == "html":
-        return html_collector.collect(source, user_agent)
+        return await collector.collect_async(client, source, user_agent, store, html_options)
     if source.kind == "github_releases":
-        return github_releases_collector.collect(source, user_agent)
-    return []
+        return await collector.collect_async(client, source, user_agent, store, github_options)
+    return await collector.collect_async(client, source, user_agent, store)
+
+
+def _units(sources: list[Source], github_options: GithubOptions | None) -> list[Source | _Batch]:
+    # 収集の単位に分ける。まとめて取得できる GitHub のソースはバッチにし、残りは1件ずつ収集する。
+    github = [s for s in sources if s.kind == "github_releases"]
+    groups = _collector("github_releases").batches(github, github_options) if github and github_options else []
+    batched = {id(s) for group in groups for s in group}
+    units: list[Source | _Batch] = [s for s in sources if id(s) not in batched]
+    units.extend(_Batch("github_releases", tuple(group)) for group in groups)
+    return units
+
+
+def _limited_collector(
+    client: httpx.AsyncClient,
+    user_agent: str,
+    max_concurrency: int,
+    per_host_limit: int,
+    store: Store | None,
+    html_options: HtmlOptions | None,
+    github_options: GithubOptions | None = None,
+) -> Callable[[Source | _Batch], Awaitable[list[tuple[Source, CollectResult | Exception]]]]:
+    # 全体とホスト別のセマフォで同時実行数を制限した収集関数を返す。
+    # 失敗したソースは例外オブジェクトとして返す（全体は止めない）。バッチは全体の枠を1つだけ使う。
+    global_limit = asyncio.Semaphore(max(1, max_concurrency))
+    host_limits: dict[str, asyncio.Semaphore] = {}
+
+    async def run_batch(batch: _Batch) -> list[tuple[Source, CollectResult | Exception]]:
+        sources = list(batch.sources)
+        async with global_limit:
+            started = time.perf_counter()
+            try:
+                results = await _collector(batch.kind).collect_batch_async(
+                    client, sources, user_agent, store, github_options
+                )
+            except Exception as exc:
+                return [(source, exc) for source in sources]
+            elapsed = time.perf_counter() - started
+        for result in results:
+            if not isinstance(result, Exception):
+                result.elapsed = elapsed
+        return list(zip(sources, results))
+
+    async def run(unit: Source | _Batch) -> list[tuple[Source, CollectResult | Exception]]:
+        if isinstance(unit, _Batch):
+            return await run_batch(unit)
+        host = urlsplit(unit.url).netloc
+        host_limit = host_limits.setdefault(host, asyncio.Semaphore(max(1, per_host_limit)))
+        # ホストの枠を先に取る。全体の枠を持ったままホストの空きを待つと、他ホストのソースが進めなくなる。
+        async with host_limit, global_limit:
+            started = time.perf_counter()
+            try:
+                result = await collect_source_async(client, unit, user_agent, store, html_options, github_options)
+            except Exception as exc:
+                return [(unit, exc)]
+            result.elapsed = time.perf_counter() - started
+            return [(unit, result)]
+
+    return run
+
+
+def new_async_client(max_concurrency: int = 8) -> httpx.AsyncClient:
+    # 収集用の共有クライアント。接続数の上限を全体の同時実行数にそろえる。
+    from .. import http_clients
+
+    return http_clients.new_async_client("collect", max_connections=max_concurrency)
+
+
+async def collect_all(
+    sources: list[Source],
+    user_agent: str,
+    max_concurrency: int = 8,
+    per_host_limit: int = 2,
+    client: httpx.AsyncClient | None = None,
+    store: Store | None = None,
+    html_options: HtmlOptions | None = None,
+    github_options: GithubOptions | None = None,
+) -> list[tuple[Source, CollectResult | Exception]]:
+    # 全ソースを同時に収集する。結果は sources と同じ順序で返す。
+    async def gather(shared: httpx.AsyncClient) -> list[tuple[Source, CollectResult | Exception]]:
+        run = _limited_collector(shared, user_agent, max_concurrency, per_host_limit, store, html_options, github_options)
+        done = await asyncio.gather(*(run(unit) for unit in _units(sources, github_options)))
+        results = {id(source): result for pairs in done for source, result in pairs}
+        return [(s, results[id(s)]) for s in sources]
+
+    if client is not None:
+        return await gather(client)
+    async with new_async_client(max_concurrency) as shared:
+        return await gather(shared)
+
+
+async def collect_iter(
+    client: httpx.AsyncClient,
+    sources: list[Source],
+    user_agent: str,
+    max_concurrency: int = 8,
+    per_host_limit: int = 2,
+    store: Store | None = None,
+    html_options: HtmlOptions | None = None,
+    github_options: GithubOptions | None = None,
+) -> AsyncIterator[tuple[Source, CollectResult | Exception]]:
+    # collect_all と同じ制限で収集し、完了したソースから順に返す（後続ステージ向け）。
+    run = _limited_collector(client, user_agent, max_concurrency, per_host_limit, store, html_options, github_options)
+    tasks = [asyncio.create_task(run(unit)) for unit in _units(sources, github_options)]
+    try:
+        for next_done in asyncio.as_completed(tasks):
+            for pair in await next_done:
+                yield pair
+    finally:
+        for task in tasks:
+            task.cancel()
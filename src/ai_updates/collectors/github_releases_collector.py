@@ -1,25 +1,130 @@
 from __future__ import annotations
 
-from datetime import datetime, timezone
+import asyncio
+import json
+import re
+import time
+from collections.abc import Awaitable, Callable
+from dataclasses import dataclass
+from datetime import timezone
+from typing import Any, TypeVar
 
 import httpx
 
-from ..models import RawItem
+from .. import metrics
+from ..http_clients import get_client
+from ..models import CollectResult, RawItem
 from ..sources import Source
-from .http_utils import parse_datetime
+from ..store import Store
+from . import GithubOptions
+from .http_utils import fetch_async, parse_datetime
 
-"""GitHub Releases API から更新情報を収集するコレクター。"""
+"""GitHub Releases から更新情報を収集するコレクター。
 
+前回見た最新リリースの ID を watermark として持ち、それより新しいリリースだけを取り込む。
+REST API はページ単位で watermark に達するまで読み、トークンがあれば GraphQL で複数リポジトリを1回で取得する。
+"""
 
-def collect(source: Source, user_agent: str) -> list[RawItem]:
-    # GitHub API からリリース一覧を取得する。
-    with httpx.Client(timeout=30, follow_redirects=True) as client:
-        res = client.get(source.url, headers={"User-Agent": user_agent, "Accept": "application/vnd.github+json"})
-        res.raise_for_status()
-        releases = res.json()
+T = TypeVar("T")
+
+# 1ページ（GraphQL では1リポジトリ）あたりの取得件数。watermark がない初回はこの件数だけ読む。
+_PER_PAGE = 10
+# レート制限の解除待ちをこの秒数までなら待つ。超える場合はそのソースを失敗にして次回に回す。
+_MAX_RATE_LIMIT_WAIT = 30.0
+# https://api.github.com/repos/<owner>/<repo>/releases（GitHub Enterprise は /api/v3 付き）。
+_REPO_URL = re.compile(r"^(https?://[^/]+)(/api/v3)?/repos/([^/]+)/([^/]+)/releases/?$")
+_RELEASE_FIELDS = "databaseId name tagName url publishedAt description isDraft"
+
+
+def _headers(user_agent: str, token: str | None = None) -> dict[str, str]:
+    # GitHub API 推奨の Accept ヘッダーを付ける。トークンがあれば認証付きで呼ぶ（上限が 60 -> 5000 回/時になる）。
+    headers = {"User-Agent": user_agent, "Accept": "application/vnd.github+json"}
+    if token:
+        headers["Authorization"] = f"Bearer {token}"
+    return headers
+
+
+class RateLimited(Exception):
+    # レート制限に達した。delay 秒後に再試行できる。
+    def __init__(self, resource: str, delay: float) -> None:
+        super().__init__(f"github rate limit exceeded ({resource}), resets in {delay:.0f}s")
+        self.resource = resource
+        self.delay = delay
+
+
+@dataclass(slots=True)
+class _Bucket:
+    remaining: int | None = None
+    reset_at: float = 0.0
+
+
+class RateLimiter:
+    # X-RateLimit-* ヘッダーから resource（REST は core、GraphQL は graphql）ごとの残り回数と解除時刻を追跡する。
+    # 残りが尽きた resource へはリクエストを送らない。収集はイベントループのスレッドだけで行うのでロックは持たない。
+    def __init__(self, clock: Callable[[], float] = time.time) -> None:
+        self._clock = clock
+        self._buckets: dict[str, _Bucket] = {}
 
+    def check(self, resource: str) -> None:
+        bucket = self._buckets.get(resource)
+        if bucket is None or bucket.remaining != 0:
+            return
+        delay = bucket.reset_at - self._clock()
+        if delay > 0:
+            raise RateLimited(resource, delay)
+        bucket.remaining = None
+
+    def update(self, res: httpx.Response, resource: str) -> None:
+        # 応答ヘッダーで残り回数を更新し、制限による 403 / 429 なら RateLimited にする。
+        headers = res.headers
+        bucket = self._buckets.setdefault(headers.get("X-RateLimit-Resource", resource), _Bucket())
+        try:
+            if "X-RateLimit-Remaining" in headers:
+                bucket.remaining = int(headers["X-RateLimit-Remaining"])
+                bucket.reset_at = float(headers.get("X-RateLimit-Reset", "0"))
+        except ValueError:
+            bucket.remaining = None
+        if res.status_code not in (403, 429):
+            return
+        if "Retry-After" in headers:
+            # 二次レート制限（短時間の集中）。指定秒数だけ待てばよい。
+            try:
+                delay = max(float(headers["Retry-After"]), 0.0)
+            except ValueError:
+                delay = 60.0
+            bucket.remaining, bucket.reset_at = 0, self._clock() + delay
+            raise RateLimited(resource, delay)
+        if bucket.remaining == 0:
+            raise RateLimited(resource, max(bucket.reset_at - self._clock(), 0.0))
+
+
+_limiter = RateLimiter()
+
+
+async def _limited(resource: str, request: Callable[[], Awaitable[T]]) -> T:
+    # 制限中なら送らずに失敗させる。解除まで短ければ1回だけ待って送り直す。
+    try:
+        _limiter.check(resource)
+        return await request()
+    except RateLimited as exc:
+        metrics.incr("github_rate_limited")
+        if exc.delay > _MAX_RATE_LIMIT_WAIT:
+            raise
+        print(f"[warn] github rate limited, retrying in {exc.delay:.1f}s")
+        await asyncio.sleep(exc.delay)
+    _limiter.check(resource)
+    return await request()
+
+
+def parse(source: Source, releases: list[dict[str, Any]], watermark: str | None = None) -> list[RawItem]:
+    # API レスポンス（新しい順のリリース一覧）を RawItem へ変換する。watermark のリリースに達したら打ち切る。
     items: list[RawItem] = []
-    for rel in releases[:10]:
+    for rel in releases:
+        if watermark is not None and str(rel.get("id")) == watermark:
+            break
+        if rel.get("draft"):
+            # トークンに書き込み権限があると下書きも返るため、公開済みのものだけを扱う。
+            continue
         # published_at が欠損/不正でも処理できるよう安全にパースする。
         published = parse_datetime(rel.get("published_at"))
         if published.tzinfo is None:
@@ -35,3 +140,189 @@ def collect(source: Source, user_agent: str) -> list[RawItem]:
             )
         )
     return items
+
+
+def _result(
+    source: Source,
+    releases: list[dict[str, Any]],
+    watermark: str | None,
+    validators: tuple[str | None, str | None] | None = None,
+) -> CollectResult:
+    items = parse(source, releases, watermark)
+    newest = next((rel for rel in releases if not rel.get("draft")), None)
+    state = {"watermark": str(newest["id"])} if source.incremental and newest and newest.get("id") else {}
+    return CollectResult(items=items, validators={source.url: validators} if validators else {}, state=state)
+
+
+def _watermark(source: Source, store: Store | None) -> str | None:
+    return store.get_source_state(source.id, "watermark") if store and source.incremental else None
+
+
+def collect(source: Source, user_agent: str) -> list[RawItem]:
+    # GitHub API から最新ページのリリース一覧を取得する（同期版）。
+    res = get_client("github").get(source.url, params={"per_page": _PER_PAGE}, headers=_headers(user_agent))
+    res.raise_for_status()
+    return parse(source, res.json())
+
+
+async def collect_async(
+    client: httpx.AsyncClient,
+    source: Source,
+    user_agent: str,
+    store: Store | None = None,
+    options: GithubOptions | None = None,
+) -> CollectResult:
+    # REST API をページ単位で読み、watermark のリリースが見つかるか max_pages に達したら止める。
+    # 1ページ目は条件付き GET にする（304 は GitHub のレート制限を消費しない）。watermark がない初回は1ページだけ読む。
+    options = options or GithubOptions()
+    cached = store.get_validators(source.url) if store else None
+    watermark = _watermark(source, store)
+    headers = _headers(user_agent, options.token)
+    releases: list[dict[str, Any]] = []
+    validators = None
+    for page in range(1, (max(1, options.max_pages) if watermark else 1) + 1):
+        url = str(httpx.URL(source.url).copy_merge_params({"per_page": _PER_PAGE, "page": page}))
+        fetched = await _limited(
+            "core",
+            lambda: fetch_async(
+                client, url, headers, cached if page == 1 else None, lambda res: _limiter.update(res, "core")
+            ),
+        )
+        if fetched.not_modified:
+            return CollectResult(items=[], not_modified=True)
+        if page == 1:
+            validators = fetched.validators
+        batch = json.loads(fetched.text)
+        releases.extend(batch)
+        if len(batch) < _PER_PAGE or any(str(rel.get("id")) == watermark for rel in batch):
+            break
+    return _result(source, releases, watermark, validators)
+
+
+def graphql_endpoint(source: Source) -> str | None:
+    # REST のリリース一覧 URL に対応する GraphQL エンドポイント。リポジトリを特定できない URL なら None。
+    m = _REPO_URL.match(source.url)
+    if not m:
+        return None
+    return f"{m.group(1)}/api/graphql" if m.group(2) else f"{m.group(1)}/graphql"
+
+
+def batches(sources: list[Source], options: GithubOptions) -> list[list[Source]]:
+    # GraphQL でまとめて取得するソースを、エンドポイントごとに batch_size 件ずつに分ける。
+    if not options.token or options.batch_size < 2:
+        return []
+    by_endpoint: dict[str, list[Source]] = {}
+    for source in sources:
+        endpoint = graphql_endpoint(source)
+        if endpoint:
+            by_endpoint.setdefault(endpoint, []).append(source)
+    return [
+        group[i : i + options.batch_size]
+        for group in by_endpoint.values()
+        for i in range(0, len(group), options.batch_size)
+    ]
+
+
+def _query(count: int) -> str:
+    # リポジトリごとに別名（r0, r1, ...）を付けて1クエリにまとめる。値はすべて変数で渡す。
+    params = ", ".join(f"$o{i}: String!, $n{i}: String!, $c{i}: String" for i in range(count))
+    order = "{field: CREATED_AT, direction: DESC}"
+    fields = f"pageInfo {{ hasNextPage endCursor }} nodes {{ {_RELEASE_FIELDS} }}"
+    repos = " ".join(
+        f"r{i}: repository(owner: $o{i}, name: $n{i}) "
+        f"{{ releases(first: {_PER_PAGE}, after: $c{i}, orderBy: {order}) {{ {fields} }} }}"
+        for i in range(count)
+    )
+    return f"query({params}) {{ {repos} rateLimit {{ cost remaining }} }}"
+
+
+def _rest_shape(node: dict[str, Any]) -> dict[str, Any]:
+    # GraphQL のリリースを REST と同じ形にそろえ、どちらの経路でも同じ RawItem（fingerprint）になるようにする。
+    return {
+        "id": node.get("databaseId"),
+        "name": node.get("name"),
+        "tag_name": node.get("tagName"),
+        "html_url": node.get("url"),
+        "published_at": node.get("publishedAt"),
+        "body": node.get("description"),
+        "draft": node.get("isDraft"),
+    }
+
+
+async def _graphql(
+    client: httpx.AsyncClient,
+    endpoint: str,
+    headers: dict[str, str],
+    repos: list[tuple[str, str, str | None]],
+) -> tuple[dict[str, Any], dict[str, str]]:
+    # (owner, name, cursor) の一覧を1回のクエリで取得し、別名 -> データと別名 -> エラー文を返す。
+    variables: dict[str, Any] = {}
+    for i, (owner, name, cursor) in enumerate(repos):
+        variables.update({f"o{i}": owner, f"n{i}": name, f"c{i}": cursor})
+
+    async def request() -> httpx.Response:
+        started = time.perf_counter()
+        res = await client.post(endpoint, headers=headers, json={"query": _query(len(repos)), "variables": variables})
+        metrics.observe("fetch", time.perf_counter() - started)
+        metrics.incr("fetch_requests")
+        metrics.incr("github_graphql_requests")
+        _limiter.update(res, "graphql")
+        res.raise_for_status()
+        return res
+
+    res = await _limited("graphql", request)
+    metrics.incr("fetch_bytes", len(res.content))
+    payload = res.json()
+    data = payload.get("data") or {}
+    errors: dict[str, str] = {}
+    for error in payload.get("errors") or []:
+        path = error.get("path") or []
+        if path:
+            errors[str(path[0])] = error.get("message", "graphql error")
+        elif not data:
+            raise RuntimeError(f"github graphql error: {error.get('message')}")
+    return data, errors
+
+
+async def collect_batch_async(
+    client: httpx.AsyncClient,
+    sources: list[Source],
+    user_agent: str,
+    store: Store | None = None,
+    options: GithubOptions | None = None,
+) -> list[CollectResult | Exception]:
+    # 同じエンドポイントの複数リポジトリを GraphQL でまとめて取得する（結果は sources と同じ順序）。
+    # watermark が1ページ目に見つからなかったリポジトリだけ、カーソルで次のページをまとめて取りに行く。
+    options = options or GithubOptions()
+    endpoint = graphql_endpoint(sources[0])
+    if endpoint is None:
+        raise ValueError(f"not a GitHub releases URL: {sources[0].url}")
+    headers = _headers(user_agent, options.token)
+    repos = [_REPO_URL.match(source.url).group(3, 4) for source in sources]
+    watermarks = [_watermark(source, store) for source in sources]
+    releases: list[list[dict[str, Any]]] = [[] for _ in sources]
+    results: list[CollectResult | Exception | None] = [None] * len(sources)
+    pending = [(i, None) for i in range(len(sources))]
+    for _ in range(max(1, options.max_pages)):
+        data, errors = await _graphql(client, endpoint, headers, [(*repos[i], cursor) for i, cursor in pending])
+        next_pending: list[tuple[int, str | None]] = []
+        for alias, (i, _cursor) in enumerate(pending):
+            repo = data.get(f"r{alias}")
+            if repo is None:
+                results[i] = RuntimeError(errors.get(f"r{alias}", "repository not found"))
+                continue
+            connection = repo["releases"]
+            nodes = [_rest_shape(node) for node in connection["nodes"]]
+            releases[i].extend(nodes)
+            watermark = watermarks[i]
+            if watermark is None or any(str(rel["id"]) == watermark for rel in nodes):
+                continue
+            if connection["pageInfo"]["hasNextPage"]:
+                next_pending.append((i, connection["pageInfo"]["endCursor"]))
+        pending = next_pending
+        if not pending:
+            break
+    return [
+        result if result is not None else _result(source, releases[i], watermarks[i])
+        for i, (source, result) in enumerate(zip(sources, results))
+    ]
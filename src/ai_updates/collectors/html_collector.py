@@ -1,104 +1,203 @@
 from __future__ import annotations
 
+import asyncio
+import hashlib
 import re
+import time
 from datetime import datetime, timezone
 
-from bs4 import BeautifulSoup
+import httpx
 
-from ..models import RawItem
+from .. import metrics
+from ..models import CollectResult, RawItem
+from ..normalize import parse_heading_date, section_id, slugify
 from ..sources import Source
-from .http_utils import fetch_text
+from ..store import Store
+from . import HtmlOptions
+from .html_parsers import DEFAULT_BACKEND, Section, SectionStream, open_page, resolve_backend, supports_streaming
+from .http_utils import FetchResult, fetch_stream_async, fetch_text, fetch_text_async
 
 """HTMLページから更新候補を抽出するコレクター。"""
 
+# 見出し処理は normalize 側へ移した（Store の移行処理からも使うため）。旧名でも参照できるようにしておく。
+_slugify = slugify
+_parse_date_from_text = parse_heading_date
+
+
+_CONTAINER_PATTERNS = [
+    re.compile(r"<main\b.*</main\s*>", re.IGNORECASE | re.DOTALL),
+    re.compile(r"<article\b.*</article\s*>", re.IGNORECASE | re.DOTALL),
+    re.compile(r"<body\b.*</body\s*>", re.IGNORECASE | re.DOTALL),
+]
+# 内容と無関係に毎回変わりうる部分（スクリプト、スタイル、コメント、nonce 属性）。
+_VOLATILE_PATTERNS = [
+    re.compile(r"<script\b.*?</script\s*>", re.IGNORECASE | re.DOTALL),
+    re.compile(r"<style\b.*?</style\s*>", re.IGNORECASE | re.DOTALL),
+    re.compile(r"<!--.*?-->", re.DOTALL),
+    re.compile(r"\snonce=(\"[^\"]*\"|'[^']*'|[^\s>]+)", re.IGNORECASE),
+]
+
+
+def page_digest(html: str) -> str:
+    # DOM を構築せずに、抽出対象の部分だけを正規表現で切り出してハッシュ化する。
+    fragment = html
+    for pattern in _CONTAINER_PATTERNS:
+        m = pattern.search(html)
+        if m:
+            fragment = m.group(0)
+            break
+    for pattern in _VOLATILE_PATTERNS:
+        fragment = pattern.sub("", fragment)
+    fragment = re.sub(r"\s+", " ", fragment).strip()
+    return hashlib.sha256(fragment.encode("utf-8")).hexdigest()
+
+
+def _to_item(source: Source, page_title: str, section: Section) -> RawItem:
+    heading, body, published_at = section
+    return RawItem(
+        source_id=source.id,
+        service=source.service,
+        title=f"{heading} | {page_title}",
+        url=f"{source.url}#{slugify(heading)}",
+        published_at=published_at or datetime.now(timezone.utc),
+        body=body,
+        # 識別子は位置ではなく「見出し + 日付 + 本文ハッシュ」で決める。
+        # 上に新セクションが増えても既存セクションの fingerprint は変わらない。
+        section_id=section_id(heading, body, published_at),
+    )
+
+
+def parse(
+    source: Source,
+    html: str,
+    backend: str = DEFAULT_BACKEND,
+    watermark: str | None = None,
+    truncated: bool = False,
+) -> list[RawItem]:
+    # 取得済み HTML をセクションごとに RawItem 化する。
+    # watermark（前回見た最新セクションの識別子）に到達したら、それ以降は既読なので打ち切る。
+    # truncated（受信量の上限で切れた HTML）なら、途中で終わっているかもしれない最後のセクションを使わない。
+    title, sections = open_page(html, backend, source.plan)
+    page_title = title or source.label
 
-def _slugify(text: str) -> str:
-    # 見出し文字列を URL フラグメント向けの安全な形へ変換する。
-    s = re.sub(r"[^a-zA-Z0-9\s-]", "", text).strip().lower()
-    s = re.sub(r"[\s_-]+", "-", s)
-    return s[:60] or "update"
-
-
-def _parse_date_from_text(text: str) -> datetime | None:
-    # 見出しに含まれる日付を拾う（YYYY-MM-DD / Month DD, YYYY）。
-    patterns = [
-        r"(20\\d{2})[-/](\\d{1,2})[-/](\\d{1,2})",
-        r"(January|February|March|April|May|June|July|August|September|October|November|December)\\s+(\\d{1,2}),\\s*(20\\d{2})",
-    ]
-    m = re.search(patterns[0], text, flags=re.IGNORECASE)
-    if m:
-        y, mo, d = m.groups()
-        try:
-            return datetime(int(y), int(mo), int(d), tzinfo=timezone.utc)
-        except ValueError:
-            return None
-    m = re.search(patterns[1], text, flags=re.IGNORECASE)
-    if m:
-        mon, d, y = m.groups()
-        try:
-            return datetime.strptime(f"{mon} {d} {y}", "%B %d %Y").replace(tzinfo=timezone.utc)
-        except ValueError:
-            return None
-    return None
-
-
-def _extract_sections(soup: BeautifulSoup) -> list[tuple[str, str, datetime | None]]:
-    # main/article 配下の h2/h3 を起点に「見出し + 本文」を区切って抽出する。
-    main = soup.find("main") or soup.find("article") or soup.body
-    if not main:
-        return []
-
-    sections: list[tuple[str, str, datetime | None]] = []
-    headers = main.find_all(["h2", "h3"])
-    if not headers:
-        # 見出しがないページは先頭テキストを1件として扱う。
-        text = " ".join(p.get_text(" ", strip=True) for p in main.find_all(["p", "li"])[:80])
-        return [("Latest Update", text, None)] if text else []
-
-    for h in headers[:20]:
-        heading = h.get_text(" ", strip=True)
-        parts: list[str] = []
-        for sib in h.next_siblings:
-            if getattr(sib, "name", None) in ["h2", "h3"]:
-                # 次の見出しに到達したら現セクション終了。
-                break
-            if getattr(sib, "name", None) in ["p", "li", "ul", "ol", "div"]:
-                txt = sib.get_text(" ", strip=True)
-                if txt:
-                    parts.append(txt)
-            if len(" ".join(parts)) > 2500:
-                # 1件が長すぎると要約品質が落ちるため上限を設ける。
-                break
-        body = " ".join(parts).strip()
-        if not body:
-            continue
-        sections.append((heading, body, _parse_date_from_text(heading)))
-    return sections
+    items: list[RawItem] = []
+    for section in sections:
+        item = _to_item(source, page_title, section)
+        if watermark is not None and item.section_id == watermark:
+            break
+        items.append(item)
+    else:
+        if truncated and items:
+            items.pop()
+    return items
 
 
 def collect(source: Source, user_agent: str) -> list[RawItem]:
-    # ページ全体を取得し、セクションごとに RawItem 化する。
-    html = fetch_text(source.url, user_agent)
-    soup = BeautifulSoup(html, "html.parser")
-
-    page_title = soup.title.get_text(strip=True) if soup.title else source.label
-    sections = _extract_sections(soup)
-    if not sections:
-        return []
-
+    # ページ全体を取得して解析する（同期版）。
+    return parse(source, fetch_text(source.url, user_agent))
+
+
+def _watermark(source: Source, store: Store | None) -> str | None:
+    # 新しい順に並ぶページは、前回の最新セクションに達した時点で解析を止める。
+    return store.get_source_state(source.id, "watermark") if store and source.incremental else None
+
+
+async def _collect_streaming(
+    client: httpx.AsyncClient,
+    source: Source,
+    user_agent: str,
+    store: Store | None,
+    max_bytes: int,
+) -> CollectResult:
+    # 受信した断片をそのまま逐次パーサーへ流し、max_sections 件か watermark に達したら受信をやめる。
+    # ページ全体も文書木も持たないため、ページダイジェストによる省略は使わない。
+    cached = store.get_validators(source.url) if store else None
+    watermark = _watermark(source, store)
+    stream = SectionStream(source.plan)
     items: list[RawItem] = []
-    for idx, (heading, body, published_at) in enumerate(sections):
-        # 同一ページ内でもユニークURLになるよう index を付ける。
-        fragment = _slugify(heading)
-        url = f"{source.url}#{fragment}-{idx}"
-        items.append(
-            RawItem(
-                source_id=source.id,
-                service=source.service,
-                title=f"{heading} | {page_title}",
-                url=url,
-                published_at=published_at or datetime.now(timezone.utc),
-                body=body,
-            )
-        )
-    return items
+    reached_watermark = False
+    parse_seconds = 0.0
+
+    def take(sections: list[Section]) -> bool:
+        nonlocal reached_watermark
+        for section in sections:
+            item = _to_item(source, stream.title or source.label, section)
+            if watermark is not None and item.section_id == watermark:
+                reached_watermark = True
+                break
+            items.append(item)
+        return reached_watermark
+
+    def consume(chunk: str) -> bool:
+        nonlocal parse_seconds
+        started = time.perf_counter()
+        stop = take(stream.feed(chunk)) or stream.done
+        parse_seconds += time.perf_counter() - started
+        return stop
+
+    fetched = await fetch_stream_async(client, source.url, {"User-Agent": user_agent}, consume, cached, max_bytes)
+    if fetched.not_modified:
+        return CollectResult(items=[], not_modified=True)
+    if reached_watermark or stream.done:
+        # max_sections 件そろったか watermark に達して、ページの途中で受信をやめた。
+        metrics.incr("parse_early_stops")
+    if not reached_watermark and not fetched.truncated:
+        # 上限で切れたときは、途中で終わっているかもしれない最後のセクションを使わない。
+        take(stream.close())
+    metrics.observe("parse", parse_seconds)
+    state = {"watermark": items[0].section_id} if source.incremental and items else {}
+    return CollectResult(items=items, validators={source.url: fetched.validators}, state=state)
+
+
+async def _fetch_page(
+    client: httpx.AsyncClient,
+    url: str,
+    user_agent: str,
+    cached: tuple[str | None, str | None] | None,
+    options: HtmlOptions,
+) -> FetchResult:
+    if not options.stream:
+        return await fetch_text_async(client, url, user_agent, cached)
+    # 文書木が必要なプランでも、受信量の上限だけは守ってから従来どおり解析する。
+    chunks: list[str] = []
+    fetched = await fetch_stream_async(
+        client, url, {"User-Agent": user_agent}, lambda chunk: chunks.append(chunk) or False, cached, options.max_bytes
+    )
+    if not fetched.not_modified:
+        fetched.text = "".join(chunks)
+    return fetched
+
+
+async def collect_async(
+    client: httpx.AsyncClient,
+    source: Source,
+    user_agent: str,
+    store: Store | None = None,
+    options: HtmlOptions | None = None,
+) -> CollectResult:
+    # 取得は共有クライアントで非同期に行い、CPU負荷の高い解析はスレッドへ逃がす。
+    options = options or HtmlOptions()
+    if options.stream and supports_streaming(source.plan):
+        return await _collect_streaming(client, source, user_agent, store, options.max_bytes)
+    cached = store.get_validators(source.url) if store else None
+    fetched = await _fetch_page(client, source.url, user_agent, cached, options)
+    if fetched.not_modified:
+        # 304 ならページは前回から変わっていないので解析しない。
+        return CollectResult(items=[], not_modified=True)
+    validators = {source.url: fetched.validators}
+    # 上限で切れたページは切れ目によって内容が変わるため、ダイジェストで省略も保存もしない。
+    digest = None if fetched.truncated else page_digest(fetched.text)
+    if digest and store and store.get_source_state(source.id, "page_digest") == digest:
+        # 検証子が使えないサイトでも、抽出対象部分が同一なら解析を省略する。
+        metrics.incr("page_digest_hits")
+        return CollectResult(items=[], not_modified=True, validators=validators)
+    watermark = _watermark(source, store)
+    started = time.perf_counter()
+    items = await asyncio.to_thread(
+        parse, source, fetched.text, resolve_backend(options.parser), watermark, fetched.truncated
+    )
+    metrics.observe("parse", time.perf_counter() - started)
+    state = {"page_digest": digest} if digest else {}
+    if source.incremental and items:
+        state["watermark"] = items[0].section_id
+    return CollectResult(items=items, validators=validators, state=state)
@@ -0,0 +1,628 @@
+from __future__ import annotations
+
+import html as htmllib
+import importlib.util
+import re
+from collections.abc import Callable, Iterable, Iterator
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+from functools import lru_cache
+from html.parser import HTMLParser
+from typing import Any, Protocol
+
+from bs4 import BeautifulSoup, SoupStrainer
+
+from ..normalize import MAX_BODY_CHARS, parse_heading_date
+from ..sources import ExtractionPlan
+
+"""HTML パーサーの差し替え層。どのバックエンドでも同じセクション抽出結果を返す。"""
+
+# 利用できるバックエンド。lxml / selectolax は任意依存（`pip install -e .[fast]`）。
+BACKENDS = ("html.parser", "lxml", "selectolax")
+DEFAULT_BACKEND = "html.parser"
+
+Section = tuple[str, str, datetime | None]
+
+# BeautifulSoup の get_text と同じく、これらの要素内の文字列は本文として扱わない。
+_NON_TEXT_TAGS = {"script", "style", "template"}
+# 抽出方法が指定されていないソース向けの標準プラン。
+DEFAULT_PLAN = ExtractionPlan()
+# 「h2, h3」のようなタグ名だけのセレクターと、SoupStrainer へ変換できる単純なセレクター。
+_TAG_LIST = re.compile(r"^\s*[a-zA-Z][\w-]*(\s*,\s*[a-zA-Z][\w-]*)*\s*$")
+_SIMPLE_SELECTOR = re.compile(r"^\s*([a-zA-Z][\w-]*)?(?:#([\w-]+))?(?:\.([\w-]+))?\s*$")
+_TITLE = re.compile(r"<title\b[^>]*>(.*?)</title\s*>", re.IGNORECASE | re.DOTALL)
+
+
+@dataclass(slots=True)
+class ParsedPage:
+    title: str | None
+    sections: list[Section]
+
+
+@dataclass(frozen=True, slots=True)
+class _CompiledPlan:
+    # ExtractionPlan を解析で直接使える形にしたもの。compile_plan でプロセス内に1回だけ作る。
+    plan: ExtractionPlan
+    # セレクターがタグ名の列挙だけなら、CSS 照合を使わずタグ名の比較で済ませる。
+    heading_tags: frozenset[str] | None
+    body_tags: frozenset[str] | None
+    date_regex: re.Pattern[str] | None
+    # コンテナだけを解析するための SoupStrainer（単純なセレクターの場合のみ）。
+    strainer: SoupStrainer | None
+
+
+def _tag_names(selector: str) -> frozenset[str] | None:
+    if not _TAG_LIST.match(selector):
+        return None
+    return frozenset(name.strip().lower() for name in selector.split(","))
+
+
+def _strainer(selector: str | None) -> SoupStrainer | None:
+    # "main" / "div#notes" / "section.release" 程度のセレクターだけ SoupStrainer にする。
+    if not selector:
+        return None
+    m = _SIMPLE_SELECTOR.match(selector)
+    if not m or not any(m.groups()):
+        return None
+    name, element_id, class_name = m.groups()
+    attrs: dict[str, Any] = {}
+    if element_id:
+        attrs["id"] = element_id
+    if class_name:
+        # 解析中の class 属性は空白区切りの文字列なので、単語単位で照合する。
+        attrs["class"] = re.compile(rf"(^|\s){re.escape(class_name)}(\s|$)")
+    return SoupStrainer(name.lower() if name else None, attrs=attrs)
+
+
+@lru_cache(maxsize=None)
+def compile_plan(plan: ExtractionPlan) -> _CompiledPlan:
+    # プランはソース定義に固定されているため、正規表現や SoupStrainer は使い回す。
+    return _CompiledPlan(
+        plan=plan,
+        heading_tags=_tag_names(plan.heading),
+        body_tags=_tag_names(plan.body),
+        date_regex=re.compile(plan.date_pattern) if plan.date_pattern else None,
+        strainer=_strainer(plan.container),
+    )
+
+
+class _Dom(Protocol):
+    # セクション抽出に必要な最小限の DOM 操作。バックエンドごとに実装する。
+    def title(self) -> str | None: ...
+
+    def container(self, selector: str | None) -> Any | None: ...
+
+    def find_all(self, node: Any, names: list[str]) -> list[Any]: ...
+
+    def select(self, node: Any, selector: str) -> list[Any]: ...
+
+    def matches(self, node: Any, selector: str) -> bool: ...
+
+    def attr(self, node: Any, name: str) -> str | None: ...
+
+    def next_siblings(self, node: Any) -> Iterator[Any]: ...
+
+    def name(self, node: Any) -> str | None: ...
+
+    def text(self, node: Any) -> str: ...
+
+
+class _SoupDom:
+    # BeautifulSoup（html.parser / lxml）用の実装。strainer があればその要素だけを木にする。
+    def __init__(self, html: str, features: str, strainer: SoupStrainer | None = None) -> None:
+        self.soup = BeautifulSoup(html, features, parse_only=strainer)
+        # コンテナだけを解析した場合は title 要素が木に含まれないため、正規表現で拾う。
+        self._raw_title = None
+        if strainer is not None:
+            m = _TITLE.search(html)
+            self._raw_title = htmllib.unescape(m.group(1)).strip() if m else None
+
+    def title(self) -> str | None:
+        if self._raw_title is not None:
+            return self._raw_title
+        return self.soup.title.get_text(strip=True) if self.soup.title else None
+
+    def container(self, selector: str | None) -> Any | None:
+        if selector:
+            return self.soup.select_one(selector)
+        return self.soup.find("main") or self.soup.find("article") or self.soup.body
+
+    def find_all(self, node: Any, names: list[str]) -> list[Any]:
+        return node.find_all(names)
+
+    def select(self, node: Any, selector: str) -> list[Any]:
+        return node.select(selector)
+
+    def matches(self, node: Any, selector: str) -> bool:
+        return node.css.match(selector)
+
+    def attr(self, node: Any, name: str) -> str | None:
+        value = node.get(name)
+        return " ".join(value) if isinstance(value, list) else value
+
+    def next_siblings(self, node: Any) -> Iterator[Any]:
+        return node.next_siblings
+
+    def name(self, node: Any) -> str | None:
+        return getattr(node, "name", None)
+
+    def text(self, node: Any) -> str:
+        return node.get_text(" ", strip=True)
+
+
+class _LexborDom:
+    # selectolax（Lexbor エンジン）用の実装。テキスト連結は get_text(" ", strip=True) と揃える。
+    def __init__(self, html: str) -> None:
+        from selectolax.lexbor import LexborHTMLParser
+
+        self.tree = LexborHTMLParser(html)
+
+    def title(self) -> str | None:
+        node = self.tree.css_first("title")
+        return self._join(node, "") if node is not None else None
+
+    def container(self, selector: str | None) -> Any | None:
+        if selector:
+            return self.tree.css_first(selector)
+        return self.tree.css_first("main") or self.tree.css_first("article") or self.tree.body
+
+    def find_all(self, node: Any, names: list[str]) -> list[Any]:
+        return node.css(", ".join(names))
+
+    def select(self, node: Any, selector: str) -> list[Any]:
+        return node.css(selector)
+
+    def matches(self, node: Any, selector: str) -> bool:
+        return node.css_matches(selector)
+
+    def attr(self, node: Any, name: str) -> str | None:
+        return node.attributes.get(name)
+
+    def next_siblings(self, node: Any) -> Iterator[Any]:
+        sib = node.next
+        while sib is not None:
+            yield sib
+            sib = sib.next
+
+    def name(self, node: Any) -> str | None:
+        # テキストやコメントのノード名は "-text" / "-comment" なので None 扱いにする。
+        return None if node.tag.startswith("-") else node.tag
+
+    def text(self, node: Any) -> str:
+        return self._join(node, " ")
+
+    @staticmethod
+    def _join(node: Any, separator: str) -> str:
+        parts: list[str] = []
+        for child in node.traverse(include_text=True):
+            if child.tag != "-text" or (child.parent is not None and child.parent.tag in _NON_TEXT_TAGS):
+                continue
+            text = (child.text_content or "").strip()
+            if text:
+                parts.append(text)
+        return separator.join(parts)
+
+
+def available_backends() -> list[str]:
+    # インストール済みのバックエンドだけを返す。
+    modules = {"html.parser": None, "lxml": "lxml", "selectolax": "selectolax"}
+    return [name for name, module in modules.items() if module is None or importlib.util.find_spec(module)]
+
+
+@lru_cache(maxsize=None)
+def resolve_backend(name: str) -> str:
+    # 未知・未インストールのバックエンド指定は警告して標準パーサーへ戻す（警告はプロセス内で1回）。
+    if name in available_backends():
+        return name
+    print(f"[warn] html parser backend unavailable, using {DEFAULT_BACKEND}: {name}")
+    return DEFAULT_BACKEND
+
+
+def _build_dom(html: str, backend: str, compiled: _CompiledPlan) -> _Dom:
+    # selectolax は全体の解析でも十分速いため、SoupStrainer による絞り込みは BeautifulSoup 系だけで使う。
+    if backend == "selectolax":
+        return _LexborDom(html)
+    if backend == "lxml":
+        return _SoupDom(html, "lxml", compiled.strainer)
+    return _SoupDom(html, "html.parser", compiled.strainer)
+
+
+def _is(dom: _Dom, node: Any, name: str, tags: frozenset[str] | None, selector: str) -> bool:
+    return name in tags if tags is not None else dom.matches(node, selector)
+
+
+def _parse_date_value(value: str) -> datetime | None:
+    # 属性や正規表現で拾った日付は ISO8601 を優先し、だめなら見出し用の書式で読む。
+    try:
+        parsed = datetime.fromisoformat(value.strip().replace("Z", "+00:00"))
+    except ValueError:
+        return parse_heading_date(value)
+    return parsed if parsed.tzinfo else parsed.replace(tzinfo=timezone.utc)
+
+
+def _section_date(dom: _Dom, node: Any, heading: str, compiled: _CompiledPlan) -> datetime | None:
+    value = None
+    if compiled.plan.date_attr:
+        # 見出し自身になければ、配下で最初にその属性を持つ要素（<time datetime> など）を見る。
+        value = dom.attr(node, compiled.plan.date_attr)
+        if value is None:
+            found = dom.select(node, f"[{compiled.plan.date_attr}]")
+            value = dom.attr(found[0], compiled.plan.date_attr) if found else None
+    return _resolve_date(value, heading, compiled)
+
+
+def _resolve_date(value: str | None, heading: str, compiled: _CompiledPlan) -> datetime | None:
+    # 日付属性の値 -> date_pattern -> 見出しの日付書式 の順に試す。
+    if compiled.plan.date_attr:
+        parsed = _parse_date_value(value) if value else None
+        if parsed:
+            return parsed
+    if compiled.date_regex:
+        m = compiled.date_regex.search(heading)
+        if m:
+            parsed = _parse_date_value(m.group(1) if m.groups() else m.group(0))
+            if parsed:
+                return parsed
+    return parse_heading_date(heading)
+
+
+def iter_sections(dom: _Dom, plan: ExtractionPlan = DEFAULT_PLAN) -> Iterator[Section]:
+    # コンテナ配下の見出しを起点に「見出し + 本文」を区切って、上から順に1件ずつ返す。
+    # 本文は要求された時点で組み立てるため、呼び出し側が途中で止めれば以降の兄弟要素は走査しない。
+    compiled = compile_plan(plan)
+    main = dom.container(plan.container)
+    if not main:
+        return
+
+    if compiled.heading_tags is not None:
+        headers = dom.find_all(main, sorted(compiled.heading_tags))
+    else:
+        headers = dom.select(main, plan.heading)
+    if not headers:
+        # 見出しがないページは先頭テキストを1件として扱う。
+        text = " ".join(dom.text(p) for p in dom.find_all(main, ["p", "li"])[:80])
+        if text:
+            yield ("Latest Update", text, None)
+        return
+
+    for h in headers[: plan.max_sections]:
+        heading = dom.text(h)
+        parts: list[str] = []
+        for sib in dom.next_siblings(h):
+            name = dom.name(sib)
+            if name is not None and _is(dom, sib, name, compiled.heading_tags, plan.heading):
+                # 次の見出しに到達したら現セクション終了。
+                break
+            if name is not None and _is(dom, sib, name, compiled.body_tags, plan.body):
+                txt = dom.text(sib)
+                if txt:
+                    parts.append(txt)
+            if len(" ".join(parts)) > MAX_BODY_CHARS:
+                # 1件が長すぎると要約品質が落ちるため上限を設ける。
+                break
+        body = " ".join(parts).strip()
+        if not body:
+            continue
+        yield (heading, body, _section_date(dom, h, heading, compiled))
+
+
+def open_page(
+    html: str,
+    backend: str = DEFAULT_BACKEND,
+    plan: ExtractionPlan | None = None,
+) -> tuple[str | None, Iterator[Section]]:
+    # 指定バックエンドで HTML を解析し、ページタイトルと遅延評価のセクション列を返す。
+    if backend not in BACKENDS:
+        raise ValueError(f"unknown html parser backend: {backend}")
+    plan = plan or DEFAULT_PLAN
+    dom = _build_dom(html, backend, compile_plan(plan))
+    return dom.title(), iter_sections(dom, plan)
+
+
+def parse_page(html: str, backend: str = DEFAULT_BACKEND, plan: ExtractionPlan | None = None) -> ParsedPage:
+    # 指定バックエンドで HTML を解析し、ページタイトルとセクション一覧を返す。
+    title, sections = open_page(html, backend, plan)
+    return ParsedPage(title=title, sections=list(sections))
+
+
+# 終了タグを持たない要素。開始タグの時点で閉じたものとして扱う。
+_VOID_TAGS = frozenset(
+    {"area", "base", "br", "col", "embed", "hr", "img", "input", "link", "meta", "param", "source", "track", "wbr"}
+)
+_Matcher = Callable[[str, dict[str, str]], bool]
+
+
+def _simple_matcher(selector: str) -> _Matcher | None:
+    # "h2, h3" / "h4.title" / "div#notes" のような単純なセレクターの列挙だけを照合関数にする。
+    rules: list[tuple[str | None, str | None, str | None]] = []
+    for part in selector.split(","):
+        m = _SIMPLE_SELECTOR.match(part)
+        if not m or not any(m.groups()):
+            return None
+        name, element_id, class_name = m.groups()
+        rules.append((name.lower() if name else None, element_id, class_name))
+
+    def match(tag: str, attrs: dict[str, str]) -> bool:
+        for name, element_id, class_name in rules:
+            if name and tag != name:
+                continue
+            if element_id and attrs.get("id") != element_id:
+                continue
+            if class_name and class_name not in attrs.get("class", "").split():
+                continue
+            return True
+        return False
+
+    return match
+
+
+@lru_cache(maxsize=None)
+def _stream_matchers(plan: ExtractionPlan) -> tuple[_Matcher | None, _Matcher, _Matcher] | None:
+    # 逐次解析は木を持たないため、要素単体で判定できるセレクターのプランだけを扱う。
+    container = _simple_matcher(plan.container) if plan.container else None
+    heading = _simple_matcher(plan.heading)
+    body = _simple_matcher(plan.body)
+    if (plan.container and container is None) or heading is None or body is None:
+        return None
+    return container, heading, body
+
+
+def supports_streaming(plan: ExtractionPlan | None = None) -> bool:
+    return _stream_matchers(plan or DEFAULT_PLAN) is not None
+
+
+@dataclass(slots=True)
+class _OpenSection:
+    # 解析途中のセクション。depth は見出し要素の深さで、本文になる兄弟要素も同じ深さに現れる。
+    depth: int
+    heading: list[str] = field(default_factory=list)
+    date_value: str | None = None
+    in_heading: bool = True
+    parts: list[str] = field(default_factory=list)
+    # 本文として拾っている最中の兄弟要素の文字列。
+    current: list[str] | None = None
+    closed: bool = False
+
+
+class _SectionParser(HTMLParser):
+    # iter_sections と同じ規則（見出しの後に続く兄弟要素を本文にする）を、木を作らずにイベントだけで再現する。
+    # 見出しごとに _OpenSection を持ち、入れ子の見出しがあっても上から順に確定させる。
+    def __init__(self, plan: ExtractionPlan) -> None:
+        super().__init__(convert_charrefs=True)
+        self.compiled = compile_plan(plan)
+        self.is_container, self.is_heading, self.is_body = _stream_matchers(plan)
+        self.title: str | None = None
+        self.ready: list[Section] = []
+        self.done = False
+        self._title_parts: list[str] | None = None
+        self._pending: list[str] = []
+        self._stack: list[str] = []
+        self._skip = 0
+        # コンテナ要素の深さ。標準プランで body を仮のコンテナにしている間は provisional。
+        self._scope: int | None = None
+        self._provisional = False
+        self._sections: list[_OpenSection] = []
+        self._headings = 0
+        # 見出しのないページ向けに、先頭の p / li の文字列を開始順に持つ。
+        self._fallback: list[list[str]] = []
+        self._fallback_open: list[tuple[int, list[str]]] = []
+
+    def handle_starttag(self, tag: str, attrs: list[tuple[str, str | None]]) -> None:
+        if self.done:
+            return
+        self._flush_text()
+        self._stack.append(tag)
+        self._open(tag, {name: value or "" for name, value in attrs}, len(self._stack))
+        if tag in _VOID_TAGS:
+            self._pop_to(len(self._stack) - 1)
+
+    def handle_endtag(self, tag: str) -> None:
+        # 対応する開始タグがなければ無視し、あればその内側の閉じ忘れもまとめて閉じる（BeautifulSoup と同じ）。
+        if self.done:
+            return
+        self._flush_text()
+        for index in range(len(self._stack) - 1, -1, -1):
+            if self._stack[index] == tag:
+                self._pop_to(index)
+                return
+
+    def handle_data(self, data: str) -> None:
+        # 断片の境目でテキストが分かれて届くため、次のタグやコメントまでつなげてから1つの文字列として扱う。
+        if not self.done:
+            self._pending.append(data)
+
+    def handle_comment(self, data: str) -> None:
+        self._flush_text()
+
+    def _flush_text(self) -> None:
+        if not self._pending:
+            return
+        text = "".join(self._pending).strip()
+        self._pending.clear()
+        if self._title_parts is not None:
+            self._title_parts.append(text)
+        if self._skip or self._scope is None or not text:
+            return
+        for sec in self._sections:
+            if sec.closed:
+                continue
+            if sec.in_heading:
+                sec.heading.append(text)
+            elif sec.current is not None:
+                sec.current.append(text)
+        for _, parts in self._fallback_open:
+            parts.append(text)
+
+    def finish(self) -> None:
+        # 文書の終わり。閉じられていない要素を閉じてから残りを確定する。
+        if not self.done:
+            self._flush_text()
+            self._pop_to(0)
+            self._finalize()
+
+    def _enter_scope(self, tag: str, attrs: dict[str, str], depth: int) -> bool:
+        if self.is_container is not None:
+            if self.is_container(tag, attrs):
+                self._scope = depth
+                return True
+            return False
+        if tag in ("main", "article"):
+            # 標準プランは main / article を優先する。仮に body で拾っていた分は捨てる。
+            self._scope, self._provisional = depth, False
+            self._sections, self._headings = [], 0
+            self._fallback, self._fallback_open = [], []
+            return True
+        if tag == "body" and self._scope is None:
+            self._scope, self._provisional = depth, True
+            return True
+        return False
+
+    def _open(self, tag: str, attrs: dict[str, str], depth: int) -> None:
+        if tag in _NON_TEXT_TAGS:
+            self._skip += 1
+        if tag == "title" and self.title is None and self._title_parts is None:
+            self._title_parts = []
+        if (self._scope is None or self._provisional) and self._enter_scope(tag, attrs, depth):
+            return
+        if self._scope is None or depth <= self._scope:
+            return
+        date_attr = self.compiled.plan.date_attr
+        heading = self.is_heading(tag, attrs)
+        for sec in self._sections:
+            if sec.closed:
+                continue
+            if sec.in_heading:
+                if date_attr and sec.date_value is None and date_attr in attrs:
+                    sec.date_value = attrs[date_attr]
+            elif depth == sec.depth and sec.current is None:
+                if heading:
+                    # 次の見出しに到達したら現セクション終了。
+                    self._close_section(sec)
+                elif self.is_body(tag, attrs):
+                    sec.current = []
+        if heading:
+            if self._headings < self.compiled.plan.max_sections:
+                sec = _OpenSection(depth)
+                if date_attr and date_attr in attrs:
+                    sec.date_value = attrs[date_attr]
+                self._sections.append(sec)
+            self._headings += 1
+        elif self._headings == 0 and tag in ("p", "li") and len(self._fallback) < 80:
+            parts: list[str] = []
+            self._fallback.append(parts)
+            self._fallback_open.append((depth, parts))
+        self._emit()
+
+    def _pop_to(self, index: int) -> None:
+        while len(self._stack) > index and not self.done:
+            depth = len(self._stack)
+            self._close(self._stack.pop(), depth)
+
+    def _close(self, tag: str, depth: int) -> None:
+        if tag in _NON_TEXT_TAGS:
+            self._skip -= 1
+        if tag == "title" and self._title_parts is not None:
+            self.title = "".join(self._title_parts)
+            self._title_parts = None
+        if self._scope is None or depth < self._scope:
+            return
+        for sec in self._sections:
+            if sec.closed:
+                continue
+            if depth == sec.depth and sec.in_heading:
+                sec.in_heading = False
+            elif depth == sec.depth and sec.current is not None:
+                text = " ".join(sec.current)
+                sec.current = None
+                if text:
+                    sec.parts.append(text)
+                if len(" ".join(sec.parts)) > MAX_BODY_CHARS:
+                    # 1件が長すぎると要約品質が落ちるため上限を設ける。
+                    self._close_section(sec)
+            elif depth == sec.depth - 1:
+                # 親要素が閉じたら、もう兄弟要素は現れない。
+                self._close_section(sec)
+        self._fallback_open = [(d, parts) for d, parts in self._fallback_open if d != depth]
+        if depth == self._scope:
+            self._finalize()
+        else:
+            self._emit()
+
+    def _close_section(self, sec: _OpenSection) -> None:
+        if sec.current:
+            sec.parts.append(" ".join(sec.current))
+        sec.current = None
+        sec.closed = True
+
+    def _emit(self) -> None:
+        # 先頭から確定したセクションだけを ready へ移す。body を仮のコンテナにしている間は確定させない。
+        if self._provisional:
+            return
+        while self._sections and self._sections[0].closed:
+            sec = self._sections.pop(0)
+            body = " ".join(sec.parts).strip()
+            if body:
+                heading = " ".join(sec.heading)
+                self.ready.append((heading, body, _resolve_date(sec.date_value, heading, self.compiled)))
+        if self._headings >= self.compiled.plan.max_sections and not self._sections:
+            self.done = True
+
+    def _finalize(self) -> None:
+        self._provisional = False
+        for sec in self._sections:
+            if not sec.closed:
+                self._close_section(sec)
+        self._emit()
+        if self._scope is not None and self._headings == 0:
+            text = " ".join(" ".join(parts) for parts in self._fallback)
+            if text:
+                self.ready.append(("Latest Update", text, None))
+        self.done = True
+
+
+class SectionStream:
+    # HTML を断片ごとに受け取り、確定したセクションから返す逐次パーサー（html.parser ベース）。
+    # 文書木を作らないので、ページの大きさに関係なく保持するのは解析途中の max_sections 件分だけになる。
+    def __init__(self, plan: ExtractionPlan | None = None) -> None:
+        plan = plan or DEFAULT_PLAN
+        if not supports_streaming(plan):
+            raise ValueError(f"extraction plan needs a full DOM: {plan}")
+        self._parser = _SectionParser(plan)
+
+    @property
+    def title(self) -> str | None:
+        return self._parser.title
+
+    @property
+    def done(self) -> bool:
+        # max_sections 件が確定した（またはコンテナが閉じた）ら True。以降の入力は読まなくてよい。
+        return self._parser.done
+
+    def feed(self, chunk: str) -> list[Section]:
+        parser = self._parser
+        if not parser.done:
+            parser.feed(chunk)
+        ready, parser.ready = parser.ready, []
+        return ready
+
+    def close(self) -> list[Section]:
+        parser = self._parser
+        if not parser.done:
+            parser.close()
+            parser.finish()
+        ready, parser.ready = parser.ready, []
+        return ready
+
+
+def stream_page(
+    chunks: Iterable[str], plan: ExtractionPlan | None = None
+) -> tuple[str | None, list[Section]]:
+    # 断片の列を SectionStream に流し、max_sections 件が確定した時点で読むのをやめる。
+    stream = SectionStream(plan)
+    sections: list[Section] = []
+    for chunk in chunks:
+        sections.extend(stream.feed(chunk))
+        if stream.done:
+            break
+    sections.extend(stream.close())
+    return stream.title, sections
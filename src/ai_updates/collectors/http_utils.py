@@ -1,18 +1,149 @@
 from __future__ import annotations
 
+import codecs
+import time
+from collections.abc import Callable
+from dataclasses import dataclass
 from datetime import datetime, timezone
 
 import httpx
 
+from .. import metrics
+from ..http_clients import get_client
+
 """収集処理で共通利用する HTTP / 日付ユーティリティ。"""
 
 
 def fetch_text(url: str, user_agent: str) -> str:
     # HTMLページ本文を取得する。失敗時は呼び出し元で例外処理する。
-    with httpx.Client(timeout=30, follow_redirects=True) as client:
-        res = client.get(url, headers={"User-Agent": user_agent})
+    res = get_client("collect").get(url, headers={"User-Agent": user_agent})
+    res.raise_for_status()
+    return res.text
+
+
+@dataclass(slots=True)
+class FetchResult:
+    # 条件付き GET の結果。304 のときは text が None になる。
+    # fetch_stream_async では本文を呼び出し側へ渡して保持しないため、text は空文字になる。
+    text: str | None
+    etag: str | None
+    last_modified: str | None
+    # 上限バイト数に達して読むのをやめたか。
+    truncated: bool = False
+
+    @property
+    def not_modified(self) -> bool:
+        return self.text is None
+
+    @property
+    def validators(self) -> tuple[str | None, str | None]:
+        return (self.etag, self.last_modified)
+
+
+def conditional_headers(validators: tuple[str | None, str | None] | None) -> dict[str, str]:
+    # 前回保存した ETag / Last-Modified から条件付きリクエストヘッダーを作る。
+    if not validators:
+        return {}
+    etag, last_modified = validators
+    headers: dict[str, str] = {}
+    if etag:
+        headers["If-None-Match"] = etag
+    if last_modified:
+        headers["If-Modified-Since"] = last_modified
+    return headers
+
+
+async def fetch_async(
+    client: httpx.AsyncClient,
+    url: str,
+    headers: dict[str, str],
+    validators: tuple[str | None, str | None] | None = None,
+    inspect: Callable[[httpx.Response], None] | None = None,
+) -> FetchResult:
+    # 並列収集用の条件付き GET。クライアントは呼び出し元で共有する。
+    # inspect は応答を受け取った直後（ステータスの判定前）に呼ぶ。レート制限ヘッダーの追跡などに使う。
+    started = time.perf_counter()
+    res = await client.get(url, headers={**headers, **conditional_headers(validators)})
+    metrics.observe("fetch", time.perf_counter() - started)
+    metrics.incr("fetch_requests")
+    if inspect is not None:
+        inspect(res)
+    if res.status_code == 304:
+        metrics.incr("fetch_not_modified")
+        # 未変更なら本文は無い。304 に新しい検証子が無ければ前回値を引き継ぐ。
+        etag, last_modified = validators or (None, None)
+        return FetchResult(
+            text=None,
+            etag=res.headers.get("ETag") or etag,
+            last_modified=res.headers.get("Last-Modified") or last_modified,
+        )
+    res.raise_for_status()
+    metrics.incr("fetch_bytes", len(res.content))
+    return FetchResult(
+        text=res.text,
+        etag=res.headers.get("ETag"),
+        last_modified=res.headers.get("Last-Modified"),
+    )
+
+
+async def fetch_stream_async(
+    client: httpx.AsyncClient,
+    url: str,
+    headers: dict[str, str],
+    consume: Callable[[str], bool],
+    validators: tuple[str | None, str | None] | None = None,
+    max_bytes: int = 0,
+) -> FetchResult:
+    # 本文を少しずつ読み、デコードした断片を consume へ渡す条件付き GET。
+    # consume が True を返すか max_bytes（0 なら無制限）に達したら、残りは読まずに接続を閉じる。
+    started = time.perf_counter()
+    async with client.stream("GET", url, headers={**headers, **conditional_headers(validators)}) as res:
+        metrics.observe("fetch", time.perf_counter() - started)
+        metrics.incr("fetch_requests")
+        if res.status_code == 304:
+            metrics.incr("fetch_not_modified")
+            etag, last_modified = validators or (None, None)
+            return FetchResult(
+                text=None,
+                etag=res.headers.get("ETag") or etag,
+                last_modified=res.headers.get("Last-Modified") or last_modified,
+            )
         res.raise_for_status()
-        return res.text
+        # マルチバイト文字が断片の境目で切れても壊れないよう、増分デコーダーを使う。
+        decoder = codecs.getincrementaldecoder(res.charset_encoding or "utf-8")(errors="replace")
+        received = 0
+        truncated = False
+        stopped = False
+        async for chunk in res.aiter_bytes():
+            if max_bytes and received + len(chunk) > max_bytes:
+                chunk = chunk[: max_bytes - received]
+                truncated = True
+            received += len(chunk)
+            stopped = consume(decoder.decode(chunk))
+            if stopped or truncated:
+                break
+        if not stopped:
+            consume(decoder.decode(b"", final=True))
+    metrics.incr("fetch_bytes", received)
+    if truncated:
+        metrics.incr("fetch_truncated")
+        print(f"[warn] response truncated at {max_bytes} bytes: {url}")
+    return FetchResult(
+        text="",
+        etag=res.headers.get("ETag"),
+        last_modified=res.headers.get("Last-Modified"),
+        truncated=truncated,
+    )
+
+
+async def fetch_text_async(
+    client: httpx.AsyncClient,
+    url: str,
+    user_agent: str,
+    validators: tuple[str | None, str | None] | None = None,
+) -> FetchResult:
+    # HTML ページ向けの fetch_async ラッパー。
+    return await fetch_async(client, url, {"User-Agent": user_agent}, validators)
 
 
 def parse_datetime(value: str | None) -> datetime:
@@ -7,6 +7,35 @@ from pathlib import Path
 """環境変数からアプリ設定を読み込むモジュール。"""
 
 
+def _env_int(name: str, default: int) -> int:
+    # 数値系の設定は空文字や不正値ならデフォルトへ戻す。
+    value = os.getenv(name, "").strip()
+    try:
+        return int(value) if value else default
+    except ValueError:
+        return default
+
+
+def _env_float(name: str, default: float) -> float:
+    value = os.getenv(name, "").strip()
+    try:
+        return float(value) if value else default
+    except ValueError:
+        return default
+
+
+def _env_bool(name: str, default: bool) -> bool:
+    value = os.getenv(name, "").strip().lower()
+    if not value:
+        return default
+    return value in {"1", "true", "yes", "on"}
+
+
+def _env_path(name: str) -> Path | None:
+    value = os.getenv(name, "").strip()
+    return Path(value) if value else None
+
+
 @dataclass(slots=True)
 class Config:
     # SQLite ファイルの保存先。
@@ -25,7 +54,67 @@ class Config:
     webhook_openai: str | None
     webhook_gemini: str | None
     webhook_claude: str | None
-
+    # 収集ステージの同時実行数（全体 / 同一ホストあたり）。
+    collect_concurrency: int = 8
+    collect_per_host: int = 2
+    # パイプライン各ステージの並列度と、ステージ間キューの上限。
+    summary_concurrency: int = 3
+    dispatch_concurrency: int = 1
+    # Discord 送信の最小間隔（秒）。
+    dispatch_min_interval: float = 0.5
+    pipeline_queue_size: int = 32
+    # 1回の LLM リクエストにまとめる最大件数と概算トークン予算。
+    summary_batch_size: int = 5
+    summary_batch_token_budget: int = 6000
+    # 要約キャッシュのメモリ上限件数と、SQLite 側の保持日数。
+    summary_cache_size: int = 512
+    summary_cache_ttl_days: int = 90
+    # 近似重複判定（SimHash）の有効化と、既読扱いにするハミング距離の上限（最大5）。
+    near_dup_enabled: bool = True
+    near_dup_max_distance: int = 4
+    # HTML パーサーのバックエンド（html.parser / lxml / selectolax）。
+    html_parser: str = "html.parser"
+    # HTML を逐次受信・逐次解析するか（必要なセクション数がそろったら受信をやめる）と、1ページから読む上限バイト数。
+    html_stream: bool = False
+    html_max_bytes: int = 5_000_000
+    # 共有 HTTP クライアントで HTTP/2 を使うか（h2 が必要）。
+    http2: bool = False
+    # 通知をまとめるために後続を待つ秒数と、1メッセージにまとめる最大件数。
+    dispatch_batch_window: float = 1.0
+    dispatch_max_embeds: int = 10
+    # プロバイダごとの毎分リクエスト数・トークン数の上限（0 なら無制限）。
+    openai_rpm: int = 0
+    openai_tpm: int = 0
+    gemini_rpm: int = 15
+    gemini_tpm: int = 250000
+    # 要約1回あたりの再試行回数と、待機込みの締め切り（秒）。超えたらフォールバック要約にする。
+    summary_max_retries: int = 4
+    summary_deadline: float = 60.0
+    # 送信失敗した通知の最大試行回数（超えたら dead）と、再試行間隔の基準（秒、試行ごとに倍）。
+    outbox_max_attempts: int = 8
+    outbox_retry_base: float = 60.0
+    # 常駐実行でのソース別巡回間隔（秒）。初期値から、更新があれば縮め、なければ延ばす。
+    daemon_default_interval: float = 1800.0
+    daemon_min_interval: float = 300.0
+    daemon_max_interval: float = 21600.0
+    # GitHub API のトークン（任意）。あれば認証付きで呼び、GraphQL で batch_size 件のリポジトリを1回で取得する。
+    # max_pages は前回の最新リリースを探して読み進める最大ページ数（1ページ10件）。
+    github_token: str | None = None
+    github_batch_size: int = 20
+    github_max_pages: int = 3
+    # 要約 API のベース URL（互換プロキシやローカルのスタブ向け）。None なら公式エンドポイント。
+    openai_base_url: str | None = None
+    gemini_base_url: str | None = None
+    # 実行ごとの計測値の書き出し先（Prometheus textfile / JSON、未指定なら書かない）と、run_metrics の保持日数。
+    metrics_prometheus_path: Path | None = None
+    metrics_json_path: Path | None = None
+    metrics_retention_days: int = 30
+    # 既読の本文を残す日数（0 なら消さない）。fingerprint は残るので既読判定には影響しない。
+    body_retention_days: int = 180
+    # 既読判定の前段に置く Bloom フィルタの想定件数（0 なら使わない）と偽陽性率。
+    # 必要メモリはおよそ 想定件数 x 1.2 バイト（偽陽性率 1% のとき）。
+    seen_filter_capacity: int = 100000
+    seen_filter_error_rate: float = 0.01
 
     @classmethod
     def from_env(cls) -> "Config":
@@ -41,4 +130,44 @@ class Config:
             webhook_openai=os.getenv("DISCORD_WEBHOOK_OPENAI") or None,
             webhook_gemini=os.getenv("DISCORD_WEBHOOK_GEMINI") or None,
             webhook_claude=os.getenv("DISCORD_WEBHOOK_CLAUDE") or None,
+            collect_concurrency=_env_int("COLLECT_CONCURRENCY", 8),
+            collect_per_host=_env_int("COLLECT_PER_HOST", 2),
+            summary_concurrency=_env_int("SUMMARY_CONCURRENCY", 3),
+            dispatch_concurrency=_env_int("DISPATCH_CONCURRENCY", 1),
+            dispatch_min_interval=_env_float("DISPATCH_MIN_INTERVAL", 0.5),
+            pipeline_queue_size=_env_int("PIPELINE_QUEUE_SIZE", 32),
+            summary_batch_size=_env_int("SUMMARY_BATCH_SIZE", 5),
+            summary_batch_token_budget=_env_int("SUMMARY_BATCH_TOKEN_BUDGET", 6000),
+            summary_cache_size=_env_int("SUMMARY_CACHE_SIZE", 512),
+            summary_cache_ttl_days=_env_int("SUMMARY_CACHE_TTL_DAYS", 90),
+            near_dup_enabled=_env_bool("NEAR_DUP_ENABLED", True),
+            near_dup_max_distance=_env_int("NEAR_DUP_MAX_DISTANCE", 4),
+            html_parser=os.getenv("HTML_PARSER", "html.parser").strip().lower() or "html.parser",
+            html_stream=_env_bool("HTML_STREAM", False),
+            html_max_bytes=_env_int("HTML_MAX_BYTES", 5_000_000),
+            http2=_env_bool("HTTP2", False),
+            dispatch_batch_window=_env_float("DISPATCH_BATCH_WINDOW", 1.0),
+            dispatch_max_embeds=_env_int("DISPATCH_MAX_EMBEDS", 10),
+            openai_rpm=_env_int("OPENAI_RPM", 0),
+            openai_tpm=_env_int("OPENAI_TPM", 0),
+            gemini_rpm=_env_int("GEMINI_RPM", 15),
+            gemini_tpm=_env_int("GEMINI_TPM", 250000),
+            summary_max_retries=_env_int("SUMMARY_MAX_RETRIES", 4),
+            summary_deadline=_env_float("SUMMARY_DEADLINE", 60.0),
+            outbox_max_attempts=_env_int("OUTBOX_MAX_ATTEMPTS", 8),
+            outbox_retry_base=_env_float("OUTBOX_RETRY_BASE", 60.0),
+            daemon_default_interval=_env_float("DAEMON_DEFAULT_INTERVAL", 1800.0),
+            daemon_min_interval=_env_float("DAEMON_MIN_INTERVAL", 300.0),
+            daemon_max_interval=_env_float("DAEMON_MAX_INTERVAL", 21600.0),
+            github_token=os.getenv("GITHUB_TOKEN") or None,
+            github_batch_size=_env_int("GITHUB_BATCH_SIZE", 20),
+            github_max_pages=_env_int("GITHUB_MAX_PAGES", 3),
+            openai_base_url=os.getenv("OPENAI_BASE_URL") or None,
+            gemini_base_url=os.getenv("GEMINI_BASE_URL") or None,
+            metrics_prometheus_path=_env_path("METRICS_PROMETHEUS_PATH"),
+            metrics_json_path=_env_path("METRICS_JSON_PATH"),
+            metrics_retention_days=_env_int("METRICS_RETENTION_DAYS", 30),
+            body_retention_days=_env_int("BODY_RETENTION_DAYS", 180),
+            seen_filter_capacity=_env_int("SEEN_FILTER_CAPACITY", 100000),
+            seen_filter_error_rate=_env_float("SEEN_FILTER_ERROR_RATE", 0.01),
         )
@@ -0,0 +1,138 @@
+from __future__ import annotations
+
+import asyncio
+import signal
+import time
+from dataclasses import dataclass
+
+import httpx
+
+from . import http_clients
+from .collectors import new_async_client
+from .config import Config
+from .pipeline import run_pipeline
+from .sources import SOURCES, Source
+from .store import Store
+
+"""常駐実行のメイン処理。ソースごとの間隔で巡回し、更新頻度に合わせて間隔を調整する。"""
+
+# source_state に保存する巡回間隔のキー。再起動後も学習済みの間隔を引き継ぐ。
+_INTERVAL_KEY = "poll_interval"
+# 更新がなかったときに間隔を延ばす倍率と、更新があったときに縮める倍率。
+_BACKOFF = 1.5
+_SPEEDUP = 0.5
+
+
+def next_interval(current: float, changed: bool, min_interval: float, max_interval: float) -> float:
+    # 更新があれば間隔を縮め、なければ延ばす。上下限の範囲に収める。
+    value = current * (_SPEEDUP if changed else _BACKOFF)
+    return min(max(value, min_interval), max_interval)
+
+
+@dataclass(slots=True)
+class _Slot:
+    source: Source
+    interval: float
+    next_at: float
+
+
+class Scheduler:
+    # ソースごとの巡回予定。間隔は Store の source_state に保存する。
+    def __init__(self, cfg: Config, store: Store, sources: list[Source], now: float) -> None:
+        self.cfg = cfg
+        self.store = store
+        self._slots: dict[str, _Slot] = {}
+        for source in sources:
+            saved = store.get_source_state(source.id, _INTERVAL_KEY)
+            interval = self._clamp(float(saved) if saved else cfg.daemon_default_interval)
+            # 起動直後は全ソースを1回巡回して最新の状態にそろえる。
+            self._slots[source.id] = _Slot(source=source, interval=interval, next_at=now)
+
+    def _clamp(self, interval: float) -> float:
+        return min(max(interval, self.cfg.daemon_min_interval), self.cfg.daemon_max_interval)
+
+    def due(self, now: float) -> list[Source]:
+        return [slot.source for slot in self._slots.values() if slot.next_at <= now]
+
+    def next_wakeup(self) -> float:
+        return min(slot.next_at for slot in self._slots.values())
+
+    def interval(self, source_id: str) -> float:
+        return self._slots[source_id].interval
+
+    def record(self, sources: list[Source], new_counts: dict[str, int], now: float) -> None:
+        # 巡回結果から次回の間隔を決める。収集に失敗したソースは間隔を変えずに再試行する。
+        with self.store.transaction():
+            for source in sources:
+                slot = self._slots[source.id]
+                if source.id in new_counts:
+                    slot.interval = next_interval(
+                        slot.interval,
+                        new_counts[source.id] > 0,
+                        self.cfg.daemon_min_interval,
+                        self.cfg.daemon_max_interval,
+                    )
+                    self.store.set_source_state(source.id, _INTERVAL_KEY, f"{slot.interval:.0f}")
+                slot.next_at = now + slot.interval
+
+
+async def run_daemon(
+    cfg: Config,
+    store: Store,
+    sources: list[Source],
+    stop: asyncio.Event,
+    client: httpx.AsyncClient | None = None,
+) -> None:
+    # stop が立つまで、期限の来たソースだけを1回のパイプラインでまとめて巡回する。
+    # 実行中のパイプラインは途中で止めず、終わってから停止する（既読・送信済みの状態を半端にしない）。
+    scheduler = Scheduler(cfg, store, sources, time.monotonic())
+    shared = client or new_async_client(cfg.collect_concurrency)
+    try:
+        while not stop.is_set():
+            due = scheduler.due(time.monotonic())
+            if due:
+                try:
+                    new_counts = await run_pipeline(cfg, store, due, client=shared)
+                except Exception as exc:
+                    # 1回の失敗で常駐を止めない。該当ソースは間隔を変えずに次回へ回す。
+                    print(f"[warn] daemon run failed: {exc}")
+                    new_counts = {}
+                scheduler.record(due, new_counts, time.monotonic())
+                changed = ", ".join(f"{s.id}={new_counts.get(s.id, '-')}/{scheduler.interval(s.id):.0f}s" for s in due)
+                print(f"[info] polled {len(due)} sources (new/next interval): {changed}")
+            delay = max(0.0, scheduler.next_wakeup() - time.monotonic())
+            try:
+                await asyncio.wait_for(stop.wait(), timeout=delay)
+            except asyncio.TimeoutError:
+                pass
+    finally:
+        if client is None:
+            await shared.aclose()
+
+
+def run_daemon_main() -> None:
+    # 設定・DB・HTTP 接続はプロセスの寿命の間開いたままにする。
+    cfg = Config.from_env()
+    store = Store(cfg.db_path)
+    store.enable_seen_filter(cfg.seen_filter_capacity, cfg.seen_filter_error_rate)
+    http_clients.configure(http2=cfg.http2)
+
+    async def main() -> None:
+        stop = asyncio.Event()
+        loop = asyncio.get_running_loop()
+        for sig in (signal.SIGINT, signal.SIGTERM):
+            # SIGINT / SIGTERM で停止を予約し、実行中の巡回が終わってから抜ける。
+            loop.add_signal_handler(sig, stop.set)
+        print("[info] daemon started")
+        await run_daemon(cfg, store, SOURCES, stop)
+        print("[info] daemon stopped")
+
+    try:
+        asyncio.run(main())
+    finally:
+        store.close()
+        http_clients.close_clients()
+
+
+def run_daemon_cli() -> None:
+    run_daemon_main()
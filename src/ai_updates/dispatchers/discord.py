@@ -1,19 +1,136 @@
 from __future__ import annotations
 
+import json
+import threading
+import time
+from collections.abc import Callable
+from dataclasses import dataclass
 from datetime import timezone, timedelta
+from typing import Any
 
 import httpx
 
+from .. import metrics
+from ..http_clients import get_client
 from ..models import Summary, UpdateItem
 
 """Discord への通知送信を担当するモジュール。"""
 
+# Discord の1メッセージあたりの上限。
+MAX_EMBEDS = 10
+_MAX_EMBED_TOTAL_CHARS = 6000
+_MAX_EMBED_TITLE = 256
+_MAX_EMBED_DESCRIPTION = 4096
+# 429 を受けたときの再送回数。
+_MAX_RATE_LIMIT_RETRIES = 3
+
+
+@dataclass(slots=True)
+class _Bucket:
+    remaining: int | None = None
+    reset_at: float = 0.0
+
+
+class RateLimiter:
+    # Webhook ごとのレート制限バケットを X-RateLimit-* ヘッダーから追跡し、
+    # 残り回数が尽きたバケットはリセットまで送信前に待つ。送信はスレッドから呼ばれるためロックで守る。
+    def __init__(
+        self,
+        sleep: Callable[[float], None] = time.sleep,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        self._sleep = sleep
+        self._clock = clock
+        self._lock = threading.Lock()
+        # 複数の Webhook が同じバケットを共有することがあるため、URL -> バケット ID を別に持つ。
+        self._bucket_of: dict[str, str] = {}
+        self._buckets: dict[str, _Bucket] = {}
+        self._global_until = 0.0
+
+    def acquire(self, webhook_url: str) -> None:
+        # 送信枠を1つ確保する。枠がなければリセット時刻まで待ってから確保する。
+        while True:
+            with self._lock:
+                now = self._clock()
+                bucket = self._buckets.setdefault(self._bucket_of.get(webhook_url, webhook_url), _Bucket())
+                if bucket.reset_at <= now:
+                    bucket.remaining = None
+                wait = max(self._global_until - now, 0.0)
+                if bucket.remaining == 0:
+                    wait = max(wait, bucket.reset_at - now)
+                if wait <= 0:
+                    if bucket.remaining is not None:
+                        bucket.remaining -= 1
+                    return
+            self._sleep(wait)
+
+    def update(self, webhook_url: str, res: httpx.Response) -> None:
+        # 応答ヘッダーでバケットの残り回数とリセット時刻を更新する。
+        headers = res.headers
+        if "X-RateLimit-Remaining" not in headers:
+            return
+        with self._lock:
+            key = headers.get("X-RateLimit-Bucket") or webhook_url
+            self._bucket_of[webhook_url] = key
+            bucket = self._buckets.setdefault(key, _Bucket())
+            try:
+                bucket.remaining = int(headers["X-RateLimit-Remaining"])
+                bucket.reset_at = self._clock() + float(headers.get("X-RateLimit-Reset-After", "0"))
+            except ValueError:
+                bucket.remaining = None
+
+    def block(self, webhook_url: str, delay: float, is_global: bool = False) -> None:
+        # 429 の retry_after 秒だけ、そのバケット（global なら全体）への送信を止める。
+        with self._lock:
+            until = self._clock() + delay
+            if is_global:
+                self._global_until = max(self._global_until, until)
+                return
+            bucket = self._buckets.setdefault(self._bucket_of.get(webhook_url, webhook_url), _Bucket())
+            bucket.remaining = 0
+            bucket.reset_at = max(bucket.reset_at, until)
+
+
+_limiter = RateLimiter()
+
+
+def _retry_after(res: httpx.Response) -> tuple[float, bool]:
+    # 429 応答の待機秒数と global 制限かどうか。本文の retry_after を優先し、なければヘッダーを見る。
+    try:
+        data = res.json()
+    except (json.JSONDecodeError, UnicodeDecodeError):
+        data = {}
+    if not isinstance(data, dict):
+        data = {}
+    is_global = bool(data.get("global")) or res.headers.get("X-RateLimit-Global") == "true"
+    for value in (data.get("retry_after"), res.headers.get("Retry-After")):
+        try:
+            return max(float(value), 0.0), is_global
+        except (TypeError, ValueError):
+            continue
+    return 1.0, is_global
+
+
+def post_payload(webhook_url: str, payload: dict[str, Any], limiter: RateLimiter | None = None) -> None:
+    # レート制限を守って Webhook へ POST する。429 は retry_after だけ待って再送する。
+    limiter = limiter or _limiter
+    for attempt in range(_MAX_RATE_LIMIT_RETRIES + 1):
+        limiter.acquire(webhook_url)
+        res = get_client("discord").post(webhook_url, json=payload)
+        limiter.update(webhook_url, res)
+        if res.status_code == 429 and attempt < _MAX_RATE_LIMIT_RETRIES:
+            delay, is_global = _retry_after(res)
+            print(f"[warn] discord rate limited, retrying in {delay:.2f}s")
+            metrics.incr("dispatch_rate_limited")
+            limiter.block(webhook_url, delay, is_global)
+            continue
+        res.raise_for_status()
+        return
+
 
 def post_message(webhook_url: str, content: str) -> None:
     # Discord Incoming Webhook へテキストをPOSTする。
-    with httpx.Client(timeout=20) as client:
-        res = client.post(webhook_url, json={"content": content})
-        res.raise_for_status()
+    post_payload(webhook_url, {"content": content})
 
 
 _JST = timezone(timedelta(hours=9))
@@ -39,6 +156,54 @@ def _format_item(item: UpdateItem, summary: Summary) -> str:
     )
 
 
+def _truncate(text: str, limit: int) -> str:
+    return text if len(text) <= limit else text[: limit - 1] + "…"
+
+
+def _format_embed(item: UpdateItem, summary: Summary) -> dict[str, Any]:
+    # まとめて送るときの1件分。内容は _format_item と同じで、原文リンクはタイトルに付ける。
+    title = f"{summary.headline}（{_format_published_at(item)}）"
+    picked_bullets = summary.bullets[:3] if summary.bullets else ["詳細は原文リンクを参照してください。"]
+    return {
+        "title": _truncate(title, _MAX_EMBED_TITLE),
+        "url": item.url,
+        "description": _truncate("\n".join(f"• {b}" for b in picked_bullets), _MAX_EMBED_DESCRIPTION),
+    }
+
+
+def _embed_size(embed: dict[str, Any]) -> int:
+    return len(embed["title"]) + len(embed["description"])
+
+
+def pack_messages(
+    pairs: list[tuple[UpdateItem, Summary]],
+    max_embeds: int = MAX_EMBEDS,
+) -> list[list[tuple[UpdateItem, Summary]]]:
+    # 同じ Webhook 宛ての通知を、埋め込み数と合計文字数の上限内で1メッセージずつに詰める。
+    max_embeds = min(max(1, max_embeds), MAX_EMBEDS)
+    messages: list[list[tuple[UpdateItem, Summary]]] = []
+    current: list[tuple[UpdateItem, Summary]] = []
+    size = 0
+    for pair in pairs:
+        embed_size = _embed_size(_format_embed(*pair))
+        if current and (len(current) >= max_embeds or size + embed_size > _MAX_EMBED_TOTAL_CHARS):
+            messages.append(current)
+            current, size = [], 0
+        current.append(pair)
+        size += embed_size
+    if current:
+        messages.append(current)
+    return messages
+
+
 def send_immediate(webhook_url: str, item: UpdateItem, summary: Summary) -> None:
     # 送信用の本文を作って即時通知する。
     post_message(webhook_url, _format_item(item, summary))
+
+
+def send_batch(webhook_url: str, pairs: list[tuple[UpdateItem, Summary]]) -> None:
+    # pack_messages で詰めた1メッセージ分を送る。1件だけなら従来のテキスト形式で送る。
+    if len(pairs) == 1:
+        send_immediate(webhook_url, *pairs[0])
+        return
+    post_payload(webhook_url, {"embeds": [_format_embed(item, summary) for item, summary in pairs]})
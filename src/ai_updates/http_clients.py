@@ -0,0 +1,194 @@
+from __future__ import annotations
+
+import asyncio
+import atexit
+import importlib.util
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import Literal
+
+import httpx
+
+"""用途別の HTTP クライアントをプロセス内で共有するレジストリ。
+
+同じホストへの再接続（TCP/TLS ハンドシェイク）を避けるため、同期クライアントは用途ごとに
+1つだけ作って使い回す。タイムアウトとリトライ方針は用途ごとに持つ。
+テストでは configure(transport=httpx.MockTransport(...)) でローカルの transport に差し替えられる。
+"""
+
+Purpose = Literal["collect", "github", "llm", "discord"]
+
+# 一時的な失敗とみなして再試行するステータス。429 の待機は呼び出し側の流量制御に任せる。
+_TRANSIENT_STATUSES = frozenset({500, 502, 503, 504})
+
+
+@dataclass(frozen=True, slots=True)
+class ClientPolicy:
+    # 用途ごとの接続設定。timeout は読み取り、connect_timeout は接続確立までの秒数。
+    timeout: float
+    connect_timeout: float = 10.0
+    retries: int = 2
+    backoff: float = 0.5
+    retry_statuses: frozenset[int] = _TRANSIENT_STATUSES
+    # False なら、リクエストを送る前に失敗したと分かる接続エラー（ConnectError / ConnectTimeout）だけを再試行する。
+    # 読み取りタイムアウトや応答途中の切断は送信後にも起こるため、冪等でない用途では再試行しない。
+    retry_transport_errors: bool = True
+    follow_redirects: bool = False
+    max_connections: int = 10
+    max_keepalive: int = 5
+
+
+DEFAULT_POLICIES: dict[str, ClientPolicy] = {
+    "collect": ClientPolicy(timeout=30, follow_redirects=True),
+    "github": ClientPolicy(timeout=30, follow_redirects=True),
+    # LLM は応答生成に時間がかかるため読み取りを長めにする。再試行は summarizer が流量制限と締め切りを見て行う。
+    "llm": ClientPolicy(timeout=60, retries=0),
+    # Webhook 投稿は冪等でないため、受け付け前に失敗した可能性が高いゲートウェイ系エラーと接続エラーだけ1回再試行する。
+    "discord": ClientPolicy(
+        timeout=20, retries=1, retry_statuses=frozenset({502, 503, 504}), retry_transport_errors=False
+    ),
+}
+
+
+class _RetryTransport(httpx.BaseTransport, httpx.AsyncBaseTransport):
+    # 接続エラーと一時的なステータスを指数バックオフで再試行する transport ラッパー。
+    def __init__(self, inner: httpx.BaseTransport | httpx.AsyncBaseTransport, policy: ClientPolicy) -> None:
+        self.inner = inner
+        self.policy = policy
+
+    def _delay(self, attempt: int) -> float:
+        return self.policy.backoff * (2**attempt)
+
+    def _retryable(self, exc: httpx.TransportError, attempt: int) -> bool:
+        if attempt >= self.policy.retries:
+            return False
+        return self.policy.retry_transport_errors or isinstance(exc, (httpx.ConnectError, httpx.ConnectTimeout))
+
+    def handle_request(self, request: httpx.Request) -> httpx.Response:
+        attempt = 0
+        while True:
+            try:
+                response = self.inner.handle_request(request)  # type: ignore[union-attr]
+            except httpx.TransportError as exc:
+                if not self._retryable(exc, attempt):
+                    raise
+            else:
+                if response.status_code not in self.policy.retry_statuses or attempt >= self.policy.retries:
+                    return response
+                response.close()
+            time.sleep(self._delay(attempt))
+            attempt += 1
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        attempt = 0
+        while True:
+            try:
+                response = await self.inner.handle_async_request(request)  # type: ignore[union-attr]
+            except httpx.TransportError as exc:
+                if not self._retryable(exc, attempt):
+                    raise
+            else:
+                if response.status_code not in self.policy.retry_statuses or attempt >= self.policy.retries:
+                    return response
+                await response.aclose()
+            await asyncio.sleep(self._delay(attempt))
+            attempt += 1
+
+    def close(self) -> None:
+        self.inner.close()  # type: ignore[union-attr]
+
+    async def aclose(self) -> None:
+        await self.inner.aclose()  # type: ignore[union-attr]
+
+
+def http2_available() -> bool:
+    # httpx の HTTP/2 対応には h2 パッケージ（`pip install -e .[http2]`）が必要。
+    return importlib.util.find_spec("h2") is not None
+
+
+@dataclass(slots=True)
+class ClientRegistry:
+    # transport を渡すと全クライアントがそれを使う（テスト用）。None なら実ネットワークへ接続する。
+    http2: bool = False
+    transport: httpx.BaseTransport | httpx.AsyncBaseTransport | None = None
+    policies: dict[str, ClientPolicy] = field(default_factory=lambda: dict(DEFAULT_POLICIES))
+    _clients: dict[str, httpx.Client] = field(default_factory=dict)
+    _lock: threading.Lock = field(default_factory=threading.Lock)
+
+    def policy(self, purpose: Purpose) -> ClientPolicy:
+        return self.policies[purpose]
+
+    def _limits(self, policy: ClientPolicy, max_connections: int | None) -> httpx.Limits:
+        connections = max(1, max_connections or policy.max_connections)
+        return httpx.Limits(max_connections=connections, max_keepalive_connections=min(connections, policy.max_keepalive))
+
+    def _timeout(self, policy: ClientPolicy) -> httpx.Timeout:
+        return httpx.Timeout(policy.timeout, connect=policy.connect_timeout)
+
+    def get(self, purpose: Purpose) -> httpx.Client:
+        # 要約スレッドからも呼ばれるため、生成はロックで1回に限る。
+        with self._lock:
+            client = self._clients.get(purpose)
+            if client is None:
+                policy = self.policy(purpose)
+                limits = self._limits(policy, None)
+                inner = self.transport or httpx.HTTPTransport(http2=self.http2, limits=limits)
+                client = httpx.Client(
+                    transport=_RetryTransport(inner, policy),
+                    timeout=self._timeout(policy),
+                    follow_redirects=policy.follow_redirects,
+                )
+                self._clients[purpose] = client
+            return client
+
+    def new_async_client(self, purpose: Purpose, max_connections: int | None = None) -> httpx.AsyncClient:
+        # 非同期クライアントはイベントループに紐づくため、呼び出し側が寿命を管理する。
+        policy = self.policy(purpose)
+        limits = self._limits(policy, max_connections)
+        inner = self.transport or httpx.AsyncHTTPTransport(http2=self.http2, limits=limits)
+        return httpx.AsyncClient(
+            transport=_RetryTransport(inner, policy),
+            timeout=self._timeout(policy),
+            follow_redirects=policy.follow_redirects,
+            limits=limits,
+        )
+
+    def close(self) -> None:
+        with self._lock:
+            for client in self._clients.values():
+                client.close()
+            self._clients.clear()
+
+
+_registry = ClientRegistry()
+
+
+def configure(
+    http2: bool = False,
+    transport: httpx.BaseTransport | httpx.AsyncBaseTransport | None = None,
+    policies: dict[str, ClientPolicy] | None = None,
+) -> ClientRegistry:
+    # レジストリを作り直す。既存クライアントは閉じる。policies は用途ごとの上書き分だけ渡せばよい。
+    global _registry
+    if http2 and not http2_available():
+        print("[warn] HTTP/2 requested but h2 is not installed; using HTTP/1.1")
+        http2 = False
+    _registry.close()
+    _registry = ClientRegistry(http2=http2, transport=transport, policies={**DEFAULT_POLICIES, **(policies or {})})
+    return _registry
+
+
+def get_client(purpose: Purpose) -> httpx.Client:
+    return _registry.get(purpose)
+
+
+def new_async_client(purpose: Purpose, max_connections: int | None = None) -> httpx.AsyncClient:
+    return _registry.new_async_client(purpose, max_connections)
+
+
+def close_clients() -> None:
+    _registry.close()
+
+
+atexit.register(close_clients)
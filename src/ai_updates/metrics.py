@@ -0,0 +1,180 @@
+from __future__ import annotations
+
+import json
+import os
+import threading
+import time
+from collections.abc import Iterator
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from datetime import datetime
+from pathlib import Path
+from typing import TYPE_CHECKING
+
+from .models import utc_now
+
+if TYPE_CHECKING:
+    from .config import Config
+    from .store import Store
+
+"""1回の実行の計測値を集めて、SQLite・Prometheus テキストファイル・JSON へ書き出すモジュール。
+
+計測中の RunMetrics は contextvars で持つ。asyncio のタスクと asyncio.to_thread のスレッドは
+作成時のコンテキストを引き継ぐため、収集・要約・通知の各モジュールは引数を増やさずに incr / observe で記録できる。
+実行の外（プレビューや単体の呼び出し）では記録先がないので何もしない。
+"""
+
+# Prometheus の指標名の接頭辞。
+_PREFIX = "ai_updates"
+
+
+def _percentile(values: list[float], pct: float) -> float:
+    # 最近傍順位法のパーセンタイル。
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = max(1, -(-len(ordered) * pct // 100))
+    return ordered[int(rank) - 1]
+
+
+@dataclass(slots=True)
+class RunMetrics:
+    # counters は件数・バイト数などの合計、timings はステージごとの所要時間（秒）の一覧。
+    # 要約スレッドからも書き込むため、更新はロックで守る。
+    started_at: datetime = field(default_factory=utc_now)
+    counters: dict[str, float] = field(default_factory=dict)
+    timings: dict[str, list[float]] = field(default_factory=dict)
+    _lock: threading.Lock = field(default_factory=threading.Lock, repr=False)
+
+    def incr(self, name: str, value: float = 1) -> None:
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + value
+
+    def observe(self, name: str, seconds: float) -> None:
+        with self._lock:
+            self.timings.setdefault(name, []).append(seconds)
+
+    @contextmanager
+    def timer(self, name: str) -> Iterator[None]:
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - started)
+
+    def count(self, name: str) -> float:
+        return self.counters.get(name, 0)
+
+    def percentile(self, name: str, pct: float) -> float:
+        return _percentile(self.timings.get(name, []), pct)
+
+    def snapshot(self) -> dict[str, float]:
+        # 名前 -> 値のフラットな形。所要時間は <name>_seconds_{count,sum,p50,p95,max} に展開する。
+        with self._lock:
+            values = dict(self.counters)
+            timings = {name: list(seconds) for name, seconds in self.timings.items()}
+        for name, seconds in timings.items():
+            values[f"{name}_seconds_count"] = len(seconds)
+            values[f"{name}_seconds_sum"] = sum(seconds)
+            values[f"{name}_seconds_p50"] = _percentile(seconds, 50)
+            values[f"{name}_seconds_p95"] = _percentile(seconds, 95)
+            values[f"{name}_seconds_max"] = max(seconds, default=0.0)
+        return dict(sorted(values.items()))
+
+
+_current: ContextVar[RunMetrics | None] = ContextVar("ai_updates_run_metrics", default=None)
+
+
+@contextmanager
+def activate(metrics: RunMetrics) -> Iterator[RunMetrics]:
+    # with の中（と、その中で作ったタスク・スレッド）の incr / observe を metrics へ記録する。
+    token = _current.set(metrics)
+    try:
+        yield metrics
+    finally:
+        _current.reset(token)
+
+
+def incr(name: str, value: float = 1) -> None:
+    metrics = _current.get()
+    if metrics is not None:
+        metrics.incr(name, value)
+
+
+def observe(name: str, seconds: float) -> None:
+    metrics = _current.get()
+    if metrics is not None:
+        metrics.observe(name, seconds)
+
+
+def summary_line(metrics: RunMetrics) -> str:
+    # 実行の最後に出す1行の要約。遅かったステージの見当をつけるため p95 を並べる。
+    c = metrics.count
+    run_seconds = sum(metrics.timings.get("run", []))
+    lookups = c("summary_cache_hits") + c("summary_cache_misses")
+    cache_rate = f"{c('summary_cache_hits') / lookups:.0%}" if lookups else "-"
+    p95 = " ".join(
+        f"{stage}={metrics.percentile(stage, 95) * 1000:.0f}ms"
+        for stage in ("collect", "dedup", "summarize", "llm_request", "dispatch")
+        if stage in metrics.timings
+    )
+    return (
+        f"[info] run summary: {run_seconds:.1f}s "
+        f"sources={c('sources'):.0f} (failed={c('sources_failed'):.0f}, unchanged={c('sources_not_modified'):.0f}) "
+        f"fetched={c('fetch_bytes') / 1024:.0f}KiB/{c('fetch_requests'):.0f}req "
+        f"new={c('items_new'):.0f} sent={c('dispatch_items'):.0f} seen_filter_skips={c('seen_filter_skips'):.0f} "
+        f"llm={c('llm_requests'):.0f}req/{c('llm_input_tokens') + c('llm_output_tokens'):.0f}tok "
+        f"cache={cache_rate} retries(llm={c('llm_retries'):.0f}, discord={c('dispatch_rate_limited'):.0f}, "
+        f"outbox={c('dispatch_failures'):.0f}) p95: {p95 or '-'}"
+    )
+
+
+def _write_atomic(path: Path, text: str) -> None:
+    # textfile collector が書きかけのファイルを読まないよう、一時ファイルから置き換える。
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_name(f".{path.name}.tmp")
+    tmp.write_text(text, encoding="utf-8")
+    os.replace(tmp, path)
+
+
+def prometheus_text(metrics: RunMetrics) -> str:
+    # 直近1回分の値を gauge / summary として出す（node_exporter の textfile collector 向け）。
+    lines = [
+        f"# TYPE {_PREFIX}_last_run_timestamp_seconds gauge",
+        f"{_PREFIX}_last_run_timestamp_seconds {metrics.started_at.timestamp():.0f}",
+    ]
+    with metrics._lock:
+        counters = dict(sorted(metrics.counters.items()))
+        timings = {name: list(seconds) for name, seconds in sorted(metrics.timings.items())}
+    for name, value in counters.items():
+        lines.append(f"# TYPE {_PREFIX}_last_run_{name} gauge")
+        lines.append(f"{_PREFIX}_last_run_{name} {value:g}")
+    if timings:
+        metric = f"{_PREFIX}_last_run_stage_seconds"
+        lines.append(f"# TYPE {metric} summary")
+        for stage, seconds in timings.items():
+            for quantile, pct in (("0.5", 50), ("0.95", 95)):
+                lines.append(f'{metric}{{stage="{stage}",quantile="{quantile}"}} {_percentile(seconds, pct):.6f}')
+            lines.append(f'{metric}_sum{{stage="{stage}"}} {sum(seconds):.6f}')
+            lines.append(f'{metric}_count{{stage="{stage}"}} {len(seconds)}')
+    return "\n".join(lines) + "\n"
+
+
+def publish(cfg: Config, store: Store, metrics: RunMetrics) -> None:
+    # run_metrics テーブルと、設定されていればファイルへ書き出し、要約行を表示する。
+    # 計測値の書き出しに失敗しても実行自体は失敗にしない。
+    snapshot = metrics.snapshot()
+    try:
+        store.add_run_metrics(metrics.started_at, snapshot, cfg.metrics_retention_days)
+    except Exception as exc:
+        print(f"[warn] run metrics not stored: {exc}")
+    try:
+        if cfg.metrics_prometheus_path:
+            _write_atomic(cfg.metrics_prometheus_path, prometheus_text(metrics))
+        if cfg.metrics_json_path:
+            payload = {"started_at": metrics.started_at.isoformat(), "metrics": snapshot}
+            _write_atomic(cfg.metrics_json_path, json.dumps(payload, ensure_ascii=False, indent=2) + "\n")
+    except OSError as exc:
+        print(f"[warn] run metrics file not written: {exc}")
+    print(summary_line(metrics))
@@ -1,6 +1,6 @@
 from __future__ import annotations
 
-from dataclasses import dataclass
+from dataclasses import dataclass, field
 from datetime import datetime, timezone
 from typing import Literal
 
@@ -21,6 +21,8 @@ class RawItem:
     url: str
     published_at: datetime
     body: str
+    # ページ内の位置に依存しないセクション識別子（HTML セクションなど）。
+    section_id: str | None = None
 
 
 @dataclass(slots=True)
@@ -33,6 +35,21 @@ class UpdateItem:
     published_at: datetime
     body: str
     fingerprint: str
+    section_id: str | None = None
+
+
+@dataclass(slots=True)
+class CollectResult:
+    # コレクター1回分の結果。
+    items: list[RawItem]
+    # 304 などで本文の解析自体を省略した場合は True。
+    not_modified: bool = False
+    # 全件処理後に Store へ保存する HTTP 検証子（URL -> (ETag, Last-Modified)）。
+    validators: dict[str, tuple[str | None, str | None]] = field(default_factory=dict)
+    # 全件処理後に Store へ保存するソース別の状態（ページダイジェストなど）。
+    state: dict[str, str] = field(default_factory=dict)
+    # 取得と解析にかかった秒数（同時実行数の待ちは含まない）。
+    elapsed: float = 0.0
 
 
 @dataclass(slots=True)
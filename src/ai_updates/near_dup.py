@@ -0,0 +1,64 @@
+from __future__ import annotations
+
+import hashlib
+import re
+from collections import Counter
+
+"""本文の近似重複判定に使う SimHash と LSH バンド分割のユーティリティ。"""
+
+# 64bit SimHash を 6 バンド（11/11/11/11/10/10 bit）に分ける。ハミング距離 5 以下なら
+# 鳩の巣原理で少なくとも1バンドが完全一致するため、バンド一致で候補を絞れる。
+SIMHASH_BITS = 64
+BANDS = 6
+_BAND_WIDTHS = [11, 11, 11, 11, 10, 10]
+MAX_SUPPORTED_DISTANCE = BANDS - 1
+# 短すぎる本文は SimHash が不安定なので対象外にする。
+_MIN_TOKENS = 12
+
+
+def _features(text: str) -> Counter[str]:
+    # 単語の出現回数を特徴量にする（語の挿入・typo 修正での変化を小さく抑える）。
+    tokens = re.findall(r"\w+", text.lower())
+    if len(tokens) < _MIN_TOKENS:
+        return Counter()
+    return Counter(tokens)
+
+
+def simhash(text: str) -> int | None:
+    # 本文の 64bit SimHash を返す。特徴量が足りない場合は None。
+    features = _features(text)
+    if not features:
+        return None
+    weights = [0] * SIMHASH_BITS
+    for feature, count in features.items():
+        h = int.from_bytes(hashlib.blake2b(feature.encode("utf-8"), digest_size=8).digest(), "big")
+        for bit in range(SIMHASH_BITS):
+            weights[bit] += count if (h >> bit) & 1 else -count
+    value = 0
+    for bit, weight in enumerate(weights):
+        if weight > 0:
+            value |= 1 << bit
+    return value
+
+
+def hamming(a: int, b: int) -> int:
+    return (a ^ b).bit_count()
+
+
+def bands(value: int) -> list[int]:
+    # LSH 用に SimHash を BANDS 個の区間へ分割する。
+    result: list[int] = []
+    shift = 0
+    for width in _BAND_WIDTHS:
+        result.append((value >> shift) & ((1 << width) - 1))
+        shift += width
+    return result
+
+
+def to_sql(value: int) -> int:
+    # SQLite の INTEGER は符号付き 64bit なので、上位ビットが立つ値は負数へ写す。
+    return value - (1 << SIMHASH_BITS) if value >= 1 << (SIMHASH_BITS - 1) else value
+
+
+def from_sql(value: int) -> int:
+    return value + (1 << SIMHASH_BITS) if value < 0 else value
@@ -2,11 +2,15 @@ from __future__ import annotations
 
 import hashlib
 import re
+from datetime import datetime, timezone
 
 from .models import RawItem, UpdateItem
 
 """収集した生データを、比較しやすい形式へ整えるモジュール。"""
 
+# コレクターが1件の本文として取り込む最大文字数（HTML・フィードで共通）。
+MAX_BODY_CHARS = 2500
+
 
 def _clean_text(text: str) -> str:
     # 改行や連続スペースを1つに圧縮して差分ノイズを減らす。
@@ -14,9 +18,47 @@ def _clean_text(text: str) -> str:
     return text
 
 
-def _fingerprint(source_id: str, title: str, url: str, body: str) -> str:
+def slugify(text: str) -> str:
+    # 見出し文字列を URL フラグメント向けの安全な形へ変換する。
+    s = re.sub(r"[^a-zA-Z0-9\s_-]", "", text).strip().lower()
+    s = re.sub(r"[\s_-]+", "-", s)
+    return s[:60] or "update"
+
+
+_MONTHS = "January|February|March|April|May|June|July|August|September|October|November|December"
+
+
+def parse_heading_date(text: str) -> datetime | None:
+    # 見出しに含まれる日付を拾う（YYYY-MM-DD / Month DD, YYYY）。
+    m = re.search(r"(20\d{2})[-/](\d{1,2})[-/](\d{1,2})", text)
+    if m:
+        y, mo, d = m.groups()
+        try:
+            return datetime(int(y), int(mo), int(d), tzinfo=timezone.utc)
+        except ValueError:
+            return None
+    m = re.search(rf"({_MONTHS})\s+(\d{{1,2}}),\s*(20\d{{2}})", text, flags=re.IGNORECASE)
+    if m:
+        mon, d, y = m.groups()
+        try:
+            return datetime.strptime(f"{mon} {d} {y}", "%B %d %Y").replace(tzinfo=timezone.utc)
+        except ValueError:
+            return None
+    return None
+
+
+def section_id(heading: str, body: str, published: datetime | None) -> str:
+    # ページ内の位置に依存しないセクション識別子（見出し + 日付 + 本文ハッシュ）。
+    # 上に新しいセクションが追加されても、既存セクションの識別子は変わらない。
+    day = published.date().isoformat() if published else "undated"
+    digest = hashlib.sha256(_clean_text(body).lower().encode("utf-8")).hexdigest()[:12]
+    return f"{slugify(heading)}-{day}-{digest}"
+
+
+def _fingerprint(source_id: str, title: str, key: str, body: str) -> str:
     # 重複判定に使うハッシュを作る。本文は先頭のみ使って過剰な差分を抑える。
-    base = f"{source_id}|{title.lower()}|{url}|{body[:500].lower()}"
+    # key にはセクション識別子（無ければ URL）を使う。
+    base = f"{source_id}|{title.lower()}|{key}|{body[:500].lower()}"
     return hashlib.sha256(base.encode("utf-8")).hexdigest()
 
 
@@ -31,5 +73,6 @@ def normalize(raw: RawItem) -> UpdateItem:
         url=raw.url,
         published_at=raw.published_at,
         body=body,
-        fingerprint=_fingerprint(raw.source_id, title, raw.url, body),
+        fingerprint=_fingerprint(raw.source_id, title, raw.section_id or raw.url, body),
+        section_id=raw.section_id,
     )
@@ -0,0 +1,418 @@
+from __future__ import annotations
+
+import asyncio
+import time
+import traceback
+from dataclasses import dataclass
+
+import httpx
+
+from .collectors import GithubOptions, HtmlOptions, collect_iter, new_async_client
+from .config import Config
+from .dispatchers.discord import pack_messages, send_batch
+from .metrics import RunMetrics, activate, publish
+from .models import CollectResult, Summary, UpdateItem
+from .near_dup import MAX_SUPPORTED_DISTANCE, simhash
+from .normalize import normalize
+from .sources import Source
+from .store import Store
+from .summarizer import ProviderPolicy, SummaryCache, configure_providers, resolve_provider, summarize_batch
+
+"""収集 -> 正規化/重複判定 -> 要約 -> 通知 を上限付きキューでつなぎ、ステージごとに並行実行するモジュール。"""
+
+# ステージ終了を後続へ伝える番兵。
+_DONE = None
+
+
+def _service_webhook(cfg: Config, service: str) -> str | None:
+    # サービス名から対応する Webhook を引くヘルパー。
+    if service == "openai":
+        return cfg.webhook_openai
+    if service == "gemini":
+        return cfg.webhook_gemini
+    if service == "claude":
+        return cfg.webhook_claude
+    return None
+
+
+@dataclass(slots=True)
+class _SourceProgress:
+    # ソースごとの未完了アイテム数。0 になったら検証子と状態を保存する。
+    result: CollectResult
+    pending: int = 0
+    failed: bool = False
+
+
+class _MinInterval:
+    # 送信間隔を一定以上あける簡易レートリミッター。
+    def __init__(self, interval: float) -> None:
+        self.interval = interval
+        self._lock = asyncio.Lock()
+        self._next_at = 0.0
+
+    async def wait(self) -> None:
+        async with self._lock:
+            delay = self._next_at - time.monotonic()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            self._next_at = time.monotonic() + self.interval
+
+
+class Pipeline:
+    # Store への書き込みはすべてイベントループのスレッドで行う。各アイテムは
+    # (add_updates + outbox 登録) -> add_summaries -> (outbox 削除 + mark_immediate_sent) の順に commit される。
+    # 通知対象の新着は既読と同時に通知待ちへ登録されるため、要約や送信の前に落ちても次回実行の最初に送られる。
+    # 送信後・outbox 削除前に落ちた場合だけは、同じ通知が次回もう一度送られる。
+    def __init__(self, cfg: Config, store: Store) -> None:
+        self.cfg = cfg
+        self.store = store
+        size = max(1, cfg.pipeline_queue_size)
+        self._collected: asyncio.Queue[tuple[Source, CollectResult | Exception] | None] = asyncio.Queue(size)
+        self._to_summarize: asyncio.Queue[UpdateItem | None] = asyncio.Queue(size)
+        self._to_dispatch: asyncio.Queue[tuple[UpdateItem, Summary] | None] = asyncio.Queue(size)
+        self._progress: dict[str, _SourceProgress] = {}
+        # ソース別の新着件数（既読でない fingerprint の数）。収集に失敗したソースは含まない。
+        self.new_counts: dict[str, int] = {}
+        # ステージ別の所要時間（collect / dedup はソース単位、summarize はバッチ単位、dispatch はメッセージ単位）と件数。
+        self.metrics = RunMetrics()
+        self._dispatch_limit = _MinInterval(cfg.dispatch_min_interval)
+        self.summary_cache = SummaryCache(store, cfg.summary_cache_size)
+        self.html_options = HtmlOptions(parser=cfg.html_parser, stream=cfg.html_stream, max_bytes=cfg.html_max_bytes)
+        self.github_options = GithubOptions(
+            token=cfg.github_token, batch_size=cfg.github_batch_size, max_pages=cfg.github_max_pages
+        )
+        # 要約 API の流量上限は要約スレッド間で共有するため、プロセス全体の設定として渡す。
+        configure_providers(
+            {
+                "openai": ProviderPolicy(
+                    rpm=cfg.openai_rpm,
+                    tpm=cfg.openai_tpm,
+                    max_retries=cfg.summary_max_retries,
+                    deadline=cfg.summary_deadline,
+                    base_url=cfg.openai_base_url,
+                ),
+                "gemini": ProviderPolicy(
+                    rpm=cfg.gemini_rpm,
+                    tpm=cfg.gemini_tpm,
+                    max_retries=cfg.summary_max_retries,
+                    deadline=cfg.summary_deadline,
+                    base_url=cfg.gemini_base_url,
+                ),
+            }
+        )
+
+    async def run(self, sources: list[Source], client: httpx.AsyncClient) -> None:
+        # 実行中に作るタスクと要約スレッドからの計測は self.metrics へ記録する。
+        with activate(self.metrics), self.metrics.timer("run"):
+            await self._run(sources, client)
+        self.metrics.incr("summary_cache_hits", self.summary_cache.hits)
+        self.metrics.incr("summary_cache_misses", self.summary_cache.misses)
+        for name, value in self.store.seen_filter_stats().items():
+            self.metrics.incr(name, value)
+
+    async def _run(self, sources: list[Source], client: httpx.AsyncClient) -> None:
+        # 古いプロンプト版・モデルの要約キャッシュを先に掃除しておく。
+        cfg = self.cfg
+        provider, _, model = resolve_provider(
+            cfg.summary_provider, cfg.openai_api_key, cfg.openai_model, cfg.gemini_api_key, cfg.gemini_model
+        )
+        self.summary_cache.evict_stale(provider, model, cfg.summary_cache_ttl_days)
+        # 保持期限を過ぎた本文も消しておき、DB ファイルの大きさを一定に保つ。
+        self.metrics.incr("bodies_pruned", self.store.prune_bodies(cfg.body_retention_days))
+        # 前回までに送れなかった通知を、新規収集より先に送る。
+        await self._drain_outbox()
+        summarizers = max(1, cfg.summary_concurrency)
+        dispatchers = max(1, cfg.dispatch_concurrency)
+
+        async def summarize_stage() -> None:
+            await asyncio.gather(*(self._summarize_worker() for _ in range(summarizers)))
+            for _ in range(dispatchers):
+                await self._to_dispatch.put(_DONE)
+
+        await asyncio.gather(
+            self._collect_stage(sources, client),
+            self._dedup_stage(summarizers),
+            summarize_stage(),
+            *(self._dispatch_worker() for _ in range(dispatchers)),
+        )
+
+    async def _collect_stage(self, sources: list[Source], client: httpx.AsyncClient) -> None:
+        # 完了したソースから順に後段へ流す。
+        try:
+            async for pair in collect_iter(
+                client,
+                sources,
+                self.cfg.user_agent,
+                max_concurrency=self.cfg.collect_concurrency,
+                per_host_limit=self.cfg.collect_per_host,
+                store=self.store,
+                html_options=self.html_options,
+                github_options=self.github_options,
+            ):
+                await self._collected.put(pair)
+        finally:
+            await self._collected.put(_DONE)
+
+    async def _dedup_stage(self, summarizers: int) -> None:
+        # 正規化と既読判定は単一ワーカーで行い、新着の保存順を収集順に保つ。
+        while (pair := await self._collected.get()) is not _DONE:
+            source, result = pair
+            self.metrics.incr("sources")
+            if isinstance(result, Exception):
+                # 1ソース失敗しても全体は止めず、次ソースへ進む。
+                print(f"[warn] source collection failed: {source.id}: {result}")
+                self.metrics.incr("sources_failed")
+                continue
+            if result.not_modified:
+                self.metrics.incr("sources_not_modified")
+            self.metrics.observe("collect", result.elapsed)
+            started = time.perf_counter()
+            progress = _SourceProgress(result=result)
+            self._progress[source.id] = progress
+            items: list[UpdateItem] = []
+            for raw in result.items:
+                try:
+                    # 生データを比較しやすい形へ変換する。
+                    items.append(normalize(raw))
+                except Exception as exc:
+                    print(f"[warn] item normalize failed: {source.id}: {exc}")
+                    progress.failed = True
+            # 既読判定はソース単位で1クエリにまとめ、同一ページ内の重複も除く。
+            seen = self.store.seen_fingerprints(item.fingerprint for item in items)
+            unseen: list[UpdateItem] = []
+            for item in items:
+                if item.fingerprint in seen:
+                    continue
+                seen.add(item.fingerprint)
+                unseen.append(item)
+            self.new_counts[source.id] = len(unseen)
+            self.metrics.incr("items_collected", len(items))
+            self.metrics.incr("items_new", len(unseen))
+            # 新着と通知待ちはソース単位の1トランザクションで保存してから要約へ回す。
+            # 要約に失敗したり途中で落ちたりしても、通知待ちは次回実行の最初に送られる。
+            with self.store.transaction():
+                new_items = self._drop_near_duplicates(unseen)
+                self.store.enqueue_outbox(item for item in new_items if _service_webhook(self.cfg, item.service))
+            progress.pending = len(new_items)
+            self.metrics.observe("dedup", time.perf_counter() - started)
+            if not new_items:
+                self._finish_source(source.id)
+            for item in new_items:
+                await self._to_summarize.put(item)
+        for _ in range(summarizers):
+            await self._to_summarize.put(_DONE)
+
+    def _drop_near_duplicates(self, items: list[UpdateItem]) -> list[UpdateItem]:
+        # 全件を既読として保存し、既存本文と近似重複のものは要約・通知対象から外す。
+        # transaction() の内側で呼び、同じバッチ内の近似重複も順に検出できるよう索引を逐次更新する。
+        self.store.add_updates(items)
+        if not self.cfg.near_dup_enabled:
+            return items
+        max_distance = min(max(0, self.cfg.near_dup_max_distance), MAX_SUPPORTED_DISTANCE)
+        fresh: list[UpdateItem] = []
+        for item in items:
+            value = simhash(item.body)
+            if value is None:
+                fresh.append(item)
+                continue
+            original = self.store.find_near_duplicate(value, max_distance, item.service)
+            if original:
+                print(f"[info] near-duplicate skipped: {item.source_id}: {item.title} ~ {original}")
+                self.store.mark_duplicates([(item.fingerprint, original)])
+                self.metrics.incr("near_duplicates")
+                continue
+            self.store.add_simhashes([(item.fingerprint, value)])
+            fresh.append(item)
+        return fresh
+
+    async def _summarize_worker(self) -> None:
+        # LLM 呼び出しは同期 API のためスレッドで実行し、複数件を並行させる。
+        # キューに溜まっている分は最大 summary_batch_size 件まで1リクエストにまとめる。
+        cfg = self.cfg
+        batch_size = max(1, cfg.summary_batch_size)
+        finished = False
+        while not finished:
+            first = await self._to_summarize.get()
+            if first is _DONE:
+                break
+            batch = [first]
+            while len(batch) < batch_size and not self._to_summarize.empty():
+                item = self._to_summarize.get_nowait()
+                if item is _DONE:
+                    # 番兵は1ワーカー1個なので、この分を処理したら終了する。
+                    finished = True
+                    break
+                batch.append(item)
+            started = time.perf_counter()
+            try:
+                summaries = await asyncio.to_thread(self._summarize, batch)
+                self.store.add_summaries((item.fingerprint, summary) for item, summary in zip(batch, summaries))
+                self.metrics.observe("summarize", time.perf_counter() - started)
+            except Exception as exc:
+                for item in batch:
+                    self._item_failed(item, exc)
+                continue
+            for item, summary in zip(batch, summaries):
+                await self._to_dispatch.put((item, summary))
+
+    def _summarize(self, batch: list[UpdateItem]) -> list[Summary]:
+        # 要約スレッドから呼ぶ。最大 summary_batch_size 件ずつ1リクエストにまとめて要約する。
+        cfg = self.cfg
+        return summarize_batch(
+            batch,
+            provider=cfg.summary_provider,
+            openai_api_key=cfg.openai_api_key,
+            openai_model=cfg.openai_model,
+            gemini_api_key=cfg.gemini_api_key,
+            gemini_model=cfg.gemini_model,
+            max_items=max(1, cfg.summary_batch_size),
+            token_budget=cfg.summary_batch_token_budget,
+            cache=self.summary_cache,
+        )
+
+    async def _dispatch_worker(self) -> None:
+        # 新着がまとまって届いたときは dispatch_batch_window 秒だけ後続を待ち、
+        # Webhook ごとに最大 dispatch_max_embeds 件を1メッセージにまとめて送る。
+        window = max(0.0, self.cfg.dispatch_batch_window)
+        finished = False
+        while not finished:
+            first = await self._to_dispatch.get()
+            if first is _DONE:
+                break
+            jobs = [first]
+            deadline = time.monotonic() + window
+            while True:
+                if self._to_dispatch.empty():
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    # wait_for でキューを待つと取り出した値を取りこぼすことがあるため、短い間隔で覗く。
+                    await asyncio.sleep(min(remaining, 0.05))
+                    continue
+                job = self._to_dispatch.get_nowait()
+                if job is _DONE:
+                    # 番兵は1ワーカー1個なので、この分を送ったら終了する。
+                    finished = True
+                    break
+                jobs.append(job)
+            await self._dispatch_jobs(jobs)
+
+    async def _dispatch_jobs(self, jobs: list[tuple[UpdateItem, Summary]]) -> None:
+        by_webhook: dict[str, list[tuple[UpdateItem, Summary]]] = {}
+        for item, summary in jobs:
+            webhook = _service_webhook(self.cfg, item.service)
+            if not webhook:
+                self._item_done(item.source_id)
+                continue
+            by_webhook.setdefault(webhook, []).append((item, summary))
+        for webhook, pairs in by_webhook.items():
+            for message in pack_messages(pairs, self.cfg.dispatch_max_embeds):
+                # 送れなかった通知はアウトボックスに残り、次回以降に再送される。
+                await self._send(webhook, message)
+                for item, _ in message:
+                    self._item_done(item.source_id)
+
+    async def _send(self, webhook: str, message: list[tuple[UpdateItem, Summary]]) -> bool:
+        # 1メッセージ分を送り、成否をアウトボックスへ記録する。
+        fingerprints = [item.fingerprint for item, _ in message]
+        started = time.perf_counter()
+        try:
+            await self._dispatch_limit.wait()
+            await asyncio.to_thread(send_batch, webhook, message)
+        except Exception as exc:
+            print(f"[warn] dispatch failed, kept in outbox: {len(message)} items: {exc}")
+            self.metrics.incr("dispatch_failures")
+            self.store.fail_outbox(
+                fingerprints, str(exc), self.cfg.outbox_max_attempts, self.cfg.outbox_retry_base
+            )
+            return False
+        self.store.complete_outbox(fingerprints)
+        self.metrics.observe("dispatch", time.perf_counter() - started)
+        self.metrics.incr("dispatch_messages")
+        self.metrics.incr("dispatch_items", len(message))
+        return True
+
+    async def _drain_outbox(self) -> None:
+        # 再試行時刻を過ぎた通知を Webhook ごとにまとめて送る。Webhook 同士は並行に送り、
+        # 同じ Webhook で失敗したら障害が続いているとみなして残りは次回に回す。
+        due = self.store.due_outbox()
+        if not due:
+            return
+        pairs = await self._complete_summaries(due)
+        by_webhook: dict[str, list[tuple[UpdateItem, Summary]]] = {}
+        for item, summary in pairs:
+            webhook = _service_webhook(self.cfg, item.service)
+            if webhook:
+                by_webhook.setdefault(webhook, []).append((item, summary))
+
+        async def drain(webhook: str, pairs: list[tuple[UpdateItem, Summary]]) -> None:
+            for message in pack_messages(pairs, self.cfg.dispatch_max_embeds):
+                if not await self._send(webhook, message):
+                    return
+
+        print(f"[info] draining outbox: {len(due)} pending notifications")
+        await asyncio.gather(*(drain(webhook, pairs) for webhook, pairs in by_webhook.items()))
+
+    async def _complete_summaries(
+        self, due: list[tuple[UpdateItem, Summary | None]]
+    ) -> list[tuple[UpdateItem, Summary]]:
+        # 前回の要約前に中断した通知待ちは、ここで要約し直してから送る。
+        # 要約し直せなければ失敗として記録し、バックオフ後の実行で再び試す。
+        missing = [item for item, summary in due if summary is None]
+        if not missing:
+            return [(item, summary) for item, summary in due if summary is not None]
+        try:
+            summaries = await asyncio.to_thread(self._summarize, missing)
+            self.store.add_summaries((item.fingerprint, summary) for item, summary in zip(missing, summaries))
+        except Exception as exc:
+            print(f"[warn] outbox summarize failed, kept in outbox: {len(missing)} items: {exc}")
+            fingerprints = [item.fingerprint for item in missing]
+            self.store.fail_outbox(fingerprints, str(exc), self.cfg.outbox_max_attempts, self.cfg.outbox_retry_base)
+            return [(item, summary) for item, summary in due if summary is not None]
+        resummarized = {item.fingerprint: summary for item, summary in zip(missing, summaries)}
+        return [(item, summary or resummarized[item.fingerprint]) for item, summary in due]
+
+    def _item_failed(self, item: UpdateItem, exc: Exception) -> None:
+        # 個別アイテム失敗時も、他アイテム処理を継続する。通知待ちはアウトボックスに残り、次回実行の最初に送られる。
+        print(f"[warn] item pipeline failed: {item.source_id}: {exc}")
+        self.metrics.incr("items_failed")
+        print("".join(traceback.format_exception(exc, limit=1)))
+        self._progress[item.source_id].failed = True
+        self._item_done(item.source_id)
+
+    def _item_done(self, source_id: str) -> None:
+        progress = self._progress[source_id]
+        progress.pending -= 1
+        if progress.pending <= 0:
+            self._finish_source(source_id)
+
+    def _finish_source(self, source_id: str) -> None:
+        progress = self._progress.pop(source_id)
+        if progress.failed:
+            return
+        # 全件処理できたソースだけ検証子と状態を保存し、次回以降の収集を省略可能にする。
+        with self.store.transaction():
+            for url, (etag, last_modified) in progress.result.validators.items():
+                self.store.save_validators(url, etag, last_modified)
+            for key, value in progress.result.state.items():
+                self.store.set_source_state(source_id, key, value)
+
+
+async def run_pipeline(
+    cfg: Config,
+    store: Store,
+    sources: list[Source],
+    client: httpx.AsyncClient | None = None,
+) -> dict[str, int]:
+    # 1回分の巡回を実行し、ソース別の新着件数を返す。client を渡せば呼び出し側の接続プールを再利用する。
+    # 計測値は実行の最後に run_metrics と設定済みのファイルへ書き出す。
+    pipeline = Pipeline(cfg, store)
+    try:
+        if client is not None:
+            await pipeline.run(sources, client)
+        else:
+            async with new_async_client(cfg.collect_concurrency) as shared:
+                await pipeline.run(sources, shared)
+    finally:
+        publish(cfg, store, pipeline.metrics)
+    return pipeline.new_counts
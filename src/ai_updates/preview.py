@@ -3,7 +3,6 @@ from __future__ import annotations
 import os
 
 from .config import Config
-from .dispatchers.discord import send_immediate
 from .models import Service, Summary, UpdateItem, utc_now
 
 """新着がなくても Discord 表示を確認できるプレビュー通知用モジュール。"""
@@ -69,6 +68,9 @@ def run_preview(target: str) -> None:
         if not webhook:
             print(f"[warn] webhook not set for service: {service}")
             continue
+        # httpx を読み込む送信処理は、送る直前まで import しない（設定不足での終了を軽くする）。
+        from .dispatchers.discord import send_immediate
+
         item, summary = _preview_item(service)
         send_immediate(webhook, item, summary)
 
@@ -7,7 +7,22 @@ from .models import Service
 
 """監視対象ソースの定義。"""
 
-SourceKind = Literal["html", "github_releases"]
+SourceKind = Literal["html", "github_releases", "feed"]
+
+
+@dataclass(frozen=True, slots=True)
+class ExtractionPlan:
+    # HTML ソースごとの抽出方法。セレクターは CSS 形式で、未指定の項目は標準の推定に従う。
+    # container: 本文コンテナ（未指定なら main -> article -> body）。単純なセレクターなら、その要素だけを解析する。
+    container: str | None = None
+    # heading: セクション見出し。body: 見出しの後に続く兄弟のうち本文として拾う要素。
+    heading: str = "h2, h3"
+    body: str = "p, li, ul, ol, div"
+    # date_attr: 見出し（または配下の要素）から日付を読む属性名（例: time の datetime）。
+    # date_pattern: 見出し文字列から日付を切り出す正規表現（グループがあれば最初のグループ）。
+    date_attr: str | None = None
+    date_pattern: str | None = None
+    max_sections: int = 20
 
 
 @dataclass(frozen=True, slots=True)
@@ -18,6 +33,11 @@ class Source:
     label: str
     kind: SourceKind
     url: str
+    # 新しい順に並ぶと分かっているページだけ True にし、前回の最新セクション（watermark）より下は読まない。
+    # 先頭に固定の案内や告知があるページで有効にすると、毎回そこで止まり新着を取りこぼす。
+    incremental: bool = False
+    # HTML の抽出方法。None なら標準の推定（main/article 配下の h2/h3）を使う。
+    plan: ExtractionPlan | None = None
 
 
 SOURCES: list[Source] = [
@@ -28,6 +48,7 @@ SOURCES: list[Source] = [
         label="OpenAI ChatGPT Release Notes",
         kind="html",
         url="https://help.openai.com/en/articles/6825453-chatgpt-release-notes",
+        incremental=True,
     ),
     Source(
         id="openai_codex_changelog",
@@ -35,6 +56,7 @@ SOURCES: list[Source] = [
         label="OpenAI Codex Changelog",
         kind="html",
         url="https://developers.openai.com/codex/changelog",
+        incremental=True,
     ),
     # Gemini
     Source(
@@ -58,5 +80,6 @@ SOURCES: list[Source] = [
         label="Claude Release Notes",
         kind="html",
         url="https://support.claude.com/en/articles/12138966-release-notes",
+        incremental=True,
     ),
 ]
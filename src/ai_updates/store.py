@@ -1,20 +1,127 @@
 from __future__ import annotations
 
+import functools
+import json
+import re
 import sqlite3
+import threading
+import zlib
+from collections.abc import Callable, Iterable, Iterator
+from contextlib import contextmanager
+from datetime import datetime, timedelta
 from pathlib import Path
+from typing import Any, TypeVar
 
+from . import metrics
+from .bloom import BloomFilter
 from .models import Summary, UpdateItem, utc_now
+from .near_dup import bands, from_sql, hamming, simhash, to_sql
+from .normalize import _fingerprint, parse_heading_date, section_id, slugify
 
 """SQLite を使った永続化層。既読管理と要約保存を担当する。"""
 
+# IN 句1回あたりのプレースホルダ数（SQLite の変数上限 999 を下回るように分割する）。
+_IN_CHUNK = 500
+
+# 適用済みスキーマ移行の版数（PRAGMA user_version）。
+_SCHEMA_VERSION = 3
+# 旧 html_collector が付けていた「#slug-index」形式の URL。
+_LEGACY_SECTION_URL = re.compile(r"^(.*)#(.+)-(\d+)$")
+
+# 通知アウトボックスの再試行間隔の上限（秒）。
+_OUTBOX_MAX_DELAY = 6 * 60 * 60
+
+# 本文の zlib 圧縮レベル（6 は速度と圧縮率の標準的な釣り合い）。
+_BODY_COMPRESSION_LEVEL = 6
+
+_T = TypeVar("_T")
+
+
+def _pack_body(body: str) -> bytes | str:
+    # 本文は zlib で圧縮して BLOB で保存する。空文字（保持期限切れで消した本文）はそのまま。
+    return zlib.compress(body.encode("utf-8"), _BODY_COMPRESSION_LEVEL) if body else ""
+
+
+def _unpack_body(value: bytes | str | None) -> str:
+    # 圧縮導入前に TEXT で保存した本文もそのまま読めるようにする。
+    if isinstance(value, bytes):
+        return zlib.decompress(value).decode("utf-8")
+    return value or ""
+
+
+def _legacy_heading(title: str, legacy_slug: str) -> str:
+    # title は「見出し | ページタイトル」。見出し側にも " | " がありうるため、
+    # 旧 slug 規則で一致する区切り位置を探し、見つからなければ先頭要素を使う。
+    parts = title.split(" | ")
+    for k in range(1, len(parts)):
+        heading = " | ".join(parts[:k])
+        s = re.sub(r"[^a-zA-Z0-9\s-]", "", heading).strip().lower()
+        if (re.sub(r"[\s_-]+", "-", s)[:60] or "update") == legacy_slug:
+            return heading
+    return parts[0]
+
+
+def _locked(method: Callable[..., _T]) -> Callable[..., _T]:
+    # 別スレッドからの呼び出しも、接続単位のロックで直列化する。
+    @functools.wraps(method)
+    def wrapper(self: "Store", *args: Any, **kwargs: Any) -> _T:
+        with self._lock:
+            return method(self, *args, **kwargs)
+
+    return wrapper
+
 
 class Store:
     def __init__(self, db_path: Path) -> None:
         # DBディレクトリが無ければ作成してから接続する。
         db_path.parent.mkdir(parents=True, exist_ok=True)
-        self.conn = sqlite3.connect(db_path)
+        # 要約ワーカー（別スレッド）からも要約キャッシュを読み書きするため、
+        # スレッド間共有を許可し、接続単位の RLock で操作を直列化する。
+        self.conn = sqlite3.connect(db_path, check_same_thread=False)
         self.conn.row_factory = sqlite3.Row
+        self._lock = threading.RLock()
+        # transaction() のネスト深さ。0 のときだけ各メソッドが個別に commit する。
+        self._tx_depth = 0
+        # 既読 fingerprint の Bloom フィルタ（enable_seen_filter で有効化）。
+        self._seen_filter: BloomFilter | None = None
+        self._seen_filter_error_rate = 0.0
+        self._configure()
         self._init_schema()
+        self._migrate()
+
+    def _configure(self) -> None:
+        # 新規 DB では削除で空いたページをファイル末尾から返却できるようにする（既存 DB は compact() で切り替わる）。
+        # ファイルのヘッダが書かれる前でないと効かないため、WAL への切り替えやテーブル作成より先に設定する。
+        self.conn.execute("PRAGMA auto_vacuum=INCREMENTAL")
+        # WAL + synchronous=NORMAL で commit ごとの fsync を減らす。
+        # WAL ファイルは最後の接続を close した時点でチェックポイントされ削除される。
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        # ページキャッシュを約 8MB に広げる（負値は KiB 指定）。
+        self.conn.execute("PRAGMA cache_size=-8192")
+        self.conn.execute("PRAGMA temp_store=MEMORY")
+
+    @contextmanager
+    def transaction(self) -> Iterator[None]:
+        # 複数の書き込みを1トランザクションにまとめる。ネスト時は最外側でのみ確定する。
+        # 実行中はロックを保持し、他スレッドの書き込みが混ざらないようにする。
+        with self._lock:
+            self._tx_depth += 1
+            try:
+                yield
+            except BaseException:
+                self._tx_depth -= 1
+                if self._tx_depth == 0:
+                    self.conn.rollback()
+                raise
+            self._tx_depth -= 1
+            if self._tx_depth == 0:
+                self.conn.commit()
+
+    def _commit(self) -> None:
+        # transaction() の内側では commit を遅延させる。
+        if self._tx_depth == 0:
+            self.conn.commit()
 
     def _init_schema(self) -> None:
         # 起動時に必要テーブルを自動作成する。
@@ -42,76 +149,647 @@ class Store:
                 created_at TEXT NOT NULL,
                 FOREIGN KEY(fingerprint) REFERENCES seen_updates(fingerprint)
             );
+
+            CREATE TABLE IF NOT EXISTS http_validators (
+                url TEXT PRIMARY KEY,
+                etag TEXT,
+                last_modified TEXT,
+                updated_at TEXT NOT NULL
+            );
+
+            CREATE TABLE IF NOT EXISTS source_state (
+                source_id TEXT NOT NULL,
+                key TEXT NOT NULL,
+                value TEXT NOT NULL,
+                updated_at TEXT NOT NULL,
+                PRIMARY KEY (source_id, key)
+            );
+
+            CREATE TABLE IF NOT EXISTS summary_cache (
+                cache_key TEXT PRIMARY KEY,
+                prompt_version TEXT NOT NULL,
+                provider TEXT NOT NULL,
+                model TEXT NOT NULL,
+                headline TEXT NOT NULL,
+                bullets_json TEXT NOT NULL,
+                importance TEXT NOT NULL,
+                topic TEXT NOT NULL,
+                created_at TEXT NOT NULL
+            );
+
+            CREATE TABLE IF NOT EXISTS simhash_index (
+                fingerprint TEXT PRIMARY KEY,
+                simhash INTEGER NOT NULL,
+                band0 INTEGER NOT NULL,
+                band1 INTEGER NOT NULL,
+                band2 INTEGER NOT NULL,
+                band3 INTEGER NOT NULL,
+                band4 INTEGER NOT NULL,
+                band5 INTEGER NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS idx_simhash_band0 ON simhash_index(band0);
+            CREATE INDEX IF NOT EXISTS idx_simhash_band1 ON simhash_index(band1);
+            CREATE INDEX IF NOT EXISTS idx_simhash_band2 ON simhash_index(band2);
+            CREATE INDEX IF NOT EXISTS idx_simhash_band3 ON simhash_index(band3);
+            CREATE INDEX IF NOT EXISTS idx_simhash_band4 ON simhash_index(band4);
+            CREATE INDEX IF NOT EXISTS idx_simhash_band5 ON simhash_index(band5);
+
+            CREATE TABLE IF NOT EXISTS outbox (
+                idempotency_key TEXT PRIMARY KEY,
+                fingerprint TEXT NOT NULL,
+                service TEXT NOT NULL,
+                status TEXT NOT NULL DEFAULT 'pending',
+                attempts INTEGER NOT NULL DEFAULT 0,
+                next_attempt_at TEXT NOT NULL,
+                last_error TEXT,
+                created_at TEXT NOT NULL,
+                FOREIGN KEY(fingerprint) REFERENCES seen_updates(fingerprint)
+            );
+            CREATE INDEX IF NOT EXISTS idx_outbox_due ON outbox(status, next_attempt_at);
+
+            CREATE TABLE IF NOT EXISTS seen_filter (
+                id INTEGER PRIMARY KEY CHECK (id = 1),
+                num_bits INTEGER NOT NULL,
+                num_hashes INTEGER NOT NULL,
+                error_rate REAL NOT NULL,
+                bits BLOB NOT NULL,
+                row_count INTEGER NOT NULL,
+                max_rowid INTEGER NOT NULL,
+                saved_at TEXT NOT NULL
+            );
+
+            CREATE TABLE IF NOT EXISTS run_metrics (
+                run_started_at TEXT NOT NULL,
+                name TEXT NOT NULL,
+                value REAL NOT NULL,
+                PRIMARY KEY (run_started_at, name)
+            );
             """
         )
         self.conn.commit()
 
+    def _migrate(self) -> None:
+        # PRAGMA user_version で適用済みの移行を管理し、未適用分だけを順に実行する。
+        version = self.conn.execute("PRAGMA user_version").fetchone()[0]
+        if version < 1:
+            with self.transaction():
+                self._migrate_section_ids()
+        if version < 2:
+            with self.transaction():
+                self._migrate_near_dup_index()
+        if version < 3:
+            with self.transaction():
+                self._migrate_compressed_bodies()
+        if version < _SCHEMA_VERSION:
+            # fingerprint を付け替える移行がありうるため、Bloom フィルタのスナップショットは作り直させる。
+            self.conn.execute("DELETE FROM seen_filter")
+            self.conn.execute(f"PRAGMA user_version = {_SCHEMA_VERSION}")
+            self.conn.commit()
+
+    def _migrate_section_ids(self) -> None:
+        # 旧形式（URL 末尾が #slug-index）の HTML セクションを、位置に依存しない識別子の
+        # fingerprint へ付け替える。既に同じ fingerprint がある行は IGNORE で残す。
+        rows = self.conn.execute("SELECT fingerprint, source_id, title, url, body FROM seen_updates").fetchall()
+        for row in rows:
+            m = _LEGACY_SECTION_URL.match(row["url"])
+            if not m:
+                continue
+            base, legacy_slug = m.group(1), m.group(2)
+            heading = _legacy_heading(row["title"], legacy_slug)
+            body = _unpack_body(row["body"])
+            key = section_id(heading, body, parse_heading_date(heading))
+            fingerprint = _fingerprint(row["source_id"], row["title"], key, body)
+            self.conn.execute(
+                "UPDATE OR IGNORE seen_updates SET fingerprint = ?, url = ? WHERE fingerprint = ?",
+                (fingerprint, f"{base}#{slugify(heading)}", row["fingerprint"]),
+            )
+            self.conn.execute(
+                "UPDATE OR IGNORE summaries SET fingerprint = ? WHERE fingerprint = ?",
+                (fingerprint, row["fingerprint"]),
+            )
+
+    def _migrate_near_dup_index(self) -> None:
+        # 近似重複の記録列を追加し、既存の本文から SimHash 索引を作る。
+        columns = {row["name"] for row in self.conn.execute("PRAGMA table_info(seen_updates)")}
+        if "duplicate_of" not in columns:
+            self.conn.execute("ALTER TABLE seen_updates ADD COLUMN duplicate_of TEXT")
+        rows = self.conn.execute("SELECT fingerprint, body FROM seen_updates").fetchall()
+        self._insert_simhashes(
+            (row["fingerprint"], value) for row in rows if (value := simhash(_unpack_body(row["body"]))) is not None
+        )
+
+    def _migrate_compressed_bodies(self) -> None:
+        # TEXT で保存済みの本文を圧縮した BLOB へ置き換える。空いたページは compact() で返却する。
+        rows = self.conn.execute(
+            "SELECT fingerprint, body FROM seen_updates WHERE typeof(body) = 'text' AND body != ''"
+        ).fetchall()
+        self.conn.executemany(
+            "UPDATE seen_updates SET body = ? WHERE fingerprint = ?",
+            [(_pack_body(row["body"]), row["fingerprint"]) for row in rows],
+        )
+
+    def _insert_simhashes(self, pairs: Iterable[tuple[str, int]]) -> None:
+        self.conn.executemany(
+            """
+            INSERT OR REPLACE INTO simhash_index (
+                fingerprint, simhash, band0, band1, band2, band3, band4, band5
+            ) VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+            """,
+            [(fingerprint, to_sql(value), *bands(value)) for fingerprint, value in pairs],
+        )
+
+    def _seen_rows(self) -> tuple[int, int]:
+        row = self.conn.execute("SELECT COUNT(*), COALESCE(MAX(rowid), 0) FROM seen_updates").fetchone()
+        return row[0], row[1]
+
+    @_locked
+    def enable_seen_filter(self, capacity: int, error_rate: float) -> dict[str, float]:
+        # 既読判定の前段に Bloom フィルタを置く。保存済みのスナップショットが現在の seen_updates と
+        # 一致すればそれを読み、なければ（件数が容量を超えた場合も）全 fingerprint から作り直す。
+        if capacity <= 0:
+            self._seen_filter = None
+            return {}
+        rows, max_rowid = self._seen_rows()
+        snapshot = self.conn.execute("SELECT * FROM seen_filter WHERE id = 1").fetchone()
+        if (
+            snapshot is not None
+            and (snapshot["row_count"], snapshot["max_rowid"]) == (rows, max_rowid)
+            and snapshot["error_rate"] == error_rate
+            and BloomFilter.for_capacity(max(capacity, rows), error_rate).num_bits <= snapshot["num_bits"]
+        ):
+            self._seen_filter = BloomFilter(snapshot["num_bits"], snapshot["num_hashes"], snapshot["bits"], rows)
+        else:
+            # 件数が設定容量に近づいたら、偽陽性率を保てるよう2倍の件数を見込んで作る。
+            size = capacity if rows * 2 <= capacity else rows * 2
+            self._seen_filter = BloomFilter.for_capacity(size, error_rate)
+            self._seen_filter.update(row[0] for row in self.conn.execute("SELECT fingerprint FROM seen_updates"))
+            self._save_seen_filter()
+        self._seen_filter_error_rate = error_rate
+        return self.seen_filter_stats()
+
+    def _save_seen_filter(self) -> None:
+        # 次回起動時に作り直さずに済むよう、現在の seen_updates の件数と最大 rowid とともに保存する。
+        if self._seen_filter is None:
+            return
+        rows, max_rowid = self._seen_rows()
+        self._seen_filter.count = rows
+        self.conn.execute(
+            """
+            INSERT OR REPLACE INTO seen_filter (
+                id, num_bits, num_hashes, error_rate, bits, row_count, max_rowid, saved_at
+            ) VALUES (1, ?, ?, ?, ?, ?, ?, ?)
+            """,
+            (
+                self._seen_filter.num_bits,
+                self._seen_filter.num_hashes,
+                self._seen_filter_error_rate,
+                bytes(self._seen_filter.bits),
+                rows,
+                max_rowid,
+                utc_now().isoformat(),
+            ),
+        )
+        self._commit()
+
+    @_locked
+    def seen_filter_stats(self) -> dict[str, float]:
+        # 件数・メモリ使用量・現在の件数での偽陽性率の見積もり。
+        if self._seen_filter is None:
+            return {}
+        return {
+            "seen_filter_items": self._seen_filter.count,
+            "seen_filter_bytes": self._seen_filter.memory_bytes,
+            "seen_filter_false_positive_rate": self._seen_filter.false_positive_rate(),
+        }
+
+    @_locked
     def is_seen(self, fingerprint: str) -> bool:
-        # 既読判定は fingerprint の存在確認のみで行う。
+        # 既読判定は fingerprint の存在確認のみで行う。Bloom フィルタに無ければ確実に未読なので DB を引かない。
+        if self._seen_filter is not None and fingerprint not in self._seen_filter:
+            metrics.incr("seen_filter_skips")
+            return False
         row = self.conn.execute(
             "SELECT 1 FROM seen_updates WHERE fingerprint = ? LIMIT 1", (fingerprint,)
         ).fetchone()
         return row is not None
 
+    @_locked
+    def seen_fingerprints(self, fingerprints: Iterable[str]) -> set[str]:
+        # 複数 fingerprint の既読判定を IN 句でまとめて行い、既読のものだけ返す。
+        pending = list(dict.fromkeys(fingerprints))
+        if self._seen_filter is not None:
+            # フィルタに無いものは未読で確定。有るものは偽陽性がありうるので DB で確かめる。
+            candidates = [fp for fp in pending if fp in self._seen_filter]
+            metrics.incr("seen_filter_skips", len(pending) - len(candidates))
+            pending = candidates
+        seen: set[str] = set()
+        for start in range(0, len(pending), _IN_CHUNK):
+            chunk = pending[start : start + _IN_CHUNK]
+            placeholders = ",".join("?" * len(chunk))
+            rows = self.conn.execute(
+                f"SELECT fingerprint FROM seen_updates WHERE fingerprint IN ({placeholders})", chunk
+            ).fetchall()
+            seen.update(row["fingerprint"] for row in rows)
+        return seen
+
+    @_locked
     def add_update(self, item: UpdateItem) -> None:
-        # INSERT OR IGNORE で二重登録を防ぐ。
-        self.conn.execute(
+        self.add_updates([item])
+
+    @_locked
+    def add_updates(self, items: Iterable[UpdateItem]) -> None:
+        # INSERT OR IGNORE で二重登録を防ぐ。executemany で1回の commit にまとめる。
+        items = list(items)
+        now = utc_now().isoformat()
+        self.conn.executemany(
             """
             INSERT OR IGNORE INTO seen_updates (
                 fingerprint, source_id, service, title, url, published_at, body, first_seen_at
             ) VALUES (?, ?, ?, ?, ?, ?, ?, ?)
             """,
-            (
-                item.fingerprint,
-                item.source_id,
-                item.service,
-                item.title,
-                item.url,
-                item.published_at.isoformat(),
-                item.body,
-                utc_now().isoformat(),
-            ),
+            [
+                (
+                    item.fingerprint,
+                    item.source_id,
+                    item.service,
+                    item.title,
+                    item.url,
+                    item.published_at.isoformat(),
+                    _pack_body(item.body),
+                    now,
+                )
+                for item in items
+            ],
         )
-        self.conn.commit()
+        if self._seen_filter is not None:
+            # ロールバックされた分が残っても偽陽性が増えるだけで、判定は DB で確かめるので誤らない。
+            self._seen_filter.update(item.fingerprint for item in items)
+        self._commit()
 
+    @_locked
     def add_summary(self, fingerprint: str, summary: Summary) -> None:
+        self.add_summaries([(fingerprint, summary)])
+
+    @_locked
+    def add_summaries(self, pairs: Iterable[tuple[str, Summary]]) -> None:
         # 箇条書きは改行区切りで1カラムに保存する。
-        bullets = "\n".join(summary.bullets)
-        self.conn.execute(
+        now = utc_now().isoformat()
+        rows = [
+            (fingerprint, summary.headline, "\n".join(summary.bullets), summary.importance, summary.topic, now)
+            for fingerprint, summary in pairs
+        ]
+        self.conn.executemany(
             """
             INSERT OR REPLACE INTO summaries (
                 fingerprint, headline, bullets_json, importance, topic, created_at
             ) VALUES (?, ?, ?, ?, ?, ?)
             """,
+            rows,
+        )
+        self.conn.executemany(
+            # 要約完了時刻を seen_updates 側にも記録する。
+            "UPDATE seen_updates SET summarized_at = ? WHERE fingerprint = ?",
+            [(now, row[0]) for row in rows],
+        )
+        self._commit()
+
+    @_locked
+    def mark_immediate_sent(self, fingerprint: str) -> None:
+        self.mark_immediate_sent_many([fingerprint])
+
+    @_locked
+    def mark_immediate_sent_many(self, fingerprints: Iterable[str]) -> None:
+        # Discord 送信済みフラグの更新。
+        now = utc_now().isoformat()
+        self.conn.executemany(
+            "UPDATE seen_updates SET sent_immediate_at = ? WHERE fingerprint = ?",
+            [(now, fingerprint) for fingerprint in fingerprints],
+        )
+        self._commit()
+
+    @_locked
+    def enqueue_outbox(self, items: Iterable[UpdateItem]) -> None:
+        # 新着アイテムを通知待ちとして登録する。add_updates と同じトランザクションで呼び、要約前に落ちても次回送れるようにする。
+        # キーは送信先種別 + fingerprint で、登録済み・送信済みのものは追加しない（同じ通知を二重に積まない）。
+        now = utc_now().isoformat()
+        self.conn.executemany(
+            """
+            INSERT OR IGNORE INTO outbox (idempotency_key, fingerprint, service, next_attempt_at, created_at)
+            SELECT ?, fingerprint, service, ?, ? FROM seen_updates
+            WHERE fingerprint = ? AND sent_immediate_at IS NULL
+            """,
+            [(f"discord:{item.fingerprint}", now, now, item.fingerprint) for item in items],
+        )
+        self._commit()
+
+    @_locked
+    def due_outbox(self, limit: int = 500) -> list[tuple[UpdateItem, Summary | None]]:
+        # 再試行時刻を過ぎた通知待ちを、登録順に item と要約の組で返す。要約前に中断したものは要約が None。
+        rows = self.conn.execute(
+            """
+            SELECT u.fingerprint, u.source_id, u.service, u.title, u.url, u.published_at, u.body,
+                   s.headline, s.bullets_json, s.importance, s.topic
+            FROM outbox o
+            JOIN seen_updates u ON u.fingerprint = o.fingerprint
+            LEFT JOIN summaries s ON s.fingerprint = o.fingerprint
+            WHERE o.status = 'pending' AND o.next_attempt_at <= ?
+            ORDER BY o.created_at, o.idempotency_key
+            LIMIT ?
+            """,
+            (utc_now().isoformat(), limit),
+        ).fetchall()
+        return [
             (
-                fingerprint,
+                UpdateItem(
+                    source_id=row["source_id"],
+                    service=row["service"],
+                    title=row["title"],
+                    url=row["url"],
+                    published_at=datetime.fromisoformat(row["published_at"]),
+                    body=_unpack_body(row["body"]),
+                    fingerprint=row["fingerprint"],
+                ),
+                Summary(
+                    headline=row["headline"],
+                    bullets=row["bullets_json"].split("\n") if row["bullets_json"] else [],
+                    importance=row["importance"],
+                    topic=row["topic"],
+                )
+                if row["headline"] is not None
+                else None,
+            )
+            for row in rows
+        ]
+
+    @_locked
+    def complete_outbox(self, fingerprints: Iterable[str]) -> None:
+        # 送信できた通知をアウトボックスから外し、送信済みにする。
+        pending = list(fingerprints)
+        with self.transaction():
+            self.conn.executemany("DELETE FROM outbox WHERE fingerprint = ?", [(fp,) for fp in pending])
+            self.mark_immediate_sent_many(pending)
+
+    @_locked
+    def fail_outbox(self, fingerprints: Iterable[str], error: str, max_attempts: int, base_delay: float) -> None:
+        # 送信失敗を記録し、指数バックオフで次回時刻を決める。上限回数に達したら dead にする。
+        now = utc_now()
+        pending = list(fingerprints)
+        rows = []
+        for start in range(0, len(pending), _IN_CHUNK):
+            chunk = pending[start : start + _IN_CHUNK]
+            placeholders = ",".join("?" * len(chunk))
+            rows.extend(
+                self.conn.execute(
+                    f"SELECT idempotency_key, attempts FROM outbox WHERE fingerprint IN ({placeholders})", chunk
+                ).fetchall()
+            )
+        updates = []
+        for row in rows:
+            attempts = row["attempts"] + 1
+            delay = min(base_delay * (2 ** (attempts - 1)), _OUTBOX_MAX_DELAY)
+            status = "dead" if attempts >= max_attempts else "pending"
+            updates.append(
+                (status, attempts, (now + timedelta(seconds=delay)).isoformat(), error[:500], row["idempotency_key"])
+            )
+        self.conn.executemany(
+            "UPDATE outbox SET status = ?, attempts = ?, next_attempt_at = ?, last_error = ? WHERE idempotency_key = ?",
+            updates,
+        )
+        self._commit()
+
+    @_locked
+    def outbox_counts(self) -> dict[str, int]:
+        # 状態別（pending / dead）の件数。
+        rows = self.conn.execute("SELECT status, COUNT(*) AS n FROM outbox GROUP BY status").fetchall()
+        return {row["status"]: row["n"] for row in rows}
+
+    @_locked
+    def find_near_duplicate(self, value: int, max_distance: int, service: str) -> str | None:
+        # いずれかのバンドが一致する行だけを索引で引き、ハミング距離が最小の既存行を返す。
+        # 通知先はサービスごとに分かれるため、同じサービスの既存行だけを重複元の候補にする。
+        rows = self.conn.execute(
+            """
+            SELECT h.fingerprint, h.simhash FROM simhash_index h
+            JOIN seen_updates u ON u.fingerprint = h.fingerprint
+            WHERE (h.band0 = ? OR h.band1 = ? OR h.band2 = ? OR h.band3 = ? OR h.band4 = ? OR h.band5 = ?)
+              AND u.service = ?
+            """,
+            (*bands(value), service),
+        ).fetchall()
+        best: tuple[int, str] | None = None
+        for row in rows:
+            distance = hamming(value, from_sql(row["simhash"]))
+            if distance <= max_distance and (best is None or distance < best[0]):
+                best = (distance, row["fingerprint"])
+        return best[1] if best else None
+
+    @_locked
+    def add_simhashes(self, pairs: Iterable[tuple[str, int]]) -> None:
+        self._insert_simhashes(pairs)
+        self._commit()
+
+    @_locked
+    def mark_duplicates(self, pairs: Iterable[tuple[str, str]]) -> None:
+        # (fingerprint, 重複元 fingerprint) を記録する。重複扱いの行は要約・通知しない。
+        self.conn.executemany(
+            "UPDATE seen_updates SET duplicate_of = ? WHERE fingerprint = ?",
+            [(original, fingerprint) for fingerprint, original in pairs],
+        )
+        self._commit()
+
+    @_locked
+    def get_validators(self, url: str) -> tuple[str | None, str | None] | None:
+        # 前回取得時の ETag / Last-Modified を返す（未保存なら None）。
+        row = self.conn.execute(
+            "SELECT etag, last_modified FROM http_validators WHERE url = ?", (url,)
+        ).fetchone()
+        if row is None:
+            return None
+        return (row["etag"], row["last_modified"])
+
+    @_locked
+    def save_validators(self, url: str, etag: str | None, last_modified: str | None) -> None:
+        # 検証子が無いレスポンスでは古い値を消し、無条件 GET に戻す。
+        if not etag and not last_modified:
+            self.conn.execute("DELETE FROM http_validators WHERE url = ?", (url,))
+        else:
+            self.conn.execute(
+                """
+                INSERT OR REPLACE INTO http_validators (url, etag, last_modified, updated_at)
+                VALUES (?, ?, ?, ?)
+                """,
+                (url, etag, last_modified, utc_now().isoformat()),
+            )
+        self._commit()
+
+    @_locked
+    def get_source_state(self, source_id: str, key: str) -> str | None:
+        # ソース別の小さな状態値（ページダイジェストなど）を返す。
+        row = self.conn.execute(
+            "SELECT value FROM source_state WHERE source_id = ? AND key = ?", (source_id, key)
+        ).fetchone()
+        return row["value"] if row else None
+
+    @_locked
+    def set_source_state(self, source_id: str, key: str, value: str) -> None:
+        self.conn.execute(
+            """
+            INSERT OR REPLACE INTO source_state (source_id, key, value, updated_at)
+            VALUES (?, ?, ?, ?)
+            """,
+            (source_id, key, value, utc_now().isoformat()),
+        )
+        self._commit()
+
+    @_locked
+    def get_cached_summary(self, cache_key: str) -> Summary | None:
+        # 本文ハッシュをキーにした要約キャッシュを引く。
+        row = self.conn.execute(
+            "SELECT headline, bullets_json, importance, topic FROM summary_cache WHERE cache_key = ?",
+            (cache_key,),
+        ).fetchone()
+        if row is None:
+            return None
+        return Summary(
+            headline=row["headline"],
+            bullets=json.loads(row["bullets_json"]),
+            importance=row["importance"],
+            topic=row["topic"],
+        )
+
+    @_locked
+    def put_cached_summary(
+        self, cache_key: str, prompt_version: str, provider: str, model: str, summary: Summary
+    ) -> None:
+        self.conn.execute(
+            """
+            INSERT OR REPLACE INTO summary_cache (
+                cache_key, prompt_version, provider, model, headline, bullets_json, importance, topic, created_at
+            ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+            """,
+            (
+                cache_key,
+                prompt_version,
+                provider,
+                model,
                 summary.headline,
-                bullets,
+                json.dumps(summary.bullets, ensure_ascii=False),
                 summary.importance,
                 summary.topic,
                 utc_now().isoformat(),
             ),
         )
-        self.conn.execute(
-            # 要約完了時刻を seen_updates 側にも記録する。
-            "UPDATE seen_updates SET summarized_at = ? WHERE fingerprint = ?",
-            (utc_now().isoformat(), fingerprint),
+        self._commit()
+
+    @_locked
+    def evict_summary_cache(self, prompt_version: str, provider: str, model: str, max_age_days: int) -> int:
+        # プロンプト版が古いもの、同一プロバイダの旧モデル分、保持期限切れを削除する。
+        cutoff = (utc_now() - timedelta(days=max_age_days)).isoformat()
+        cur = self.conn.execute(
+            """
+            DELETE FROM summary_cache
+            WHERE prompt_version != ?
+               OR (provider = ? AND model != ?)
+               OR created_at < ?
+            """,
+            (prompt_version, provider, model, cutoff),
         )
-        self.conn.commit()
+        self._commit()
+        return cur.rowcount
 
-    def mark_immediate_sent(self, fingerprint: str) -> None:
-        # Discord 送信済みフラグの更新。
-        self.conn.execute(
-            "UPDATE seen_updates SET sent_immediate_at = ? WHERE fingerprint = ?",
-            (utc_now().isoformat(), fingerprint),
+    @_locked
+    def add_run_metrics(self, started_at: datetime, values: dict[str, float], retention_days: int) -> None:
+        # 1回分の計測値を保存し、保持期限を過ぎた実行の行を消す。
+        run_started_at = started_at.isoformat()
+        self.conn.executemany(
+            "INSERT OR REPLACE INTO run_metrics (run_started_at, name, value) VALUES (?, ?, ?)",
+            [(run_started_at, name, float(value)) for name, value in values.items()],
         )
+        cutoff = (utc_now() - timedelta(days=max(1, retention_days))).isoformat()
+        self.conn.execute("DELETE FROM run_metrics WHERE run_started_at < ?", (cutoff,))
+        self._commit()
+
+    @_locked
+    def recent_run_metrics(self, limit: int = 10) -> list[tuple[str, dict[str, float]]]:
+        # 新しい実行から順に (開始時刻, 名前 -> 値) を返す。
+        runs = [
+            row[0]
+            for row in self.conn.execute(
+                "SELECT DISTINCT run_started_at FROM run_metrics ORDER BY run_started_at DESC LIMIT ?", (limit,)
+            )
+        ]
+        results: list[tuple[str, dict[str, float]]] = []
+        for run_started_at in runs:
+            rows = self.conn.execute(
+                "SELECT name, value FROM run_metrics WHERE run_started_at = ?", (run_started_at,)
+            ).fetchall()
+            results.append((run_started_at, {row["name"]: row["value"] for row in rows}))
+        return results
+
+    @_locked
+    def prune_bodies(self, retention_days: int) -> int:
+        # 保持期限を過ぎた更新の本文を空にする。fingerprint・タイトル・URL と SimHash 索引は残すため、
+        # 既読判定と近似重複判定の結果は変わらない。通知待ち（pending）のものは再送・再要約に必要なので残す。
+        # 要約は小さく、アウトボックスから JOIN で引かれるため消さない。
+        if retention_days <= 0:
+            return 0
+        cutoff = (utc_now() - timedelta(days=retention_days)).isoformat()
+        pending = "SELECT fingerprint FROM outbox WHERE status = 'pending'"
+        cur = self.conn.execute(
+            f"""
+            UPDATE seen_updates SET body = ''
+            WHERE first_seen_at < ? AND body != '' AND fingerprint NOT IN ({pending})
+            """,
+            (cutoff,),
+        )
+        pruned = cur.rowcount
+        self.conn.execute("DELETE FROM outbox WHERE status = 'dead' AND created_at < ?", (cutoff,))
+        self._commit()
+        if pruned and self._tx_depth == 0:
+            # auto_vacuum=INCREMENTAL の DB なら空いたページをその場で返却し、ファイルを増やさない。
+            self.conn.execute("PRAGMA incremental_vacuum").fetchall()
+        return pruned
+
+    def _database_bytes(self) -> int:
+        page_size = self.conn.execute("PRAGMA page_size").fetchone()[0]
+        return self.conn.execute("PRAGMA page_count").fetchone()[0] * page_size
+
+    @_locked
+    def compact(self) -> dict[str, int]:
+        # VACUUM で DB ファイルを詰め直し、ANALYZE でクエリプランナー用の統計を取り直す。
+        # 以後の prune_bodies で空いたページも都度返却されるよう、VACUUM の前に auto_vacuum を切り替える。
         self.conn.commit()
+        before = self._database_bytes()
+        self.conn.execute("PRAGMA auto_vacuum=INCREMENTAL")
+        self.conn.execute("VACUUM")
+        self.conn.execute("ANALYZE")
+        self.conn.commit()
+        # WAL に残った分も本体へ書き戻し、キャッシュへ保存するファイルを1つにそろえる。
+        self.conn.execute("PRAGMA wal_checkpoint(TRUNCATE)").fetchall()
+        stats = {"bytes_before": before, "bytes_after": self._database_bytes()}
+        for table in ("seen_updates", "summaries", "summary_cache", "simhash_index", "outbox", "run_metrics"):
+            stats[table] = self.conn.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0]
+        stats["stored_bodies"] = self.conn.execute("SELECT COUNT(*) FROM seen_updates WHERE body != ''").fetchone()[0]
+        return stats
 
+    @_locked
     def reset_all(self) -> None:
         # テストや再通知確認用に履歴を全削除する。
+        # 要約キャッシュは内容ハッシュで引くため残し、再収集時の LLM 呼び出しを省く。
+        self.conn.execute("DELETE FROM outbox")
         self.conn.execute("DELETE FROM summaries")
         self.conn.execute("DELETE FROM seen_updates")
-        self.conn.commit()
+        self.conn.execute("DELETE FROM simhash_index")
+        # 検証子やダイジェストが残ると再収集されないため合わせて消す。
+        self.conn.execute("DELETE FROM http_validators")
+        self.conn.execute("DELETE FROM source_state")
+        self.conn.execute("DELETE FROM seen_filter")
+        if self._seen_filter is not None:
+            self._seen_filter = BloomFilter(self._seen_filter.num_bits, self._seen_filter.num_hashes)
+        self._commit()
 
+    @_locked
     def close(self) -> None:
+        # Bloom フィルタを保存しておき、次回起動時の作り直しを省く。
+        self._save_seen_filter()
         self.conn.close()
@@ -1,17 +1,33 @@
 from __future__ import annotations
 
+import hashlib
 import json
+import random
+import threading
+import time
+from collections import OrderedDict
+from collections.abc import Callable
+from dataclasses import dataclass
 from urllib.parse import quote
 from typing import Any
 
-import httpx
-
+from . import metrics
 from .models import Summary, UpdateItem
+from .store import Store
 
 """要約処理を担当するモジュール。OpenAI/Gemini とフォールバックを切り替える。"""
 
 
 _FALLBACK_BULLET_TEMPLATE = "要点: (要約取得失敗)"
+# プロンプトや応答スキーマを変えたら上げる。要約キャッシュの無効化に使う。
+PROMPT_VERSION = "1"
+# プロンプトに含める本文の最大文字数。
+_BODY_LIMIT = 4000
+# API のベース URL の既定値。ProviderPolicy.base_url で上書きできる。
+_DEFAULT_BASE_URLS = {
+    "openai": "https://api.openai.com/v1",
+    "gemini": "https://generativelanguage.googleapis.com/v1beta",
+}
 
 
 def heuristic_importance(item: UpdateItem) -> str:
@@ -51,7 +67,7 @@ def _build_prompt(item: UpdateItem) -> str:
         f"title: {item.title}\n"
         f"url: {item.url}\n"
         f"published_at: {item.published_at.isoformat()}\n"
-        f"body: {item.body[:4000]}"
+        f"body: {item.body[:_BODY_LIMIT]}"
     )
 
 
@@ -77,51 +93,394 @@ def _summary_from_parsed(parsed: dict[str, Any], item: UpdateItem) -> Summary:
     )
 
 
-def summarize_with_openai(api_key: str, model: str, item: UpdateItem) -> Summary:
-    # OpenAI Responses API を使って JSON 要約を生成する。
-    prompt = {
-        "role": "user",
-        "content": _build_prompt(item),
-    }
+def _request_openai(api_key: str, model: str, prompt: str) -> str:
+    # OpenAI Responses API を呼び、JSON 文字列部分を返す。
     body: dict[str, Any] = {
         "model": model,
-        "input": [prompt],
+        "input": [{"role": "user", "content": prompt}],
         "text": {"format": {"type": "json_object"}},
     }
-    with httpx.Client(timeout=30) as client:
-        res = client.post(
-            "https://api.openai.com/v1/responses",
-            headers={"Authorization": f"Bearer {api_key}", "Content-Type": "application/json"},
-            json=body,
-        )
-        res.raise_for_status()
-        data = res.json()
-    # 想定パスから JSON 文字列を取り出し、Summary へ変換する。
-    text = data.get("output", [{}])[0].get("content", [{}])[0].get("text", "{}")
-    return _summary_from_parsed(json.loads(text), item)
+    from .http_clients import get_client
 
+    res = get_client("llm").post(
+        f"{_base_url('openai')}/responses",
+        headers={"Authorization": f"Bearer {api_key}", "Content-Type": "application/json"},
+        json=body,
+    )
+    res.raise_for_status()
+    data = res.json()
+    usage = data.get("usage") or {}
+    metrics.incr("llm_input_tokens", usage.get("input_tokens", 0))
+    metrics.incr("llm_output_tokens", usage.get("output_tokens", 0))
+    # 想定パスから JSON 文字列を取り出す。
+    return data.get("output", [{}])[0].get("content", [{}])[0].get("text", "{}")
 
-def summarize_with_gemini(api_key: str, model: str, item: UpdateItem) -> Summary:
-    # Gemini API でも同じスキーマで JSON 要約を取得する。
+
+def _request_gemini(api_key: str, model: str, prompt: str) -> str:
+    # Gemini generateContent を呼び、JSON 文字列部分を返す。
     body: dict[str, Any] = {
-        "contents": [{"parts": [{"text": _build_prompt(item)}]}],
+        "contents": [{"parts": [{"text": prompt}]}],
         "generationConfig": {"responseMimeType": "application/json"},
     }
     encoded_model = quote(model, safe="")
-    url = f"https://generativelanguage.googleapis.com/v1beta/models/{encoded_model}:generateContent?key={api_key}"
-    with httpx.Client(timeout=30) as client:
-        res = client.post(url, json=body)
-        res.raise_for_status()
-        data = res.json()
-    text = (
+    url = f"{_base_url('gemini')}/models/{encoded_model}:generateContent?key={api_key}"
+    from .http_clients import get_client
+
+    res = get_client("llm").post(url, json=body)
+    res.raise_for_status()
+    data = res.json()
+    usage = data.get("usageMetadata") or {}
+    metrics.incr("llm_input_tokens", usage.get("promptTokenCount", 0))
+    metrics.incr("llm_output_tokens", usage.get("candidatesTokenCount", 0))
+    return (
         data.get("candidates", [{}])[0]
         .get("content", {})
         .get("parts", [{}])[0]
         .get("text", "{}")
     )
+
+
+# 要約プロバイダ名 -> API 呼び出し関数。httpx と共有クライアントは最初の API 呼び出しで読み込む。
+_PROVIDERS: dict[str, Callable[[str, str, str], str]] = {
+    "openai": _request_openai,
+    "gemini": _request_gemini,
+}
+
+
+def _estimate_tokens(text: str) -> int:
+    # 日英混在テキストの概算トークン数（おおよそ3文字で1トークン）。
+    return max(1, len(text) // 3)
+
+
+# 1件分の応答として見込む出力トークン数。TPM の見積もりではプロンプトに加算する。
+_RESPONSE_TOKENS = 256
+# 待てば成功しうる失敗（レート制限・一時的なサーバーエラー）。
+_RETRY_STATUSES = {429, 500, 502, 503, 504}
+# テストで差し替えられるよう、時計と待機はモジュール変数経由で使う。
+_clock: Callable[[], float] = time.monotonic
+_sleep: Callable[[float], None] = time.sleep
+
+
+class SummaryUnavailable(Exception):
+    # 締め切りまでに要約を得られない。呼び出し側はフォールバック要約にする。
+    pass
+
+
+@dataclass(frozen=True, slots=True)
+class ProviderPolicy:
+    # プロバイダごとの流量上限（0 なら無制限）と再試行方針。deadline は待機込みの秒数。
+    rpm: int = 0
+    tpm: int = 0
+    max_retries: int = 4
+    deadline: float = 60.0
+    base_delay: float = 1.0
+    max_delay: float = 30.0
+    # API のベース URL（互換プロキシやローカルのスタブ向け）。None なら公式エンドポイント。
+    base_url: str | None = None
+
+
+class ProviderLimiter:
+    # 毎分リクエスト数・毎分トークン数のトークンバケット。要約スレッド間で共有するためロックで守る。
+    def __init__(self, rpm: int, tpm: int, clock: Callable[[], float], sleep: Callable[[float], None]) -> None:
+        self.rpm = max(0, rpm)
+        self.tpm = max(0, tpm)
+        self._clock = clock
+        self._sleep = sleep
+        self._lock = threading.Lock()
+        self._requests = float(self.rpm)
+        self._tokens = float(self.tpm)
+        self._updated = clock()
+        self._paused_until = 0.0
+
+    def _refill(self, now: float) -> None:
+        elapsed = max(0.0, now - self._updated)
+        self._updated = now
+        if self.rpm:
+            self._requests = min(float(self.rpm), self._requests + elapsed * self.rpm / 60)
+        if self.tpm:
+            self._tokens = min(float(self.tpm), self._tokens + elapsed * self.tpm / 60)
+
+    def _wait_time(self, now: float, tokens: int) -> float:
+        wait = max(0.0, self._paused_until - now)
+        if self.rpm and self._requests < 1:
+            wait = max(wait, (1 - self._requests) * 60 / self.rpm)
+        if self.tpm and self._tokens < tokens:
+            wait = max(wait, (tokens - self._tokens) * 60 / self.tpm)
+        return wait
+
+    def acquire(self, tokens: int, deadline: float) -> bool:
+        # 枠が空くまで待ってから1リクエスト分を確保する。deadline までに空かないなら待たずに False。
+        # TPM より大きい見積もりは満杯になるまで待てば送れるよう上限で切る。
+        tokens = min(tokens, self.tpm) if self.tpm else 0
+        while True:
+            with self._lock:
+                now = self._clock()
+                self._refill(now)
+                wait = self._wait_time(now, tokens)
+                if wait <= 0:
+                    if self.rpm:
+                        self._requests -= 1
+                    self._tokens -= tokens
+                    return True
+                if now + wait > deadline:
+                    return False
+            self._sleep(wait)
+
+    def pause(self, seconds: float) -> None:
+        # 429 を受けたら、他のスレッドも含めて指定秒数は送らない。
+        with self._lock:
+            self._paused_until = max(self._paused_until, self._clock() + seconds)
+
+
+# Gemini の既定値は無料枠（gemini-2.5-flash-lite）の上限に合わせる。
+_policies: dict[str, ProviderPolicy] = {
+    "openai": ProviderPolicy(),
+    "gemini": ProviderPolicy(rpm=15, tpm=250000),
+}
+_limiters: dict[str, ProviderLimiter] = {}
+_limiters_lock = threading.Lock()
+
+
+def configure_providers(policies: dict[str, ProviderPolicy]) -> None:
+    # プロバイダごとの流量上限と再試行方針を差し替える。方針が変わったプロバイダだけリミッターを作り直し、
+    # 常駐プロセスで実行をまたいでも消費済みの枠を引き継ぐ。
+    with _limiters_lock:
+        for provider, policy in policies.items():
+            if _policies.get(provider) != policy:
+                _policies[provider] = policy
+                _limiters.pop(provider, None)
+
+
+def _base_url(provider: str) -> str:
+    policy = _policies.get(provider)
+    return ((policy.base_url if policy else None) or _DEFAULT_BASE_URLS[provider]).rstrip("/")
+
+
+def _limiter(provider: str) -> ProviderLimiter:
+    with _limiters_lock:
+        limiter = _limiters.get(provider)
+        if limiter is None:
+            policy = _policies[provider]
+            limiter = ProviderLimiter(policy.rpm, policy.tpm, _clock, _sleep)
+            _limiters[provider] = limiter
+        return limiter
+
+
+def _status_error(exc: Exception) -> Any | None:
+    # httpx.HTTPStatusError なら応答を返す。
+    import httpx
+
+    return exc.response if isinstance(exc, httpx.HTTPStatusError) else None
+
+
+def _is_retryable(exc: Exception) -> bool:
+    import httpx
+
+    response = _status_error(exc)
+    if response is not None:
+        return response.status_code in _RETRY_STATUSES
+    # タイムアウトや接続断も待てば通ることが多い。
+    return isinstance(exc, httpx.TransportError)
+
+
+def _retry_delay(exc: Exception, attempt: int, policy: ProviderPolicy) -> float:
+    # Retry-After（秒）があればそれに少しだけ揺らぎを足し、なければ上限付き指数バックオフの full jitter。
+    response = _status_error(exc)
+    if response is not None:
+        try:
+            retry_after = float(response.headers.get("Retry-After", ""))
+        except ValueError:
+            retry_after = None
+        if retry_after is not None:
+            return max(0.0, retry_after) + random.uniform(0, policy.base_delay)
+    return random.uniform(0, min(policy.max_delay, policy.base_delay * (2**attempt)))
+
+
+def _limited_request(provider: str, api_key: str, model: str, prompt: str, items: int = 1) -> str:
+    # 流量上限を守って要約 API を呼ぶ。待てば成功しうる失敗は締め切りの範囲で再試行し、
+    # 締め切りに間に合わないと分かった時点で SummaryUnavailable を送出する。
+    policy = _policies[provider]
+    limiter = _limiter(provider)
+    deadline = _clock() + policy.deadline
+    tokens = _estimate_tokens(prompt) + _RESPONSE_TOKENS * items
+    attempt = 0
+    while True:
+        if not limiter.acquire(tokens, deadline):
+            raise SummaryUnavailable(f"{provider} rate limit would exceed the {policy.deadline:.0f}s deadline")
+        metrics.incr("llm_requests")
+        metrics.incr("llm_estimated_tokens", tokens)
+        started = time.perf_counter()
+        try:
+            text = _PROVIDERS[provider](api_key, model, prompt)
+        except Exception as exc:
+            metrics.observe("llm_request", time.perf_counter() - started)
+            if not _is_retryable(exc) or attempt >= policy.max_retries:
+                raise
+            metrics.incr("llm_retries")
+            delay = _retry_delay(exc, attempt, policy)
+            if _clock() + delay > deadline:
+                raise SummaryUnavailable(f"{provider} retry would exceed the {policy.deadline:.0f}s deadline: {exc}") from exc
+            response = _status_error(exc)
+            if response is not None and response.status_code == 429:
+                # レート制限は全スレッド共通なので、リミッター側で待たせる。
+                limiter.pause(delay)
+            else:
+                _sleep(delay)
+            attempt += 1
+            continue
+        metrics.observe("llm_request", time.perf_counter() - started)
+        return text
+
+
+def summarize_with_openai(api_key: str, model: str, item: UpdateItem) -> Summary:
+    # OpenAI Responses API を使って JSON 要約を生成する。
+    text = _limited_request("openai", api_key, model, _build_prompt(item))
+    return _summary_from_parsed(json.loads(text), item)
+
+
+def summarize_with_gemini(api_key: str, model: str, item: UpdateItem) -> Summary:
+    # Gemini API でも同じスキーマで JSON 要約を取得する。
+    text = _limited_request("gemini", api_key, model, _build_prompt(item))
     return _summary_from_parsed(json.loads(text), item)
 
 
+def _batch_entry(batch_id: str, item: UpdateItem) -> str:
+    return (
+        f"### id: {batch_id}\n"
+        f"title: {item.title}\n"
+        f"url: {item.url}\n"
+        f"published_at: {item.published_at.isoformat()}\n"
+        f"body: {item.body[:_BODY_LIMIT]}\n"
+    )
+
+
+def _build_batch_prompt(items: list[UpdateItem]) -> str:
+    # 指示文は1回だけ書き、各アイテムには id を振って応答と対応付ける。
+    entries = "".join(_batch_entry(str(i), item) for i, item in enumerate(items))
+    return (
+        "次の複数の更新情報を、それぞれ日本語で要約してください。"
+        "厳密にJSONで返してください。"
+        "スキーマ: {summaries: [{id: string, headline: string, bullets: [string,string,string], "
+        "importance: high|medium|low, topic: string}]}。"
+        "id は入力の id をそのまま使い、全件を含めてください。\n"
+        f"{entries}"
+    )
+
+
+def plan_batches(items: list[UpdateItem], max_items: int, token_budget: int) -> list[list[UpdateItem]]:
+    # 件数上限とトークン予算の両方を超えないように、入力順のままバッチへ分割する。
+    batches: list[list[UpdateItem]] = []
+    current: list[UpdateItem] = []
+    used = _estimate_tokens(_build_batch_prompt([]))
+    for item in items:
+        cost = _estimate_tokens(_batch_entry(str(len(current)), item))
+        if current and (len(current) >= max_items or used + cost > token_budget):
+            batches.append(current)
+            current = []
+            used = _estimate_tokens(_build_batch_prompt([]))
+        current.append(item)
+        used += cost
+    if current:
+        batches.append(current)
+    return batches
+
+
+def _summaries_from_batch(text: str, items: list[UpdateItem]) -> list[Summary | None]:
+    # バッチ応答を id で各アイテムへ対応付ける。壊れた要素や欠けた id は None のまま返す。
+    results: list[Summary | None] = [None] * len(items)
+    try:
+        parsed = json.loads(text)
+    except ValueError:
+        return results
+    entries = parsed.get("summaries", []) if isinstance(parsed, dict) else parsed
+    if not isinstance(entries, list):
+        return results
+    for entry in entries:
+        if not isinstance(entry, dict):
+            continue
+        try:
+            idx = int(str(entry.get("id", "")).strip())
+        except ValueError:
+            continue
+        if 0 <= idx < len(items) and results[idx] is None:
+            try:
+                results[idx] = _summary_from_parsed(entry, items[idx])
+            except Exception:
+                continue
+    return results
+
+
+def _request_batch(provider: str, api_key: str, model: str, items: list[UpdateItem]) -> list[Summary | None]:
+    prompt = _build_batch_prompt(items)
+    return _summaries_from_batch(_limited_request(provider, api_key, model, prompt, len(items)), items)
+
+
+class SummaryCache:
+    # 要約の内容アドレス型キャッシュ。メモリ上の LRU を先に引き、外れたら SQLite を引く。
+    # 要約ワーカーのスレッドから呼ばれるため、LRU はロックで保護する。
+    def __init__(self, store: Store | None, max_entries: int = 512) -> None:
+        self.store = store
+        self.max_entries = max(1, max_entries)
+        self.hits = 0
+        self.misses = 0
+        self._lru: OrderedDict[str, Summary] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Summary | None:
+        with self._lock:
+            summary = self._lru.get(key)
+            if summary is not None:
+                self._lru.move_to_end(key)
+                self.hits += 1
+                return summary
+        summary = self.store.get_cached_summary(key) if self.store else None
+        with self._lock:
+            if summary is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self._remember(key, summary)
+        return summary
+
+    def put(self, key: str, provider: str, model: str, summary: Summary) -> None:
+        with self._lock:
+            self._remember(key, summary)
+        if self.store:
+            self.store.put_cached_summary(key, PROMPT_VERSION, provider, model, summary)
+
+    def evict_stale(self, provider: str, model: str, max_age_days: int) -> int:
+        # プロンプト版・モデルが変わった要約や期限切れの要約を SQLite から削除する。
+        if not self.store:
+            return 0
+        return self.store.evict_summary_cache(PROMPT_VERSION, provider, model, max_age_days)
+
+    def _remember(self, key: str, summary: Summary) -> None:
+        self._lru[key] = summary
+        self._lru.move_to_end(key)
+        while len(self._lru) > self.max_entries:
+            self._lru.popitem(last=False)
+
+
+def summary_cache_key(item: UpdateItem, provider: str, model: str) -> str:
+    # 正規化済み本文・プロンプト版・プロバイダ・モデルのハッシュ。URL やタイトルの差は無視する。
+    body = " ".join(item.body.split()).lower()
+    base = f"{PROMPT_VERSION}|{provider}|{model}|{body}"
+    return hashlib.sha256(base.encode("utf-8")).hexdigest()
+
+
+def resolve_provider(
+    provider: str,
+    openai_api_key: str | None,
+    openai_model: str,
+    gemini_api_key: str | None,
+    gemini_model: str,
+) -> tuple[str, str | None, str]:
+    # gemini 以外の指定は従来どおり openai として扱う。
+    if provider.lower() == "gemini":
+        return "gemini", gemini_api_key, gemini_model
+    return "openai", openai_api_key, openai_model
+
+
 def summarize(
     item: UpdateItem,
     provider: str,
@@ -129,23 +488,94 @@ def summarize(
     openai_model: str,
     gemini_api_key: str | None,
     gemini_model: str,
+    cache: SummaryCache | None = None,
 ) -> Summary:
     # 設定に応じて要約プロバイダを選択する。
-    selected = provider.lower()
+    selected, api_key, model = resolve_provider(
+        provider, openai_api_key, openai_model, gemini_api_key, gemini_model
+    )
+    if not api_key:
+        # APIキー未設定なら必ずフォールバックにする。
+        return _fallback_summary(item)
 
-    if selected == "gemini":
-        if not gemini_api_key:
-            # APIキー未設定なら必ずフォールバックにする。
-            return _fallback_summary(item)
-        try:
-            return summarize_with_gemini(gemini_api_key, gemini_model, item)
-        except Exception:
-            # 外部API失敗時もパイプラインを止めない。
-            return _fallback_summary(item)
+    key = summary_cache_key(item, selected, model)
+    if cache and (cached := cache.get(key)):
+        # 同じ本文を要約済みなら API を呼ばない。
+        return cached
+    return _summarize_uncached(item, selected, api_key, model, key, cache)
 
-    if not openai_api_key:
-        return _fallback_summary(item)
+
+def _summarize_uncached(
+    item: UpdateItem, selected: str, api_key: str, model: str, key: str, cache: SummaryCache | None
+) -> Summary:
+    # キャッシュを引き終えたアイテムを単発プロンプトで要約し、成功したらキャッシュへ入れる。
     try:
-        return summarize_with_openai(openai_api_key, openai_model, item)
-    except Exception:
+        if selected == "gemini":
+            summary = summarize_with_gemini(api_key, model, item)
+        else:
+            summary = summarize_with_openai(api_key, model, item)
+    except Exception as exc:
+        # 外部API失敗時もパイプラインを止めない（フォールバックはキャッシュしない）。
+        print(f"[warn] summary fell back: {item.source_id}: {exc}")
+        metrics.incr("llm_fallbacks")
         return _fallback_summary(item)
+    if cache:
+        cache.put(key, selected, model, summary)
+    return summary
+
+
+def summarize_batch(
+    items: list[UpdateItem],
+    provider: str,
+    openai_api_key: str | None,
+    openai_model: str,
+    gemini_api_key: str | None,
+    gemini_model: str,
+    max_items: int = 5,
+    token_budget: int = 6000,
+    cache: SummaryCache | None = None,
+) -> list[Summary]:
+    # 複数アイテムを1リクエストにまとめて要約する。戻り値は items と同じ順序。
+    # 応答の一部だけ壊れていた場合は、そのアイテムだけフォールバックにする。
+    selected, api_key, model = resolve_provider(
+        provider, openai_api_key, openai_model, gemini_api_key, gemini_model
+    )
+    if not api_key:
+        return [_fallback_summary(item) for item in items]
+
+    # キャッシュに当たったものを先に埋め、残りだけを API へ送る。
+    results: dict[int, Summary] = {}
+    keys = [summary_cache_key(item, selected, model) for item in items]
+    pending: list[int] = []
+    for i, key in enumerate(keys):
+        cached = cache.get(key) if cache else None
+        if cached:
+            results[i] = cached
+        else:
+            pending.append(i)
+
+    # plan_batches は入力順のまま連続区間に分けるので、先頭から順に元の位置へ戻せる。
+    offset = 0
+    for batch in plan_batches([items[i] for i in pending], max(1, max_items), token_budget):
+        indexes = pending[offset : offset + len(batch)]
+        offset += len(batch)
+        if len(batch) == 1:
+            # 1件だけなら従来の単発プロンプトを使う。キャッシュは上で引いたので、集計が重ならないよう引き直さない。
+            i = indexes[0]
+            results[i] = _summarize_uncached(batch[0], selected, api_key, model, keys[i], cache)
+            continue
+        try:
+            parsed = _request_batch(selected, api_key, model, batch)
+        except Exception as exc:
+            # 外部API失敗時もパイプラインを止めない。
+            print(f"[warn] summary batch fell back ({len(batch)} items): {exc}")
+            parsed = [None] * len(batch)
+        for i, item, summary in zip(indexes, batch, parsed):
+            if summary is None:
+                metrics.incr("llm_fallbacks")
+                results[i] = _fallback_summary(item)
+                continue
+            results[i] = summary
+            if cache:
+                cache.put(keys[i], selected, model, summary)
+    return [results[i] for i in range(len(items))]
@@ -0,0 +1,19 @@
+from ai_updates.bloom import BloomFilter, optimal_size
+
+
+def test_bloom_filter_has_no_false_negatives_and_stays_near_target_rate():
+    # 追加したキーは必ず含まれると判定され、未追加キーの偽陽性率が設定値の近くに収まることを確認。
+    bloom = BloomFilter.for_capacity(5000, 0.01)
+    keys = [f"fp-{i}" for i in range(5000)]
+    bloom.update(keys)
+    assert all(key in bloom for key in keys)
+    false_positives = sum(f"other-{i}" in bloom for i in range(20000))
+    assert false_positives / 20000 < 0.02
+    assert 0.005 < bloom.false_positive_rate() < 0.015
+
+
+def test_optimal_size_matches_standard_formula():
+    # 1% なら1件あたり約9.6ビット・ハッシュ7個になることを確認。
+    num_bits, num_hashes = optimal_size(1000, 0.01)
+    assert 9500 <= num_bits <= 9600
+    assert num_hashes == 7
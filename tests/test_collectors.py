@@ -0,0 +1,236 @@
+import asyncio
+
+import httpx
+
+from ai_updates.collectors import HtmlOptions, collect_all
+from ai_updates.collectors.html_collector import page_digest
+from ai_updates.metrics import RunMetrics, activate
+from ai_updates.normalize import section_id
+from ai_updates.sources import ExtractionPlan, Source
+from ai_updates.store import Store
+
+_PAGE = "<html><head><title>Notes</title></head><body><main><h2>New model</h2><p>Details</p></main></body></html>"
+
+
+def _source(sid: str, url: str, incremental: bool = False) -> Source:
+    return Source(id=sid, service="openai", label=sid, kind="html", url=url, incremental=incremental)
+
+
+def test_collect_all_keeps_order_and_isolates_failures():
+    # 1ソースの失敗が他ソースの結果に影響しないことを確認。
+    def handler(request: httpx.Request) -> httpx.Response:
+        if request.url.host == "broken.example":
+            return httpx.Response(500)
+        return httpx.Response(200, text=_PAGE)
+
+    sources = [_source("a", "https://a.example/notes"), _source("b", "https://broken.example/"), _source("c", "https://c.example/")]
+
+    async def run():
+        async with httpx.AsyncClient(transport=httpx.MockTransport(handler)) as client:
+            return await collect_all(sources, "test-agent", client=client)
+
+    results = asyncio.run(run())
+    assert [s.id for s, _ in results] == ["a", "b", "c"]
+    assert isinstance(results[1][1], Exception)
+    assert results[0][1].items[0].title == "New model | Notes"
+    assert len(results[2][1].items) == 1
+
+
+def test_collect_all_respects_per_host_limit():
+    # 同一ホストへの同時リクエスト数が上限を超えないことを確認。
+    active = {"now": 0, "peak": 0}
+
+    async def handler(request: httpx.Request) -> httpx.Response:
+        active["now"] += 1
+        active["peak"] = max(active["peak"], active["now"])
+        await asyncio.sleep(0.01)
+        active["now"] -= 1
+        return httpx.Response(200, text=_PAGE)
+
+    sources = [_source(f"s{i}", f"https://same.example/{i}") for i in range(6)]
+
+    async def run():
+        async with httpx.AsyncClient(transport=httpx.MockTransport(handler)) as client:
+            return await collect_all(sources, "test-agent", max_concurrency=8, per_host_limit=2, client=client)
+
+    results = asyncio.run(run())
+    assert all(not isinstance(r, Exception) for _, r in results)
+    assert active["peak"] == 2
+
+
+def test_collect_all_does_not_hold_global_slot_while_waiting_for_host():
+    # 同一ホストの枠待ちのソースが全体の枠を塞がず、他ホストのソースが先に進めることを確認。
+    events = []
+
+    async def handler(request: httpx.Request) -> httpx.Response:
+        events.append(("start", request.url.host))
+        await asyncio.sleep(0.05 if request.url.host == "slow.example" else 0.01)
+        events.append(("end", request.url.host))
+        return httpx.Response(200, text=_PAGE)
+
+    sources = [_source(f"s{i}", f"https://slow.example/{i}") for i in range(3)]
+    sources += [_source("a", "https://a.example/"), _source("b", "https://b.example/")]
+
+    async def run():
+        async with httpx.AsyncClient(transport=httpx.MockTransport(handler)) as client:
+            return await collect_all(sources, "test-agent", max_concurrency=2, per_host_limit=1, client=client)
+
+    asyncio.run(run())
+    first_slow_end = events.index(("end", "slow.example"))
+    assert ("start", "a.example") in events[:first_slow_end]
+    assert ("start", "b.example") in events[:first_slow_end]
+
+
+def test_collect_all_sends_validators_and_skips_parse_on_304(tmp_path):
+    # 保存済み ETag を送り、304 なら解析せず not_modified を返すことを確認。
+    store = Store(tmp_path / "t.db")
+    store.save_validators("https://a.example/notes", '"v1"', "Mon, 02 Feb 2026 00:00:00 GMT")
+    seen_headers = {}
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        seen_headers.update(request.headers)
+        return httpx.Response(304)
+
+    async def run():
+        async with httpx.AsyncClient(transport=httpx.MockTransport(handler)) as client:
+            return await collect_all([_source("a", "https://a.example/notes")], "ua", client=client, store=store)
+
+    [(_, result)] = asyncio.run(run())
+    store.close()
+    assert seen_headers["if-none-match"] == '"v1"'
+    assert seen_headers["if-modified-since"] == "Mon, 02 Feb 2026 00:00:00 GMT"
+    assert result.not_modified
+    assert result.items == []
+
+
+def test_collect_all_skips_parse_when_page_digest_matches(tmp_path):
+    # 検証子が無くても、前回と同じダイジェストなら解析を省略することを確認。
+    store = Store(tmp_path / "t.db")
+    store.set_source_state("a", "page_digest", page_digest(_PAGE))
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        return httpx.Response(200, text=_PAGE)
+
+    async def run():
+        async with httpx.AsyncClient(transport=httpx.MockTransport(handler)) as client:
+            return await collect_all([_source("a", "https://a.example/notes")], "ua", client=client, store=store)
+
+    [(_, result)] = asyncio.run(run())
+    store.close()
+    assert result.not_modified
+    assert result.items == []
+
+
+def test_collect_all_stops_at_watermark_and_advances_it(tmp_path):
+    # 前回の最新セクションに達したら打ち切り、新しい最新セクションを watermark として返すことを確認。
+    page = "<main><h2>Newest</h2><p>Three</p><h2>Middle</h2><p>Two</p><h2>Oldest</h2><p>One</p></main>"
+    store = Store(tmp_path / "t.db")
+    store.set_source_state("a", "watermark", section_id("Middle", "Two", None))
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        return httpx.Response(200, text=page)
+
+    async def run():
+        async with httpx.AsyncClient(transport=httpx.MockTransport(handler)) as client:
+            source = _source("a", "https://a.example/notes", incremental=True)
+            return await collect_all([source], "ua", client=client, store=store)
+
+    [(_, result)] = asyncio.run(run())
+    store.close()
+    assert [item.title for item in result.items] == ["Newest | a"]
+    assert result.state["watermark"] == section_id("Newest", "Three", None)
+
+
+def test_collect_all_ignores_watermark_unless_source_is_incremental(tmp_path):
+    # 既定では watermark を使わず、先頭が固定の案内のページでも下の新着を取りこぼさないことを確認。
+    page = "<main><h2>About</h2><p>Static intro</p><h2>New</h2><p>Two</p><h2>Old</h2><p>One</p></main>"
+    store = Store(tmp_path / "t.db")
+    store.set_source_state("a", "watermark", section_id("About", "Static intro", None))
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        return httpx.Response(200, text=page)
+
+    async def run():
+        async with httpx.AsyncClient(transport=httpx.MockTransport(handler)) as client:
+            return await collect_all([_source("a", "https://a.example/notes")], "ua", client=client, store=store)
+
+    [(_, result)] = asyncio.run(run())
+    store.close()
+    assert [item.title for item in result.items] == ["About | a", "New | a", "Old | a"]
+    assert "watermark" not in result.state
+
+
+def test_streaming_collect_stops_after_max_sections_and_caps_bytes(tmp_path):
+    # 逐次受信では必要なセクション数がそろった時点で受信をやめ、上限バイト数を超えて読まないことを確認。
+    sent = {"chunks": 0}
+    head = "<html><head><title>Notes</title></head><body><main>"
+    sections = "".join(f"<h2>Release {i}</h2><p>Details {i}</p>" for i in range(100))
+
+    async def body(tail: str):
+        for chunk in (head, sections[:200], sections[200:], tail):
+            sent["chunks"] += 1
+            yield chunk.encode("utf-8")
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        tail = "<script>" + "x" * 100_000 + "</script></main></body></html>"
+        return httpx.Response(200, content=body(tail))
+
+    source = Source(
+        id="a",
+        service="openai",
+        label="a",
+        kind="html",
+        url="https://a.example/notes",
+        incremental=True,
+        plan=ExtractionPlan(max_sections=3),
+    )
+
+    async def run(source: Source, options: HtmlOptions):
+        async with httpx.AsyncClient(transport=httpx.MockTransport(handler)) as client:
+            return await collect_all([source], "ua", client=client, html_options=options)
+
+    run_metrics = RunMetrics()
+    with activate(run_metrics):
+        [(_, result)] = asyncio.run(run(source, HtmlOptions(stream=True, max_bytes=1_000_000)))
+    assert [item.title for item in result.items] == ["Release 0 | Notes", "Release 1 | Notes", "Release 2 | Notes"]
+    assert result.state["watermark"] == result.items[0].section_id
+    assert sent["chunks"] == 2
+    assert run_metrics.count("parse_early_stops") == 1
+
+    # 上限で切れたページは、区切りが確定したセクションだけを返す。
+    capped = Source(id="b", service="openai", label="b", kind="html", url="https://a.example/notes")
+    [(_, result)] = asyncio.run(run(capped, HtmlOptions(stream=True, max_bytes=len(head) + 100)))
+    assert [item.title for item in result.items] == ["Release 0 | Notes", "Release 1 | Notes"]
+
+
+def test_buffered_collect_drops_cut_section_and_digest_when_truncated(tmp_path):
+    # 逐次解析できないプランでも、上限で切れたページは最後のセクションを捨て、ページダイジェストを保存しないことを確認。
+    page = (
+        "<html><body><main><div class='notes'>"
+        + "".join(f"<h2>Release {i}</h2><p>Details {i} {'x' * 50}</p>" for i in range(3))
+        + "</div></main></body></html>"
+    )
+    cut = page.index("Details 2") + 20
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        return httpx.Response(200, text=page)
+
+    source = Source(
+        id="a",
+        service="openai",
+        label="a",
+        kind="html",
+        url="https://a.example/notes",
+        plan=ExtractionPlan(container="main div.notes"),
+    )
+    store = Store(tmp_path / "t.db")
+
+    async def run():
+        async with httpx.AsyncClient(transport=httpx.MockTransport(handler)) as client:
+            options = HtmlOptions(stream=True, max_bytes=cut)
+            return await collect_all([source], "ua", client=client, store=store, html_options=options)
+
+    [(_, result)] = asyncio.run(run())
+    store.close()
+    assert [item.title for item in result.items] == ["Release 0 | a", "Release 1 | a"]
+    assert "page_digest" not in result.state
@@ -0,0 +1,47 @@
+import asyncio
+
+import httpx
+
+from ai_updates import pipeline
+from ai_updates.daemon import Scheduler, next_interval, run_daemon
+from ai_updates.sources import Source
+from ai_updates.store import Store
+from test_pipeline import _config
+
+
+def test_next_interval_speeds_up_after_change_and_backs_off_when_quiet():
+    # 更新があれば間隔を半分に、なければ1.5倍にし、上下限に収めることを確認。
+    assert next_interval(1800, True, 300, 21600) == 900
+    assert next_interval(1800, False, 300, 21600) == 2700
+    assert next_interval(400, True, 300, 21600) == 300
+    assert next_interval(20000, False, 300, 21600) == 21600
+
+
+def test_daemon_polls_due_sources_adapts_and_persists_intervals(tmp_path, monkeypatch):
+    # 起動直後に全ソースを巡回し、更新の有無で間隔を調整して保存、停止要求で抜けることを確認。
+    monkeypatch.setattr(pipeline, "send_batch", lambda webhook, pairs: None)
+    cfg = _config(tmp_path)
+    store = Store(cfg.db_path)
+    store.set_source_state("quiet", "poll_interval", "1000")
+    sources = [
+        Source(id="busy", service="openai", label="B", kind="html", url="https://busy.example/"),
+        Source(id="quiet", service="openai", label="Q", kind="html", url="https://quiet.example/"),
+    ]
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        if request.url.host == "quiet.example":
+            return httpx.Response(200, text="<main></main>")
+        return httpx.Response(200, text="<main><h2>New</h2><p>Something changed</p></main>")
+
+    async def run():
+        stop = asyncio.Event()
+        asyncio.get_running_loop().call_later(0.3, stop.set)
+        async with httpx.AsyncClient(transport=httpx.MockTransport(handler)) as client:
+            await run_daemon(cfg, store, sources, stop, client=client)
+
+    asyncio.run(run())
+    assert store.get_source_state("busy", "poll_interval") == "900"
+    assert store.get_source_state("quiet", "poll_interval") == "1500"
+    # 再起動時は保存済みの間隔から再開する。
+    assert Scheduler(cfg, store, sources, now=0).interval("quiet") == 1500
+    store.close()
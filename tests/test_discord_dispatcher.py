@@ -1,6 +1,11 @@
+import json
 from datetime import datetime, timezone
 
-from ai_updates.dispatchers.discord import _format_item
+import httpx
+import pytest
+
+from ai_updates import http_clients
+from ai_updates.dispatchers.discord import RateLimiter, _format_item, pack_messages, post_payload, send_batch
 from ai_updates.models import Summary, UpdateItem
 
 
@@ -27,3 +32,71 @@ def test_format_item_includes_datetime_in_title_and_fixed_layout():
     assert "\n• A\n• B\n• C\n" in text
     assert "• D" not in text
     assert text.endswith("原文: https://developers.openai.com/codex/changelog#new-features-11")
+
+
+def _pairs(n: int) -> list[tuple[UpdateItem, Summary]]:
+    published = datetime(2026, 2, 7, tzinfo=timezone.utc)
+    return [
+        (
+            UpdateItem(
+                source_id="s",
+                service="openai",
+                title=f"T{i}",
+                url=f"https://example.com/#{i}",
+                published_at=published,
+                body="b",
+                fingerprint=f"fp{i}",
+            ),
+            Summary(headline=f"H{i}", bullets=["A"], importance="low", topic="t"),
+        )
+        for i in range(n)
+    ]
+
+
+@pytest.fixture
+def discord_requests():
+    requests: list[httpx.Request] = []
+    responses: list[httpx.Response] = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        requests.append(request)
+        return responses.pop(0) if responses else httpx.Response(204)
+
+    http_clients.configure(transport=httpx.MockTransport(handler))
+    yield requests, responses
+    http_clients.configure()
+
+
+def test_burst_of_fifteen_items_is_sent_as_two_embed_messages(discord_requests):
+    # 15件の新着が埋め込み10件 + 5件の2リクエストで送られることを確認。
+    requests, _ = discord_requests
+    for message in pack_messages(_pairs(15)):
+        send_batch("https://discord.example/hook", message)
+    embeds = [json.loads(request.read())["embeds"] for request in requests]
+    assert [len(e) for e in embeds] == [10, 5]
+    assert embeds[0][0]["title"].startswith("H0（") and embeds[0][0]["url"] == "https://example.com/#0"
+
+
+def test_rate_limit_headers_and_retry_after_are_honored(discord_requests):
+    # 残り0のバケットはリセットまで待ち、429 は retry_after だけ待って再送することを確認。
+    requests, responses = discord_requests
+    now = {"t": 0.0}
+    waits: list[float] = []
+
+    def sleep(seconds: float) -> None:
+        waits.append(round(seconds, 3))
+        now["t"] += seconds
+
+    limiter = RateLimiter(sleep=sleep, clock=lambda: now["t"])
+    exhausted = {"X-RateLimit-Bucket": "b1", "X-RateLimit-Remaining": "0", "X-RateLimit-Reset-After": "2"}
+    responses.extend(
+        [
+            httpx.Response(204, headers=exhausted),
+            httpx.Response(429, json={"retry_after": 1.5, "global": False}),
+            httpx.Response(204),
+        ]
+    )
+    post_payload("https://discord.example/hook", {"content": "a"}, limiter)
+    post_payload("https://discord.example/hook", {"content": "b"}, limiter)
+    assert waits == [2.0, 1.5]
+    assert len(requests) == 3
@@ -0,0 +1,66 @@
+import asyncio
+
+import httpx
+
+from ai_updates.collectors import collect_all
+from ai_updates.collectors.feed_collector import parse
+from ai_updates.sources import Source
+from ai_updates.store import Store
+
+_ATOM = """<?xml version="1.0" encoding="utf-8"?>
+<feed xmlns="http://www.w3.org/2005/Atom">
+  <title>Example changelog</title>
+  <id>urn:example:feed</id>
+  <updated>2026-02-03T00:00:00Z</updated>
+  <entry>
+    <id>urn:example:older</id>
+    <title>Older release</title>
+    <link href="https://example.com/older"/>
+    <updated>2026-01-20T09:00:00Z</updated>
+    <summary>Bug fixes.</summary>
+  </entry>
+  <entry>
+    <id>urn:example:newest</id>
+    <title>Faster search</title>
+    <link href="https://example.com/newest"/>
+    <published>2026-02-03T00:00:00Z</published>
+    <content type="html">&lt;p&gt;Search is &lt;b&gt;twice&lt;/b&gt; as fast.&lt;/p&gt;</content>
+  </entry>
+</feed>"""
+
+_SOURCE = Source(
+    id="feed", service="openai", label="Feed", kind="feed", url="https://example.com/feed.xml", incremental=True
+)
+
+
+def test_parse_orders_entries_newest_first_and_uses_entry_ids():
+    # 掲載順に関係なく新しい順に並べ、エントリ id を識別子、HTML 本文を文字列にして返すことを確認。
+    items = parse(_SOURCE, _ATOM)
+    assert [item.section_id for item in items] == ["urn:example:newest", "urn:example:older"]
+    assert items[0].body == "Search is twice as fast."
+    assert items[0].url == "https://example.com/newest"
+    assert items[0].published_at.isoformat() == "2026-02-03T00:00:00+00:00"
+    assert [item.title for item in parse(_SOURCE, _ATOM, watermark="urn:example:older")] == ["Faster search"]
+
+
+def test_collect_feed_sends_validators_and_returns_only_new_entries(tmp_path):
+    # 保存済みの検証子を送り、前回の最新エントリより新しいものだけを返して watermark を進めることを確認。
+    store = Store(tmp_path / "t.db")
+    store.save_validators(_SOURCE.url, '"v1"', None)
+    store.set_source_state(_SOURCE.id, "watermark", "urn:example:older")
+    seen_headers = {}
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        seen_headers.update(request.headers)
+        return httpx.Response(200, text=_ATOM, headers={"ETag": '"v2"'})
+
+    async def run():
+        async with httpx.AsyncClient(transport=httpx.MockTransport(handler)) as client:
+            return await collect_all([_SOURCE], "ua", client=client, store=store)
+
+    [(_, result)] = asyncio.run(run())
+    store.close()
+    assert seen_headers["if-none-match"] == '"v1"'
+    assert [item.title for item in result.items] == ["Faster search"]
+    assert result.state == {"watermark": "urn:example:newest"}
+    assert result.validators == {_SOURCE.url: ('"v2"', None)}
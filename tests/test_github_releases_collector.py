@@ -0,0 +1,122 @@
+import asyncio
+import json
+
+import httpx
+import pytest
+
+from ai_updates.collectors import GithubOptions, collect_all
+from ai_updates.collectors import github_releases_collector as github
+from ai_updates.sources import Source
+from ai_updates.store import Store
+
+
+@pytest.fixture(autouse=True)
+def _fresh_limiter(monkeypatch):
+    # レート制限の状態はプロセス内で共有されるため、テストごとに作り直す。
+    monkeypatch.setattr(github, "_limiter", github.RateLimiter())
+
+
+def _source(repo: str) -> Source:
+    return Source(
+        id=repo.replace("/", "_"),
+        service="gemini",
+        label=repo,
+        kind="github_releases",
+        url=f"https://api.github.com/repos/{repo}/releases",
+        incremental=True,
+    )
+
+
+def _release(n: int, draft: bool = False) -> dict:
+    return {
+        "id": n,
+        "name": f"v{n}",
+        "html_url": f"https://github.com/o/r/releases/v{n}",
+        "published_at": "2026-03-01T00:00:00Z",
+        "body": f"notes {n}",
+        "draft": draft,
+    }
+
+
+def _collect(sources, handler, store, options, **limits):
+    async def run():
+        async with httpx.AsyncClient(transport=httpx.MockTransport(handler)) as client:
+            return await collect_all(sources, "ua", client=client, store=store, github_options=options, **limits)
+
+    return asyncio.run(run())
+
+
+def test_rest_reads_pages_until_watermark_with_token(tmp_path):
+    # 前回の最新リリースに達するまでページを読み進め、それより新しい公開済みリリースだけを返すことを確認。
+    store = Store(tmp_path / "t.db")
+    source = _source("google-gemini/gemini-cli")
+    store.set_source_state(source.id, "watermark", "5")
+    releases = [_release(n, draft=n == 17) for n in range(18, 0, -1)]
+    requests = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        requests.append(request)
+        page, per_page = int(request.url.params["page"]), int(request.url.params["per_page"])
+        return httpx.Response(200, json=releases[(page - 1) * per_page : page * per_page])
+
+    [(_, result)] = _collect([source], handler, store, GithubOptions(token="t0k", batch_size=1))
+    store.close()
+    assert [r.url.params["page"] for r in requests] == ["1", "2"]
+    assert requests[0].headers["authorization"] == "Bearer t0k"
+    assert [item.title for item in result.items] == [f"v{n}" for n in range(18, 5, -1) if n != 17]
+    assert result.state == {"watermark": "18"}
+
+
+def test_graphql_batches_repositories_and_pages_only_where_needed(tmp_path):
+    # トークンがあれば複数リポジトリを1クエリで取得し、watermark が見つからないリポジトリだけ次のページを取ることを確認。
+    store = Store(tmp_path / "t.db")
+    sources = [_source("o/a"), _source("o/b"), _source("o/missing")]
+    store.set_source_state("o_a", "watermark", "3")
+    store.set_source_state("o_b", "watermark", "1")
+    nodes = {
+        "a": [{"databaseId": n, "name": f"a{n}", "url": f"https://github.com/o/a/{n}"} for n in range(4, 2, -1)],
+        "b": [{"databaseId": n, "name": f"b{n}", "url": f"https://github.com/o/b/{n}"} for n in range(12, 0, -1)],
+    }
+    queries = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        payload = json.loads(request.content)
+        queries.append(payload["variables"])
+        data, errors = {}, []
+        for i in range(len(payload["variables"]) // 3):
+            name, cursor = payload["variables"][f"n{i}"], payload["variables"][f"c{i}"]
+            if name not in nodes:
+                data[f"r{i}"] = None
+                errors.append({"path": [f"r{i}"], "message": "Could not resolve to a Repository"})
+                continue
+            start = int(cursor or 0)
+            page = nodes[name][start : start + 10]
+            more = start + 10 < len(nodes[name])
+            data[f"r{i}"] = {
+                "releases": {"pageInfo": {"hasNextPage": more, "endCursor": str(start + 10)}, "nodes": page}
+            }
+        return httpx.Response(200, json={"data": data, "errors": errors})
+
+    results = dict(_collect(sources, handler, store, GithubOptions(token="t0k")))
+    store.close()
+    assert len(queries) == 2
+    assert queries[1] == {"o0": "o", "n0": "b", "c0": "10"}
+    assert [item.title for item in results[sources[0]].items] == ["a4"]
+    assert [item.title for item in results[sources[1]].items] == [f"b{n}" for n in range(12, 1, -1)]
+    assert results[sources[1]].state == {"watermark": "12"}
+    assert isinstance(results[sources[2]], RuntimeError)
+
+
+def test_exhausted_rate_limit_fails_fast_without_more_requests(tmp_path):
+    # 残り回数が尽きたら、解除時刻まで同じ resource へのリクエストを送らずに失敗させることを確認。
+    sources = [_source("o/a"), _source("o/b")]
+    calls = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        calls.append(request.url.path)
+        headers = {"X-RateLimit-Remaining": "0", "X-RateLimit-Reset": "9999999999", "X-RateLimit-Resource": "core"}
+        return httpx.Response(403, headers=headers, json={"message": "API rate limit exceeded"})
+
+    results = _collect(sources, handler, None, GithubOptions(max_pages=1), per_host_limit=1)
+    assert len(calls) == 1
+    assert all(isinstance(result, github.RateLimited) for _, result in results)
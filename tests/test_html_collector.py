@@ -1,4 +1,6 @@
-from ai_updates.collectors.html_collector import _slugify
+from ai_updates.collectors.html_collector import _slugify, page_digest, parse
+from ai_updates.normalize import normalize, section_id
+from ai_updates.sources import Source
 
 
 def test_slugify_keeps_s_characters_and_normalizes_spaces():
@@ -9,3 +11,32 @@ def test_slugify_keeps_s_characters_and_normalizes_spaces():
 def test_slugify_collapses_mixed_separators():
     # アンダースコアや複数区切りが混在しても綺麗な slug になることを確認。
     assert _slugify("New_features  -  Codex") == "new-features-codex"
+
+
+def test_page_digest_ignores_scripts_and_nonces():
+    # スクリプトや nonce が変わってもダイジェストは変わらず、本文変更では変わることを確認。
+    base = '<html><head><script nonce="n1">x()</script></head><body><main><h2>A</h2><p nonce="a">b</p></main></body></html>'
+    noisy = '<html><head><script nonce="n2">y()</script></head><body><main><h2>A</h2><script>t=2</script><p nonce="b">b</p></main></body></html>'
+    edited = base.replace("<p nonce=\"a\">b</p>", "<p>c</p>")
+    assert page_digest(base) == page_digest(noisy)
+    assert page_digest(base) != page_digest(edited)
+
+
+def test_new_top_section_keeps_existing_fingerprints():
+    # 先頭にセクションが追加されても、既存セクションの fingerprint は変わらないことを確認。
+    source = Source(id="s1", service="openai", label="S", kind="html", url="https://example.com/notes")
+    before = "<main><h2>Bug fixes</h2><p>Old fix</p><h2>Bug fixes</h2><p>Older fix</p></main>"
+    after = "<main><h2>New feature</h2><p>Shiny</p>" + before[len("<main>"):]
+    old = {normalize(raw).fingerprint for raw in parse(source, before)}
+    new = {normalize(raw).fingerprint for raw in parse(source, after)}
+    assert len(old) == 2
+    assert old < new
+    assert len(new - old) == 1
+
+
+def test_parse_ignores_watermark_when_absent_from_page():
+    # watermark のセクションが消えていても、全セクションを返すことを確認。
+    source = Source(id="s1", service="openai", label="S", kind="html", url="https://example.com/notes")
+    html = "<main><h2>A</h2><p>one</p><h2>B</h2><p>two</p></main>"
+    assert len(parse(source, html, watermark="removed-undated-000000000000")) == 2
+    assert [raw.body for raw in parse(source, html, watermark=section_id("B", "two", None))] == ["one"]
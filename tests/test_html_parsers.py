@@ -0,0 +1,103 @@
+from pathlib import Path
+
+import pytest
+
+from ai_updates.collectors.html_parsers import (
+    BACKENDS,
+    DEFAULT_BACKEND,
+    SectionStream,
+    available_backends,
+    compile_plan,
+    parse_page,
+    stream_page,
+    supports_streaming,
+)
+from ai_updates.sources import ExtractionPlan
+
+_FIXTURES = sorted((Path(__file__).parent / "fixtures").glob("*.html"))
+
+
+@pytest.mark.parametrize("backend", [b for b in BACKENDS if b != DEFAULT_BACKEND])
+@pytest.mark.parametrize("fixture", _FIXTURES, ids=lambda p: p.name)
+def test_backends_extract_identical_sections(fixture, backend):
+    # どのバックエンドでも標準パーサーと同じタイトル・セクションが得られることを確認。
+    if backend not in available_backends():
+        pytest.skip(f"{backend} is not installed")
+    html = fixture.read_text(encoding="utf-8")
+    assert parse_page(html, backend) == parse_page(html, DEFAULT_BACKEND)
+
+
+def test_default_backend_skips_scripts_comments_and_empty_sections():
+    # script・コメント・空セクションが本文に混ざらないことを確認。
+    html = (_FIXTURES[0].parent / "help_center_release_notes.html").read_text(encoding="utf-8")
+    page = parse_page(html)
+    headings = [heading for heading, _, _ in page.sections]
+    assert "Empty section" not in headings
+    assert all("trackSection" not in body and "experiment" not in body for _, body, _ in page.sections)
+    assert page.sections[0][2].isoformat() == "2026-01-29T00:00:00+00:00"
+
+
+_PLANNED_PAGE = """<html><head><title>Changelog &amp; News</title></head><body>
+<main><h2>Not a release</h2><p>Marketing</p></main>
+<section class="list release-list">
+  <h4 class="title"><time datetime="2026-02-03T00:00:00Z">Feb 3</time> Faster search</h4>
+  <p class="desc">Search is twice as fast.</p><p class="meta">Posted by staff</p>
+  <h4 class="title">v2.1 released 2026-01-20T09:00:00+09:00</h4>
+  <p class="desc">Bug fixes.</p>
+  <h4 class="title">Older</h4><p class="desc">Not included.</p>
+</section></body></html>"""
+_PLAN = ExtractionPlan(
+    container="section.release-list",
+    heading="h4.title",
+    body="p.desc",
+    date_attr="datetime",
+    date_pattern=r"released (\S+)",
+    max_sections=2,
+)
+
+
+@pytest.mark.parametrize("backend", BACKENDS)
+def test_extraction_plan_selects_container_headings_body_and_dates(backend):
+    # プラン指定時はコンテナ・見出し・本文・日付をプラン通りに抽出し、件数上限も守ることを確認。
+    if backend not in available_backends():
+        pytest.skip(f"{backend} is not installed")
+    page = parse_page(_PLANNED_PAGE, backend, _PLAN)
+    assert page.title == "Changelog & News"
+    assert [(heading, body) for heading, body, _ in page.sections] == [
+        ("Feb 3 Faster search", "Search is twice as fast."),
+        ("v2.1 released 2026-01-20T09:00:00+09:00", "Bug fixes."),
+    ]
+    assert page.sections[0][2].isoformat() == "2026-02-03T00:00:00+00:00"
+    assert page.sections[1][2].isoformat() == "2026-01-20T09:00:00+09:00"
+
+
+def test_compile_plan_is_cached_and_strains_simple_containers():
+    # 同じプランは1回だけコンパイルされ、単純なセレクターなら SoupStrainer が作られることを確認。
+    assert compile_plan(_PLAN) is compile_plan(ExtractionPlan(**{f: getattr(_PLAN, f) for f in _PLAN.__slots__}))
+    assert compile_plan(_PLAN).strainer is not None
+    assert compile_plan(ExtractionPlan(container="main > div")).strainer is None
+
+
+@pytest.mark.parametrize("size", [1, 64, 1 << 20])
+@pytest.mark.parametrize("fixture", _FIXTURES, ids=lambda p: p.name)
+def test_stream_page_matches_dom_parser_at_any_chunk_size(fixture, size):
+    # 断片の大きさに関係なく、逐次解析が標準パーサーと同じタイトル・セクションを返すことを確認。
+    html = fixture.read_text(encoding="utf-8")
+    chunks = [html[i : i + size] for i in range(0, len(html), size)]
+    page = parse_page(html)
+    assert stream_page(chunks) == (page.title, page.sections)
+    page = parse_page(_PLANNED_PAGE, plan=_PLAN)
+    assert stream_page([_PLANNED_PAGE[:150], _PLANNED_PAGE[150:]], _PLAN) == (page.title, page.sections)
+
+
+def test_section_stream_stops_after_max_sections():
+    # max_sections 件が確定したら done になり、それ以降の入力は解析しないことを確認。
+    plan = ExtractionPlan(max_sections=2)
+    stream = SectionStream(plan)
+    sections = stream.feed("<html><body><main><h2>A</h2><p>one</p><h2>B</h2><p>two</p>")
+    assert [heading for heading, _, _ in sections] == ["A"]
+    sections += stream.feed("<h2>C</h2><p>three</p>")
+    assert stream.done
+    sections += stream.feed("<h2>D</h2><p>four</p>" + "<script>x</script>" * 1000)
+    assert [(heading, body) for heading, body, _ in sections + stream.close()] == [("A", "one"), ("B", "two")]
+    assert not supports_streaming(ExtractionPlan(container="main > div"))
@@ -0,0 +1,93 @@
+import asyncio
+
+import httpx
+import pytest
+
+from ai_updates import http_clients
+from ai_updates.dispatchers.discord import post_message
+from ai_updates.http_clients import ClientPolicy
+
+
+@pytest.fixture(autouse=True)
+def _reset_registry():
+    yield
+    http_clients.configure()
+
+
+def test_clients_are_shared_per_purpose_and_use_injected_transport():
+    # 用途ごとに同じクライアントが使い回され、差し替えた transport へ送られることを確認。
+    posted = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        posted.append((request.url.host, request.read()))
+        return httpx.Response(204)
+
+    http_clients.configure(transport=httpx.MockTransport(handler))
+    assert http_clients.get_client("discord") is http_clients.get_client("discord")
+    assert http_clients.get_client("discord") is not http_clients.get_client("llm")
+    post_message("https://discord.example/api/webhooks/1", "hello")
+    post_message("https://discord.example/api/webhooks/1", "again")
+    assert [host for host, _ in posted] == ["discord.example", "discord.example"]
+    assert b"again" in posted[1][1]
+
+
+def test_transient_statuses_are_retried_up_to_the_policy_limit():
+    # 一時的なエラーは方針の回数だけ再試行し、使い切ったら最後の応答を返すことを確認。
+    statuses = iter([503, 502, 200, 503, 503, 503])
+    calls = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        calls.append(request.url.path)
+        return httpx.Response(next(statuses))
+
+    http_clients.configure(
+        transport=httpx.MockTransport(handler),
+        policies={"collect": ClientPolicy(timeout=5, retries=2, backoff=0)},
+    )
+    client = http_clients.get_client("collect")
+    assert client.get("https://a.example/ok").status_code == 200
+    assert client.get("https://a.example/down").status_code == 503
+    assert calls == ["/ok"] * 3 + ["/down"] * 3
+
+
+def test_async_client_retries_connection_errors():
+    # 非同期クライアントでも接続エラーを再試行することを確認。
+    attempts = {"n": 0}
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        attempts["n"] += 1
+        if attempts["n"] == 1:
+            raise httpx.ConnectError("refused", request=request)
+        return httpx.Response(200, text="ok")
+
+    http_clients.configure(
+        transport=httpx.MockTransport(handler),
+        policies={"collect": ClientPolicy(timeout=5, retries=1, backoff=0)},
+    )
+
+    async def run():
+        async with http_clients.new_async_client("collect") as client:
+            return await client.get("https://a.example/")
+
+    assert asyncio.run(run()).text == "ok"
+    assert attempts["n"] == 2
+
+
+def test_discord_does_not_retry_errors_after_the_request_was_sent():
+    # 冪等でない Discord では、送信後にも起こる読み取りタイムアウトは再試行せず、接続エラーだけ再試行することを確認。
+    errors = iter([httpx.ReadTimeout, httpx.ConnectError])
+    calls = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        calls.append(request.url.path)
+        error = next(errors, None)
+        if error is not None:
+            raise error("failed", request=request)
+        return httpx.Response(204)
+
+    http_clients.configure(transport=httpx.MockTransport(handler))
+    client = http_clients.get_client("discord")
+    with pytest.raises(httpx.ReadTimeout):
+        client.post("https://discord.example/api/webhooks/1", json={"content": "a"})
+    assert client.post("https://discord.example/api/webhooks/1", json={"content": "b"}).status_code == 204
+    assert len(calls) == 3
@@ -0,0 +1,23 @@
+import json
+import subprocess
+import sys
+
+
+def _loaded_after_import(statement: str, modules: list[str]) -> list[str]:
+    code = f"import json, sys\n{statement}\nprint(json.dumps([m for m in {modules!r} if m in sys.modules]))"
+    out = subprocess.run([sys.executable, "-c", code], check=True, capture_output=True, text=True)
+    return json.loads(out.stdout)
+
+
+def test_cli_entry_points_do_not_import_heavy_modules_at_startup():
+    # エントリーポイントの読み込みだけでは bs4 / httpx / パイプライン本体を読み込まないことを確認。
+    heavy = ["bs4", "httpx", "feedparser", "lxml", "selectolax", "ai_updates.pipeline", "ai_updates.summarizer"]
+    assert _loaded_after_import("from ai_updates.main import run_once_cli, run_maintenance_cli", heavy) == []
+    assert _loaded_after_import("from ai_updates.preview import run_preview_cli", heavy) == []
+
+
+def test_collector_registry_loads_only_requested_kind():
+    # collectors パッケージの読み込みでは HTML パーサーを読み込まず、使う種類の収集モジュールだけを読み込むことを確認。
+    statement = "import ai_updates.collectors as c\nc._collector('html')"
+    assert _loaded_after_import("import ai_updates.collectors", ["bs4", "ai_updates.collectors.html_collector"]) == []
+    assert "ai_updates.collectors.html_collector" in _loaded_after_import(statement, ["ai_updates.collectors.html_collector"])
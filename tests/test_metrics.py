@@ -0,0 +1,81 @@
+import asyncio
+import json
+from datetime import timedelta
+
+from ai_updates import metrics, pipeline
+from ai_updates.metrics import RunMetrics, activate, prometheus_text, publish
+from ai_updates.models import utc_now
+from ai_updates.sources import Source
+from ai_updates.store import Store
+from test_pipeline import _config, _run
+
+
+def test_metrics_follow_tasks_and_threads_and_ignore_calls_outside_a_run():
+    # 実行中に作ったタスクとスレッドからの記録が同じ RunMetrics に集まり、実行外の記録は捨てられることを確認。
+    run = RunMetrics()
+    metrics.incr("outside")
+
+    async def work():
+        await asyncio.gather(asyncio.to_thread(metrics.incr, "fetch_bytes", 100), asyncio.sleep(0))
+        metrics.incr("fetch_bytes", 50)
+        metrics.observe("fetch", 0.2)
+
+    with activate(run):
+        asyncio.run(work())
+    metrics.incr("outside")
+
+    assert run.counters == {"fetch_bytes": 150}
+    snapshot = run.snapshot()
+    assert snapshot["fetch_seconds_count"] == 1
+    assert snapshot["fetch_seconds_p95"] == 0.2
+
+
+def test_prometheus_text_exposes_counters_and_stage_quantiles():
+    # 件数は gauge、ステージ時間は quantile 付きの summary として出力されることを確認。
+    run = RunMetrics()
+    run.incr("items_new", 3)
+    for seconds in (0.1, 0.2, 0.3, 0.4):
+        run.observe("collect", seconds)
+    text = prometheus_text(run)
+    assert "ai_updates_last_run_items_new 3\n" in text
+    assert 'ai_updates_last_run_stage_seconds{stage="collect",quantile="0.5"} 0.200000' in text
+    assert 'ai_updates_last_run_stage_seconds{stage="collect",quantile="0.95"} 0.400000' in text
+    assert 'ai_updates_last_run_stage_seconds_count{stage="collect"} 4' in text
+
+
+def test_pipeline_run_is_recorded_in_run_metrics_and_files(tmp_path, monkeypatch, capsys):
+    # パイプライン1回分の件数・ステージ時間が run_metrics と JSON / textfile に書かれ、要約行が出ることを確認。
+    monkeypatch.setattr(pipeline, "send_batch", lambda webhook, pairs: None)
+    cfg = _config(tmp_path)
+    cfg.metrics_json_path = tmp_path / "out" / "metrics.json"
+    cfg.metrics_prometheus_path = tmp_path / "out" / "ai_updates.prom"
+    store = Store(cfg.db_path)
+    sources = [Source(id="s0", service="openai", label="S0", kind="html", url="https://s0.example/")]
+
+    _run(cfg, store, sources)
+
+    [(started_at, values)] = store.recent_run_metrics()
+    assert values["sources"] == 1
+    assert values["items_new"] == 2
+    assert values["dispatch_items"] == 2
+    assert values["fetch_requests"] == 1
+    assert values["fetch_bytes"] > 0
+    assert values["collect_seconds_count"] == 1
+    assert json.loads(cfg.metrics_json_path.read_text())["metrics"]["items_new"] == 2
+    assert "ai_updates_last_run_items_new 2" in cfg.metrics_prometheus_path.read_text()
+    assert "[info] run summary:" in capsys.readouterr().out
+    store.close()
+
+
+def test_publish_keeps_run_metrics_within_retention(tmp_path):
+    # 保持日数を過ぎた実行の計測値は、新しい実行の保存時に消えることを確認。
+    cfg = _config(tmp_path)
+    store = Store(cfg.db_path)
+    old = RunMetrics(started_at=utc_now() - timedelta(days=cfg.metrics_retention_days + 1))
+    old.incr("items_new")
+    store.add_run_metrics(old.started_at, old.snapshot(), cfg.metrics_retention_days)
+    current = RunMetrics()
+    current.incr("items_new", 2)
+    publish(cfg, store, current)
+    assert [values["items_new"] for _, values in store.recent_run_metrics()] == [2]
+    store.close()
@@ -0,0 +1,30 @@
+from ai_updates.near_dup import BANDS, bands, from_sql, hamming, simhash, to_sql
+
+_BASE = (
+    "We are rolling out a new model picker in ChatGPT that lets Plus and Pro users choose between "
+    "fast and thinking modes. The picker is available on web, desktop and mobile apps starting today, "
+    "and will reach Enterprise and Edu workspaces over the coming weeks."
+)
+_OTHER = (
+    "Gemini CLI now supports custom slash commands defined in TOML files, letting teams share reusable "
+    "prompts across repositories. Commands can be namespaced and take arguments."
+)
+
+
+def test_simhash_is_close_for_small_edits_and_far_for_unrelated_text():
+    # typo 修正や1文追加は近く、無関係な本文は遠いことを確認。
+    base = simhash(_BASE)
+    assert hamming(base, simhash(_BASE.replace("choose", "chose"))) <= 4
+    assert hamming(base, simhash(_BASE + " Learn more in our help center.")) <= 4
+    assert hamming(base, simhash(_OTHER)) > 10
+    # 短すぎる本文は対象外。
+    assert simhash("Bug fixes.") is None
+
+
+def test_bands_and_sql_roundtrip():
+    # バンド分割は全ビットを覆い、SQLite 用の符号付き変換は可逆であることを確認。
+    value = (1 << 64) - 1
+    assert len(bands(value)) == BANDS
+    assert sum(b.bit_length() for b in bands(value)) == 64
+    assert from_sql(to_sql(value)) == value
+    assert to_sql(value) < 0
@@ -0,0 +1,189 @@
+import asyncio
+from pathlib import Path
+
+import httpx
+
+from ai_updates import pipeline
+from ai_updates.config import Config
+from ai_updates.pipeline import run_pipeline
+from ai_updates.sources import Source
+from ai_updates.store import Store
+
+_PAGE = (
+    "<html><head><title>Notes</title></head><body><main>"
+    "<h2>Feature A</h2><p>Alpha details</p>"
+    "<h2>Feature B</h2><p>Beta details</p>"
+    "</main></body></html>"
+)
+
+
+def _config(tmp_path: Path) -> Config:
+    return Config(
+        db_path=tmp_path / "t.db",
+        user_agent="test",
+        summary_provider="openai",
+        openai_api_key=None,
+        openai_model="m",
+        gemini_api_key=None,
+        gemini_model="m",
+        webhook_openai="https://discord.example/hook",
+        webhook_gemini=None,
+        webhook_claude=None,
+        dispatch_min_interval=0,
+    )
+
+
+def _run(cfg: Config, store: Store, sources: list[Source], pages: dict[str, str] | None = None) -> None:
+    def handler(request: httpx.Request) -> httpx.Response:
+        text = (pages or {}).get(request.url.host, _PAGE)
+        return httpx.Response(200, text=text, headers={"ETag": '"v1"'})
+
+    async def run():
+        async with httpx.AsyncClient(transport=httpx.MockTransport(handler)) as client:
+            await run_pipeline(cfg, store, sources, client=client)
+
+    asyncio.run(run())
+
+
+def test_pipeline_stores_summarizes_and_dispatches_each_new_item(tmp_path, monkeypatch):
+    # 全ステージを通った新着が、要約保存・送信済みになり検証子も保存されることを確認。
+    sent = []
+    monkeypatch.setattr(pipeline, "send_batch", lambda webhook, pairs: sent.extend(item.title for item, _ in pairs))
+    cfg = _config(tmp_path)
+    store = Store(cfg.db_path)
+    sources = [
+        Source(id=f"s{i}", service="openai", label=f"S{i}", kind="html", url=f"https://s{i}.example/")
+        for i in range(3)
+    ]
+
+    _run(cfg, store, sources)
+
+    assert len(sent) == 6
+    rows = store.conn.execute(
+        "SELECT COUNT(*) FROM seen_updates WHERE summarized_at IS NOT NULL AND sent_immediate_at IS NOT NULL"
+    ).fetchone()
+    assert rows[0] == 6
+    assert store.get_validators("https://s0.example/") == ('"v1"', None)
+
+    # 2回目は全て既読なので送信されない。
+    _run(cfg, store, sources)
+    assert len(sent) == 6
+    store.close()
+
+
+def test_pipeline_skips_near_duplicate_cross_posts(tmp_path, monkeypatch):
+    # 別ソースに転載されたほぼ同じ告知は既読扱いになり、通知は1回だけになることを確認。
+    sent = []
+    monkeypatch.setattr(pipeline, "send_batch", lambda webhook, pairs: sent.extend(item.source_id for item, _ in pairs))
+    cfg = _config(tmp_path)
+    store = Store(cfg.db_path)
+    body = (
+        "We are rolling out a new model picker that lets Plus and Pro users choose between fast and "
+        "thinking modes on web, desktop and mobile apps starting today."
+    )
+    pages = {
+        "chatgpt.example": f"<main><h2>Model picker</h2><p>{body}</p></main>",
+        "codex.example": f"<main><h2>New picker</h2><p>{body} Learn more.</p></main>",
+    }
+    sources = [
+        Source(id="chatgpt", service="openai", label="C", kind="html", url="https://chatgpt.example/"),
+        Source(id="codex", service="openai", label="X", kind="html", url="https://codex.example/"),
+    ]
+
+    _run(cfg, store, sources, pages)
+
+    assert len(sent) == 1
+    duplicates = store.conn.execute("SELECT COUNT(*) FROM seen_updates WHERE duplicate_of IS NOT NULL").fetchone()
+    assert duplicates[0] == 1
+    store.close()
+
+
+def test_pipeline_notifies_same_body_for_each_service(tmp_path, monkeypatch):
+    # 別サービスのソースに同じ本文が載っても近似重複にせず、それぞれの Webhook へ送ることを確認。
+    sent = []
+    monkeypatch.setattr(
+        pipeline, "send_batch", lambda webhook, pairs: sent.extend((webhook, item.source_id) for item, _ in pairs)
+    )
+    cfg = _config(tmp_path)
+    cfg.webhook_claude = "https://discord.example/claude"
+    store = Store(cfg.db_path)
+    body = (
+        "We are rolling out a new model picker that lets Plus and Pro users choose between fast and "
+        "thinking modes on web, desktop and mobile apps starting today."
+    )
+    pages = {
+        "o.example": f"<main><h2>Model picker</h2><p>{body}</p></main>",
+        "c.example": f"<main><h2>Model picker</h2><p>{body}</p></main>",
+    }
+    sources = [
+        Source(id="o", service="openai", label="O", kind="html", url="https://o.example/"),
+        Source(id="c", service="claude", label="C", kind="html", url="https://c.example/"),
+    ]
+
+    _run(cfg, store, sources, pages)
+
+    assert sorted(sent) == [("https://discord.example/claude", "c"), ("https://discord.example/hook", "o")]
+    duplicates = store.conn.execute("SELECT COUNT(*) FROM seen_updates WHERE duplicate_of IS NOT NULL").fetchone()
+    assert duplicates[0] == 0
+    store.close()
+
+
+def test_failed_dispatch_is_kept_in_outbox_and_sent_on_next_run(tmp_path, monkeypatch):
+    # Discord 障害で送れなかった通知が次回実行の最初にまとめて送られることを確認。
+    sent = []
+    down = {"flag": True}
+
+    def send_batch(webhook, pairs):
+        if down["flag"]:
+            raise RuntimeError("discord unavailable")
+        sent.append(len(pairs))
+
+    monkeypatch.setattr(pipeline, "send_batch", send_batch)
+    cfg = _config(tmp_path)
+    cfg.outbox_retry_base = 0
+    store = Store(cfg.db_path)
+    sources = [Source(id="s0", service="openai", label="S0", kind="html", url="https://s0.example/")]
+
+    _run(cfg, store, sources)
+    assert sent == []
+    assert store.outbox_counts() == {"pending": 2}
+
+    # 回復後は、ページに新着がなくてもアウトボックスの2件が1メッセージで送られる。
+    down["flag"] = False
+    _run(cfg, store, sources)
+    assert sent == [2]
+    assert store.outbox_counts() == {}
+    store.close()
+
+
+def test_items_whose_summary_failed_are_summarized_and_sent_on_next_run(tmp_path, monkeypatch):
+    # 要約で失敗した新着も既読と同時に通知待ちへ登録され、次回実行の最初に要約し直して送られることを確認。
+    sent = []
+    monkeypatch.setattr(pipeline, "send_batch", lambda webhook, pairs: sent.extend(item.title for item, _ in pairs))
+    original = pipeline.summarize_batch
+    calls = {"n": 0}
+
+    def summarize_batch(items, **kwargs):
+        calls["n"] += 1
+        if calls["n"] == 1:
+            raise RuntimeError("llm unavailable")
+        return original(items, **kwargs)
+
+    monkeypatch.setattr(pipeline, "summarize_batch", summarize_batch)
+    cfg = _config(tmp_path)
+    cfg.summary_batch_size = 5
+    store = Store(cfg.db_path)
+    sources = [Source(id="s0", service="openai", label="S0", kind="html", url="https://s0.example/")]
+
+    _run(cfg, store, sources)
+    assert sent == []
+    assert store.outbox_counts() == {"pending": 2}
+
+    _run(cfg, store, sources)
+    assert sorted(sent) == ["Feature A | Notes", "Feature B | Notes"]
+    assert store.outbox_counts() == {}
+    rows = store.conn.execute(
+        "SELECT COUNT(*) FROM seen_updates WHERE summarized_at IS NOT NULL AND sent_immediate_at IS NOT NULL"
+    ).fetchone()
+    assert rows[0] == 2
+    store.close()
@@ -0,0 +1,211 @@
+from datetime import datetime, timezone
+
+from ai_updates.models import Summary, UpdateItem
+from ai_updates.collectors.html_collector import parse
+from ai_updates.normalize import _fingerprint, normalize
+from ai_updates.sources import Source
+from ai_updates.store import Store
+
+
+def test_validators_roundtrip_and_reset(tmp_path):
+    # 検証子は保存・取得でき、reset_all で消えることを確認。
+    store = Store(tmp_path / "t.db")
+    assert store.get_validators("https://example.com") is None
+    store.save_validators("https://example.com", '"abc"', None)
+    assert store.get_validators("https://example.com") == ('"abc"', None)
+    store.reset_all()
+    assert store.get_validators("https://example.com") is None
+    store.close()
+
+
+def _item(fp: str) -> UpdateItem:
+    return UpdateItem(
+        source_id="s1",
+        service="openai",
+        title=f"title {fp}",
+        url=f"https://example.com/#{fp}",
+        published_at=datetime(2026, 2, 1, tzinfo=timezone.utc),
+        body="body",
+        fingerprint=fp,
+    )
+
+
+def test_bulk_insert_and_seen_lookup(tmp_path):
+    # 一括保存した fingerprint を1クエリで既読判定できることを確認。
+    store = Store(tmp_path / "t.db")
+    store.add_updates([_item(f"fp{i}") for i in range(1200)])
+    seen = store.seen_fingerprints([f"fp{i}" for i in range(0, 1300, 100)])
+    assert seen == {f"fp{i}" for i in range(0, 1200, 100)}
+    assert store.conn.execute("PRAGMA journal_mode").fetchone()[0] == "wal"
+    store.close()
+
+
+def test_fresh_store_uses_incremental_auto_vacuum(tmp_path):
+    # 新規 DB は compact() を待たずに auto_vacuum=INCREMENTAL（2）で作られることを確認。
+    store = Store(tmp_path / "t.db")
+    assert store.conn.execute("PRAGMA auto_vacuum").fetchone()[0] == 2
+    store.close()
+    store = Store(tmp_path / "t.db")
+    assert store.conn.execute("PRAGMA auto_vacuum").fetchone()[0] == 2
+    store.close()
+
+
+def test_transaction_rolls_back_on_error(tmp_path):
+    # transaction() 内で例外が起きたら、まとめた書き込みが全て取り消されることを確認。
+    store = Store(tmp_path / "t.db")
+    try:
+        with store.transaction():
+            store.add_updates([_item("a"), _item("b")])
+            store.add_summary("a", Summary(headline="h", bullets=["x"], importance="low", topic="t"))
+            raise RuntimeError("boom")
+    except RuntimeError:
+        pass
+    assert store.seen_fingerprints(["a", "b"]) == set()
+    store.close()
+
+
+def test_legacy_index_fingerprints_are_migrated_to_section_ids(tmp_path):
+    # 旧形式（#slug-index）で保存済みの行が、新しい識別子の fingerprint に付け替わることを確認。
+    source = Source(id="s1", service="openai", label="S", kind="html", url="https://example.com/notes")
+    page = (
+        "<html><head><title>Notes | Help</title></head><body><main>"
+        "<h2>New_tools | beta (January 5, 2026)</h2><p>Alpha</p><h2>Bug fixes</h2><p>Beta</p>"
+        "</main></body></html>"
+    )
+    items = [normalize(raw) for raw in parse(source, page)]
+    legacy_slugs = ["newtools-beta-january-5-2026", "bug-fixes"]
+
+    db_path = tmp_path / "t.db"
+    store = Store(db_path)
+    for idx, (item, slug) in enumerate(zip(items, legacy_slugs)):
+        legacy_url = f"{source.url}#{slug}-{idx}"
+        legacy = UpdateItem(
+            source_id=item.source_id,
+            service=item.service,
+            title=item.title,
+            url=legacy_url,
+            published_at=item.published_at,
+            body=item.body,
+            fingerprint=_fingerprint(item.source_id, item.title, legacy_url, item.body),
+        )
+        store.add_update(legacy)
+        store.add_summary(legacy.fingerprint, Summary(headline="h", bullets=["x"], importance="low", topic="t"))
+    store.conn.execute("PRAGMA user_version = 0")
+    store.conn.commit()
+    store.close()
+
+    store = Store(db_path)
+    fingerprints = [item.fingerprint for item in items]
+    assert store.seen_fingerprints(fingerprints) == set(fingerprints)
+    summaries = store.conn.execute("SELECT fingerprint FROM summaries").fetchall()
+    assert {row[0] for row in summaries} == set(fingerprints)
+    store.close()
+
+
+def test_outbox_backoff_dead_letter_and_completion(tmp_path):
+    # 失敗ごとに再試行時刻が延び、上限回数で dead になり、成功すれば送信済みになることを確認。
+    store = Store(tmp_path / "t.db")
+    items = [_item("a"), _item("b")]
+    store.add_updates(items)
+    store.add_summaries((item.fingerprint, Summary("h", ["x", "y"], "low", "t")) for item in items)
+    store.enqueue_outbox(items)
+    store.enqueue_outbox(items)
+    due = store.due_outbox()
+    assert [(item.fingerprint, summary.bullets) for item, summary in due] == [("a", ["x", "y"]), ("b", ["x", "y"])]
+
+    store.fail_outbox(["a", "b"], "HTTP 503", max_attempts=2, base_delay=0)
+    assert store.outbox_counts() == {"pending": 2}
+    store.fail_outbox(["a"], "HTTP 503", max_attempts=2, base_delay=0)
+    assert store.outbox_counts() == {"pending": 1, "dead": 1}
+    store.fail_outbox(["b"], "HTTP 503", max_attempts=5, base_delay=3600)
+    assert store.due_outbox() == []
+
+    store.complete_outbox(["b"])
+    assert store.outbox_counts() == {"dead": 1}
+    sent = store.conn.execute("SELECT sent_immediate_at FROM seen_updates WHERE fingerprint = 'b'").fetchone()[0]
+    assert sent is not None
+    # 送信済みのものは再登録されない。
+    store.enqueue_outbox([items[1]])
+    assert store.outbox_counts() == {"dead": 1}
+    # 要約前に登録された通知待ちも、要約なしで取り出せる。
+    store.add_updates([_item("c")])
+    store.enqueue_outbox([_item("c")])
+    assert [(item.fingerprint, summary) for item, summary in store.due_outbox()] == [("c", None)]
+    store.close()
+
+
+def test_bodies_are_compressed_and_legacy_text_bodies_are_migrated(tmp_path):
+    # 本文は圧縮して保存され、圧縮導入前の TEXT の本文も移行後に同じ内容で読めることを確認。
+    db_path = tmp_path / "t.db"
+    store = Store(db_path)
+    item = _item("a")
+    item.body = "release notes " * 200
+    store.add_updates([item])
+    store.conn.execute("UPDATE seen_updates SET body = ? WHERE fingerprint = 'a'", (item.body,))
+    store.conn.execute("PRAGMA user_version = 2")
+    store.conn.commit()
+    store.close()
+
+    store = Store(db_path)
+    raw = store.conn.execute("SELECT body FROM seen_updates WHERE fingerprint = 'a'").fetchone()[0]
+    assert isinstance(raw, bytes) and len(raw) < len(item.body) // 10
+    store.add_summaries([("a", Summary("h", ["x"], "low", "t"))])
+    store.enqueue_outbox([item])
+    assert store.due_outbox()[0][0].body == item.body
+    store.close()
+
+
+def test_prune_keeps_fingerprints_and_pending_notifications_then_compact_shrinks(tmp_path):
+    # 期限切れの本文は消えるが既読判定と要約は残り、通知待ちの本文は消えないこと、compact で DB が縮むことを確認。
+    store = Store(tmp_path / "t.db")
+    items = [_item(f"fp{i}") for i in range(200)]
+    for i, item in enumerate(items):
+        item.body = f"unique body {i} " * 100
+    store.add_updates(items)
+    store.add_summaries((item.fingerprint, Summary("h", ["x"], "low", "t")) for item in items)
+    store.enqueue_outbox(items[:1])
+    store.conn.execute("UPDATE seen_updates SET first_seen_at = '2000-01-01T00:00:00+00:00'")
+    store.conn.commit()
+
+    assert store.prune_bodies(180) == 199
+    assert store.seen_fingerprints(item.fingerprint for item in items) == {item.fingerprint for item in items}
+    assert store.due_outbox()[0][0].body == items[0].body
+    assert store.due_outbox()[0][1] == Summary("h", ["x"], "low", "t")
+    assert store.prune_bodies(0) == 0
+
+    stats = store.compact()
+    assert stats["bytes_after"] < stats["bytes_before"]
+    assert stats["stored_bodies"] == 1
+    assert stats["summaries"] == 200
+    assert store.conn.execute("PRAGMA auto_vacuum").fetchone()[0] == 2
+    store.close()
+
+
+def test_seen_filter_skips_unseen_lookups_and_reuses_snapshot(tmp_path):
+    # フィルタ有効時も既読判定は変わらず、次回起動時はスナップショットを読み、DB が変わっていれば作り直すことを確認。
+    db_path = tmp_path / "t.db"
+    store = Store(db_path)
+    store.add_updates([_item("a"), _item("b")])
+    stats = store.enable_seen_filter(1000, 0.01)
+    assert stats["seen_filter_items"] == 2
+    store.add_updates([_item("c")])
+    assert store.seen_fingerprints(["a", "c", "x", "y"]) == {"a", "c"}
+    assert store.is_seen("c") and not store.is_seen("x")
+    store.close()
+
+    store = Store(db_path)
+    saved = store.conn.execute("SELECT bits FROM seen_filter").fetchone()[0]
+    store.enable_seen_filter(1000, 0.01)
+    assert bytes(store._seen_filter.bits) == saved
+    assert store.seen_fingerprints(["a", "b", "c"]) == {"a", "b", "c"}
+    # 別プロセスで追加された行はスナップショットに無いため、作り直して取りこぼさない。
+    store.close()
+    other = Store(db_path)
+    other.add_updates([_item("d")])
+    other.close()
+    store = Store(db_path)
+    store.enable_seen_filter(1000, 0.01)
+    assert store.is_seen("d")
+    store.reset_all()
+    assert not store.is_seen("a")
+    store.close()
@@ -0,0 +1,191 @@
+import json
+from datetime import datetime, timezone
+
+import httpx
+
+from ai_updates import summarizer
+from ai_updates.models import UpdateItem
+from ai_updates.store import Store
+from ai_updates.summarizer import (
+    ProviderLimiter,
+    ProviderPolicy,
+    SummaryCache,
+    plan_batches,
+    summarize,
+    summarize_batch,
+)
+
+
+def _item(i: int, body: str = "body") -> UpdateItem:
+    return UpdateItem(
+        source_id="s1",
+        service="openai",
+        title=f"Update {i}",
+        url=f"https://example.com/#u{i}",
+        published_at=datetime(2026, 2, 1, tzinfo=timezone.utc),
+        body=body,
+        fingerprint=f"fp{i}",
+    )
+
+
+def test_plan_batches_respects_item_limit_and_token_budget():
+    # 件数上限とトークン予算のどちらでもバッチが区切られることを確認。
+    items = [_item(i) for i in range(7)]
+    assert [len(b) for b in plan_batches(items, max_items=3, token_budget=100_000)] == [3, 3, 1]
+    big = [_item(i, body="x" * 3000) for i in range(3)]
+    assert [len(b) for b in plan_batches(big, max_items=10, token_budget=1500)] == [1, 1, 1]
+
+
+def test_summarize_batch_falls_back_only_for_unparsed_items(monkeypatch):
+    # 応答に含まれない id・壊れた要素のアイテムだけがフォールバックになることを確認。
+    calls = []
+
+    def fake_request(api_key, model, prompt):
+        calls.append(prompt)
+        return json.dumps(
+            {
+                "summaries": [
+                    {"id": "0", "headline": "見出し0", "bullets": ["a", "b", "c"], "importance": "low", "topic": "t"},
+                    "broken",
+                    {"id": "2", "headline": "見出し2", "bullets": ["x"], "importance": "high", "topic": "t"},
+                ]
+            }
+        )
+
+    monkeypatch.setitem(summarizer._PROVIDERS, "openai", fake_request)
+    items = [_item(i) for i in range(3)]
+    results = summarize_batch(items, "openai", "key", "model", None, "g")
+
+    assert len(calls) == 1
+    assert results[0].headline == "見出し0"
+    assert results[1].headline == "Update 1"
+    assert results[1].bullets[0] == "更新元: s1"
+    assert results[2].importance == "high"
+
+
+def test_summary_cache_skips_provider_for_repeated_body(tmp_path, monkeypatch):
+    # URL やタイトルが違っても本文が同じなら、2回目は API を呼ばずキャッシュから返すことを確認。
+    calls = []
+
+    def fake_request(api_key, model, prompt):
+        calls.append(prompt)
+        return json.dumps({"headline": "要約", "bullets": ["a", "b", "c"], "importance": "low", "topic": "t"})
+
+    monkeypatch.setitem(summarizer._PROVIDERS, "openai", fake_request)
+    store = Store(tmp_path / "t.db")
+    first = summarize(_item(1, body="same body"), "openai", "key", "model", None, "g", cache=SummaryCache(store))
+    # 新しいプロセス相当（空の LRU）でも SQLite から引けること。
+    second = summarize(_item(2, body="same  BODY"), "openai", "key", "model", None, "g", cache=SummaryCache(store))
+    assert len(calls) == 1
+    assert second == first
+
+    # モデルが変わったら古いエントリは掃除される。
+    assert SummaryCache(store).evict_stale("openai", "new-model", 90) == 1
+    store.close()
+
+
+class _FakeTime:
+    def __init__(self) -> None:
+        self.now = 0.0
+        self.sleeps: list[float] = []
+
+    def clock(self) -> float:
+        return self.now
+
+    def sleep(self, seconds: float) -> None:
+        self.sleeps.append(round(seconds, 2))
+        self.now += seconds
+
+
+def _rate_limited(retry_after: str) -> httpx.HTTPStatusError:
+    request = httpx.Request("POST", "https://api.openai.com/v1/responses")
+    response = httpx.Response(429, headers={"Retry-After": retry_after}, request=request)
+    return httpx.HTTPStatusError("429 Too Many Requests", request=request, response=response)
+
+
+def _use_policy(monkeypatch, fake: _FakeTime, policy: ProviderPolicy) -> None:
+    monkeypatch.setattr(summarizer, "_clock", fake.clock)
+    monkeypatch.setattr(summarizer, "_sleep", fake.sleep)
+    monkeypatch.setattr(summarizer, "_policies", {"openai": policy, "gemini": ProviderPolicy()})
+    monkeypatch.setattr(summarizer, "_limiters", {})
+
+
+def test_single_item_batch_counts_cache_miss_once(tmp_path, monkeypatch):
+    # 1件だけのバッチでも、キャッシュの外れは1回だけ数えられることを確認。
+    def fake_request(api_key, model, prompt):
+        return json.dumps({"headline": "要約", "bullets": ["a", "b", "c"], "importance": "low", "topic": "t"})
+
+    monkeypatch.setitem(summarizer._PROVIDERS, "openai", fake_request)
+    cache = SummaryCache(None)
+    summarize_batch([_item(1)], "openai", "key", "model", None, "g", cache=cache)
+    summarize_batch([_item(1)], "openai", "key", "model", None, "g", cache=cache)
+    assert (cache.hits, cache.misses) == (1, 1)
+
+
+def test_limiter_spaces_requests_by_rpm_and_gives_up_past_deadline():
+    # RPM を使い切ったら補充まで待ち、締め切りまでに空かない場合は待たずに諦めることを確認。
+    fake = _FakeTime()
+    limiter = ProviderLimiter(rpm=2, tpm=0, clock=fake.clock, sleep=fake.sleep)
+    assert limiter.acquire(100, deadline=60)
+    assert limiter.acquire(100, deadline=60)
+    assert limiter.acquire(100, deadline=60)
+    assert fake.sleeps == [30.0]
+    assert not limiter.acquire(100, deadline=fake.now + 10)
+    assert fake.sleeps == [30.0]
+
+
+def test_rate_limited_request_waits_retry_after_then_returns_real_summary(monkeypatch):
+    # 429 の Retry-After だけ待って再送し、フォールバックではなく本来の要約を返すことを確認。
+    fake = _FakeTime()
+    _use_policy(monkeypatch, fake, ProviderPolicy(deadline=60, base_delay=0))
+    responses = [_rate_limited("5"), json.dumps({"headline": "本物", "bullets": ["a"], "importance": "low", "topic": "t"})]
+
+    def fake_request(api_key, model, prompt):
+        result = responses.pop(0)
+        if isinstance(result, Exception):
+            raise result
+        return result
+
+    monkeypatch.setitem(summarizer._PROVIDERS, "openai", fake_request)
+    assert summarize(_item(1), "openai", "key", "model", None, "g").headline == "本物"
+    assert fake.sleeps == [5.0]
+
+
+def test_retry_after_beyond_deadline_falls_back_without_waiting(monkeypatch):
+    # Retry-After が締め切りを超えるなら、待たずにフォールバック要約にすることを確認。
+    fake = _FakeTime()
+    _use_policy(monkeypatch, fake, ProviderPolicy(deadline=10, base_delay=0))
+    calls = []
+
+    def fake_request(api_key, model, prompt):
+        calls.append(prompt)
+        raise _rate_limited("30")
+
+    monkeypatch.setitem(summarizer._PROVIDERS, "openai", fake_request)
+    summary = summarize(_item(1), "openai", "key", "model", None, "g")
+    assert summary.headline == "Update 1"
+    assert len(calls) == 1
+    assert fake.sleeps == []
+
+
+def test_base_url_override_routes_requests_to_local_endpoint(monkeypatch):
+    # ProviderPolicy.base_url を指定すると、公式エンドポイントではなくその URL へ送ることを確認。
+    from ai_updates import http_clients
+
+    seen: list[str] = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        seen.append(str(request.url))
+        text = json.dumps({"headline": "h", "bullets": ["a"], "importance": "low", "topic": "t"})
+        return httpx.Response(200, json={"output": [{"content": [{"text": text}]}]})
+
+    _use_policy(monkeypatch, _FakeTime(), ProviderPolicy(base_url="http://127.0.0.1:9999/v1/"))
+    http_clients.configure(transport=httpx.MockTransport(handler))
+    try:
+        summary = summarize(
+            _item(1), provider="openai", openai_api_key="k", openai_model="m", gemini_api_key=None, gemini_model="g"
+        )
+    finally:
+        http_clients.configure()
+    assert summary.headline == "h"
+    assert seen == ["http://127.0.0.1:9999/v1/responses"]